@@ -1,5 +1,6 @@
 import streamlit as st
 from pipeline import RAGPipeline
+from config import Config
 import time
 
 st.set_page_config(
@@ -10,7 +11,11 @@ st.set_page_config(
 
 @st.cache_resource
 def load_pipeline():
-    return RAGPipeline()
+    pipeline = RAGPipeline()
+    if Config.WARMUP_ON_START:
+        # Pay the model and index loading once at startup, not on the first question
+        pipeline.warmup()
+    return pipeline
 
 def main():
     st.title("📊 Multi-Modal Document Intelligence System")
@@ -32,6 +37,33 @@ def main():
         st.metric("Vector DB", "ChromaDB")
         st.metric("LLM Model", "GPT-3.5")
         st.metric("Embeddings", "OpenAI")
+        
+        st.divider()
+        
+        st.header("⏱️ Latency by Stage")
+        startup = load_pipeline().startup
+        st.caption(
+            f"Cold start: import {startup['import_ms']:.0f}ms · init {startup['init_ms']:.0f}ms"
+            + (f" · warmup {startup['warmup_ms']:.0f}ms" if 'warmup_ms' in startup else "")
+        )
+        stage_stats = load_pipeline().stage_stats()
+        if not stage_stats:
+            st.caption("No queries yet")
+        for stage, stats in sorted(stage_stats.items(), key=lambda item: item[1]['p50'], reverse=True):
+            st.caption(
+                f"{stage}: p50 {stats['p50']:.0f}ms · p95 {stats['p95']:.0f}ms · "
+                f"p99 {stats['p99']:.0f}ms ({stats['count']})"
+            )
+        
+        st.divider()
+        
+        st.header("🗄️ Query Cache")
+        for name, stats in load_pipeline().cache_stats().items():
+            st.caption(
+                f"{name.replace('_', ' ').title()}: {stats['hits']} hits / "
+                f"{stats['misses']} misses ({stats['hit_rate']*100:.0f}%), "
+                f"{stats['size']}/{stats['max_size']} entries"
+            )
     
     # Main interface
     pipeline = load_pipeline()
@@ -63,35 +95,58 @@ def main():
     col1, col2 = st.columns([1, 5])
     with col1:
         search_button = st.button("🔍 Search", type="primary", use_container_width=True)
+    with col2:
+        filters = st.text_input(
+            "Filter",
+            placeholder="optional, e.g. type=table_row page=40-60 document=qatar_test_doc year=2025",
+            label_visibility="collapsed"
+        )
     
     if search_button and question:
-        with st.spinner("Searching and generating answer..."):
-            start_time = time.time()
+        start_time = time.time()
+        first_token_latency = None
+        
+        try:
+            st.subheader("📝 Answer:")
+            answer_placeholder = st.empty()
+            answer_placeholder.markdown("_Searching and generating answer..._")
+            sources_container = st.container()
+            
+            answer = ""
+            result = None
+            for event in pipeline.stream_query(question, filters=filters.strip() or None):
+                if event['type'] == 'sources':
+                    # Sources arrive before the LLM starts answering
+                    with sources_container:
+                        st.subheader("📚 Sources:")
+                        for source in event['sources']:
+                            with st.expander(f"Source {source['source_id']} - Page {source['page']} ({source['type']})"):
+                                st.metric("Relevance", f"{source['relevance']*100:.1f}%")
+                elif event['type'] == 'token':
+                    if first_token_latency is None:
+                        first_token_latency = time.time() - start_time
+                    answer += event['content']
+                    answer_placeholder.markdown(answer + "▌")
+                else:
+                    result = event
+            
+            latency = time.time() - start_time
+            answer_placeholder.markdown(result['answer'])
+            st.success("✓ Answer generated" + (" (cached)" if result.get('cached') else ""))
             
-            try:
-                result = pipeline.query(question)
-                latency = time.time() - start_time
-                
-                # Display answer
-                st.success("✓ Answer generated")
-                
-                st.subheader("📝 Answer:")
-                st.write(result['answer'])
-                
-                # Display sources
-                st.subheader("📚 Sources:")
-                for source in result['sources']:
-                    with st.expander(f"Source {source['source_id']} - Page {source['page']} ({source['type']})"):
-                        st.metric("Relevance", f"{source['relevance']*100:.1f}%")
-                
-                # Metrics
-                col1, col2, col3 = st.columns(3)
-                col1.metric("Response Time", f"{latency:.2f}s")
-                col2.metric("Sources Used", result['context_used'])
-                col3.metric("Confidence", "High")
-                
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
+            # Metrics
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Response Time", f"{latency:.2f}s")
+            col2.metric("First Token", f"{(first_token_latency or latency):.2f}s")
+            col3.metric("Sources Used", result['context_used'])
+            col4.metric("Confidence", "High")
+            
+            with st.expander("⏱️ Stage timings"):
+                for stage, ms in sorted(result.get('timings', {}).items(), key=lambda item: item[1], reverse=True):
+                    st.caption(f"{stage}: {ms:.0f}ms")
+        
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,247 @@
+"""
+Performance benchmark runner.
+
+Measures ingestion (PDF parsing, chunking, embedding), query encoding,
+vector search on synthetic corpora, hybrid retrieval and end-to-end queries
+against the local stub LLM (fake_openai_server.py), so no API key or network
+is needed.
+
+    python benchmarks/run.py                          # run and compare to baseline
+    python benchmarks/run.py --save-baseline          # record a new baseline
+    python benchmarks/run.py --suites search --sizes 1000,100000,1000000
+    python benchmarks/run.py --embedding-backend onnx-int8
+
+Exits with status 1 if any metric regressed past --threshold.
+"""
+from typing import Dict, List
+from datetime import datetime
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+
+# Add parent directory to path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from config import Config
+from fake_openai_server import start_server
+from benchmarks import suite
+
+SUITES = ("ingest", "search", "hybrid", "e2e")
+HIGHER_IS_BETTER = ("_per_sec", "qps")
+MIN_ABS_CHANGE = {'_ms': 1.0, '_s': 0.05}  # Ignore sub-noise changes on tiny timings
+
+def metric_direction(name: str) -> int:
+    """+1 if higher is better, -1 if lower is better, 0 if informational"""
+    if name.endswith(HIGHER_IS_BETTER) or name.startswith('recall'):
+        return 1
+    if name.endswith('_ms') or name.endswith('_s'):
+        return -1
+    return 0
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[Dict]:
+    """One row per metric present in both runs, flagged when it regressed past threshold"""
+    rows = []
+    for bench, metrics in current.items():
+        for name, value in metrics.items():
+            base = baseline.get(bench, {}).get(name)
+            direction = metric_direction(name)
+            if base is None or not direction or not isinstance(value, (int, float)):
+                continue
+            
+            change = (value - base) / base if base else 0.0
+            worse = -change * direction
+            min_abs = next((v for suffix, v in MIN_ABS_CHANGE.items() if name.endswith(suffix)), 0.0)
+            rows.append({
+                'benchmark': bench,
+                'metric': name,
+                'baseline': base,
+                'current': value,
+                'change': round(change, 4),
+                'regression': worse > threshold and abs(value - base) >= min_abs,
+            })
+    return rows
+
+def environment() -> Dict:
+    import numpy
+    import faiss
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': numpy.__version__,
+        'faiss': getattr(faiss, '__version__', 'unknown'),
+    }
+
+def run(args) -> Dict:
+    results = {}
+    suites = set(args.suites)
+    
+    if "search" in suites:
+        print("\n[search] Synthetic vector search...")
+        for name, metrics in suite.bench_vector_search(
+            args.sizes, args.index_types, Config.INDEX_PARAMS, queries=args.queries
+        ).items():
+            results[f"search.{name}"] = metrics
+            print(f"  {name:20s} p50 {metrics['p50_ms']:.3f}ms  p99 {metrics['p99_ms']:.3f}ms  "
+                  f"{metrics['qps']:.0f} QPS  recall {metrics['recall_at_k']:.3f}")
+    
+    if not suites & {"ingest", "hybrid", "e2e"}:
+        return results
+    
+    # Everything that touches the index runs in a scratch directory
+    pdf_path = os.path.abspath(os.path.join(ROOT, args.pdf))
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+    cwd = os.getcwd()
+    server, base_url = start_server(delay=args.llm_token_delay, first_token_delay=args.llm_delay)
+    os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+    Config.OPENAI_BASE_URL = base_url
+    Config.PDF_PATH = pdf_path
+    Config.TRACE_EXPORTER = None
+    
+    try:
+        os.chdir(workdir)
+        from pipeline import RAGPipeline
+        pipeline = RAGPipeline()
+        
+        print("\n[ingest] PDF processing...")
+        metrics, chunks = suite.bench_pdf_processing(pdf_path)
+        results["ingest.pdf_processing"] = metrics
+        print(f"  {metrics['pages_per_sec']:.1f} pages/sec ({metrics['pages']} pages)")
+        
+        print("[ingest] Chunking...")
+        results["ingest.context_merging"] = suite.check_context_merging(chunks, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
+        metrics, chunks = suite.bench_chunking(chunks, Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
+        results["ingest.chunking"] = metrics
+        print(f"  {metrics['chunks_per_sec']:.0f} chunks/sec")
+        
+        print("[ingest] Embedding and indexing...")
+        metrics = suite.bench_embedding(pipeline.embedder, chunks)
+        results["ingest.embedding"] = metrics
+        print(f"  {metrics['chunks_per_sec']:.1f} chunks/sec")
+        if pipeline.retriever:
+            pipeline.retriever.build_sparse_index()
+        
+        with open(os.path.join(ROOT, args.questions), encoding='utf-8') as f:
+            questions = [q['question'] for q in json.load(f)['questions']]
+        
+        print("\n[encode] Query encoding...")
+        metrics = suite.bench_query_encoding(pipeline.embedder, questions)
+        results["query.encoding"] = metrics
+        print(f"  p50 {metrics['p50_ms']:.2f}ms  p99 {metrics['p99_ms']:.2f}ms ({pipeline.embedder.backend.name})")
+        
+        if "hybrid" in suites:
+            print("\n[hybrid] HybridRetriever.search...")
+            metrics = suite.bench_hybrid_search(pipeline, questions)
+            if metrics:
+                results["query.hybrid_search"] = metrics
+                print(f"  p50 {metrics['p50_ms']:.2f}ms  p99 {metrics['p99_ms']:.2f}ms")
+            else:
+                print("  skipped (RETRIEVAL_MODE is not 'hybrid')")
+        
+        if "e2e" in suites:
+            print("\n[e2e] RAGPipeline.query with stub LLM...")
+            metrics = suite.bench_end_to_end(pipeline, questions)
+            results["query.end_to_end"] = metrics
+            print(f"  p50 {metrics['p50_ms']:.1f}ms  p95 {metrics['p95_ms']:.1f}ms  p99 {metrics['p99_ms']:.1f}ms")
+            
+            print("[e2e] RAGPipeline.query_batch with stub LLM...")
+            metrics = suite.bench_query_batch(pipeline, questions, concurrency=Config.MAX_CONCURRENT_LLM_CALLS)
+            results["query.batch"] = metrics
+            print(f"  {metrics['questions_per_sec']:.1f} questions/sec ({metrics['questions']} questions)")
+        
+        if "ingest" not in suites:
+            for key in [k for k in results if k.startswith("ingest.")]:
+                del results[key]
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    return results
+
+def print_comparison(rows: List[Dict], threshold: float):
+    print("\n" + "=" * 90)
+    print(f"COMPARISON WITH BASELINE (regression threshold {threshold*100:.0f}%)")
+    print("=" * 90)
+    for row in rows:
+        flag = "✗ REGRESSION" if row['regression'] else ""
+        print(f"  {row['benchmark']:28s} {row['metric']:24s} {row['baseline']:>12.3f} → "
+              f"{row['current']:>12.3f} ({row['change']*100:+6.1f}%) {flag}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the performance benchmarks")
+    parser.add_argument("--suites", default=",".join(SUITES),
+                        help=f"Comma-separated subset of: {', '.join(SUITES)}")
+    parser.add_argument("--sizes", default="1000,100000",
+                        help="Synthetic corpus sizes for the search suite (add 1000000 for the large run)")
+    parser.add_argument("--index-types", default=Config.INDEX_TYPE, help="e.g. flat,ivf_flat,hnsw,ivf_pq")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per search benchmark")
+    parser.add_argument("--pdf", default=Config.PDF_PATH)
+    parser.add_argument("--questions", default="evaluation/benchmark_questions.json")
+    parser.add_argument("--llm-delay", type=float, default=0.2, help="Stub LLM seconds before the first token")
+    parser.add_argument("--llm-token-delay", type=float, default=0.0, help="Stub LLM seconds per token")
+    parser.add_argument("--embedding-backend", default=Config.EMBEDDING_BACKEND,
+                        help="sentence-transformers, onnx-int8 or openai (the stub server answers embeddings too)")
+    parser.add_argument("--output", default="benchmarks/results/latest.json")
+    parser.add_argument("--baseline", default="benchmarks/baseline.json")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative slowdown that counts as a regression (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    args = parser.parse_args()
+    
+    args.suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"Unknown suites: {', '.join(sorted(unknown))}")
+    args.sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    args.index_types = [t.strip() for t in args.index_types.split(",") if t.strip()]
+    Config.EMBEDDING_BACKEND = args.embedding_backend
+    
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'environment': environment(),
+        'settings': {
+            'suites': args.suites,
+            'sizes': args.sizes,
+            'index_types': args.index_types,
+            'queries': args.queries,
+            'llm_delay': args.llm_delay,
+            'retrieval_mode': Config.RETRIEVAL_MODE,
+            'embedding_backend': Config.EMBEDDING_BACKEND,
+            'reranking': Config.USE_RERANKING,
+        },
+        'benchmarks': run(args),
+    }
+    
+    output = os.path.join(ROOT, args.output)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results saved to {args.output}")
+    
+    baseline_path = os.path.join(ROOT, args.baseline)
+    if args.save_baseline:
+        shutil.copyfile(output, baseline_path)
+        print(f"💾 Baseline updated: {args.baseline}")
+        sys.exit(0)
+    
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+        sys.exit(0)
+    
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    rows = compare(report['benchmarks'], baseline.get('benchmarks', {}), args.threshold)
+    print_comparison(rows, args.threshold)
+    
+    regressions = [r for r in rows if r['regression']]
+    if regressions:
+        print(f"\n✗ {len(regressions)} metric(s) regressed by more than {args.threshold*100:.0f}%")
+        sys.exit(1)
+    print("\n✓ No regressions")
\ No newline at end of file
@@ -0,0 +1,228 @@
+"""
+Benchmarks for the ingestion and query paths.
+
+Every function returns a flat dict of metrics (ingestion benchmarks also
+return their output for the next stage). Metric names ending in '_per_sec' /
+'qps' or starting with 'recall' are higher-is-better; '_ms' / '_s' are
+lower-is-better. run.py uses this to decide what counts as a regression.
+"""
+from typing import Dict, List, Tuple
+from itertools import groupby
+import time
+import numpy as np
+
+from src.ingestion.pdf_processor import MultiModalPDFProcessor
+from src.chunking.smart_chunker import SmartChunker
+from src.generation.context_packer import ContextPacker
+from src.embedding.index_factory import recall_latency_report
+from src.tracing import percentiles
+
+def _latency_metrics(latencies_s: List[float]) -> Dict:
+    ms = [t * 1000 for t in latencies_s]
+    total = sum(latencies_s)
+    return {
+        'mean_ms': round(float(np.mean(ms)), 3),
+        **{f'{name}_ms': value for name, value in percentiles(ms).items()},
+        'qps': round(len(ms) / total, 2) if total > 0 else 0.0,
+    }
+
+def bench_pdf_processing(pdf_path: str) -> Tuple[Dict, List[Dict]]:
+    """MultiModalPDFProcessor.process_all throughput; returns (metrics, chunks)"""
+    processor = MultiModalPDFProcessor(pdf_path, verbose=False)
+    start = time.perf_counter()
+    chunks = list(processor.process_all())
+    elapsed = time.perf_counter() - start
+    pages = len({c['page'] for c in chunks})
+    processor.close()
+    
+    return {
+        'pages': pages,
+        'chunks': len(chunks),
+        'elapsed_s': round(elapsed, 3),
+        'pages_per_sec': round(pages / elapsed, 2) if elapsed else 0.0,
+    }, chunks
+
+def bench_chunking(chunks: List[Dict], chunk_size: int, chunk_overlap: int,
+                   repeats: int = 3) -> Tuple[Dict, List[Dict]]:
+    """SmartChunker.chunk_text + add_context throughput (best of `repeats`); returns (metrics, chunks)"""
+    chunker = SmartChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    pages = [list(group) for _, group in groupby(chunks, key=lambda c: c['page'])]
+    
+    best, produced = None, []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        produced = []
+        for page in pages:
+            # add_context mutates metadata, so give it fresh copies each round
+            page = [{**c, 'metadata': dict(c['metadata'])} for c in page]
+            produced.extend(chunker.add_context(chunker.chunk_text(page)))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    
+    return {
+        'input_chunks': len(chunks),
+        'output_chunks': len(produced),
+        'chunks_per_sec': round(len(produced) / best, 2) if best else 0.0,
+    }, produced
+
+def check_context_merging(chunks: List[Dict], chunk_size: int, chunk_overlap: int) -> Dict:
+    """ContextPacker may only merge splits of one paragraph back together
+
+    Chunks `chunks` (raw PDF output) plus a synthetic page holding two long
+    paragraphs, packs each page's text splits in shuffled order, as a
+    retriever returns them, and raises if a merged source contains splits
+    of more than one input paragraph.
+    """
+    rng = np.random.default_rng(0)
+    words = ["revenue", "hydrocarbon", "fiscal", "inflation", "credit", "reform", "growth", "reserves"]
+    synthetic = [
+        {'type': 'text', 'page': 1, 'metadata': {'document': 'synthetic.pdf'},
+         'content': " ".join(f"Paragraph {p} sentence {i}: " + " ".join(rng.choice(words, 8)) + "." for i in range(40))}
+        for p in ("one", "two")
+    ]
+    chunker = SmartChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    packer = ContextPacker(token_budget=10 ** 6)
+    
+    merged, mixed = 0, []
+    for (document, page), group in groupby(chunks + synthetic, key=lambda c: (c['metadata'].get('document'), c['page'])):
+        paragraphs = [c['content'] for c in group if c['type'] == 'text']
+        splits = chunker.chunk_text([{'type': 'text', 'page': page, 'metadata': {'document': document},
+                                      'content': text} for text in paragraphs])
+        splits = [splits[i] for i in rng.permutation(len(splits))]
+        packed = packer.pack({
+            'ids': list(range(len(splits))),
+            'documents': [c['content'] for c in splits],
+            'metadatas': [{**c['metadata'], 'type': 'text', 'page': page} for c in splits],
+            'distances': [0.0] * len(splits),
+        })
+        for meta in packed['metadatas']:
+            if 'merged_ids' not in meta:
+                continue
+            merged += 1
+            sources = {
+                next(i for i, text in enumerate(paragraphs) if splits[chunk]['content'] in text)
+                for chunk in meta['merged_ids']
+            }
+            if len(sources) > 1:
+                mixed.append((document, page))
+    
+    if mixed:
+        raise RuntimeError(f"Splits of different paragraphs merged into one source on {mixed[:5]}")
+    return {'merged_sources': merged}
+
+def bench_embedding(embedder, chunks: List[Dict]) -> Dict:
+    """MultiModalEmbedder.embed_and_store throughput from an empty index"""
+    start = time.perf_counter()
+    embedder.embed_and_store(chunks)
+    elapsed = time.perf_counter() - start
+    
+    return {
+        'chunks': embedder.count(),
+        'elapsed_s': round(elapsed, 3),
+        'chunks_per_sec': round(embedder.count() / elapsed, 2) if elapsed else 0.0,
+    }
+
+def bench_query_encoding(embedder, questions: List[str], repeats: int = 3) -> Dict:
+    """Single-question encode latency of the configured embedding backend (no query cache)"""
+    embedder.get_embeddings(questions[:1])  # Model load is not part of the measurement
+    latencies = []
+    for _ in range(repeats):
+        for question in questions:
+            start = time.perf_counter()
+            embedder.get_embeddings([question])
+            latencies.append(time.perf_counter() - start)
+    
+    return _latency_metrics(latencies)
+
+def bench_vector_search(sizes: List[int], index_types: List[str], params: Dict,
+                        dimension: int = 384, queries: int = 200, k: int = 5, seed: int = 0) -> Dict:
+    """FAISS search latency/QPS and recall on synthetic unit vectors, per corpus size"""
+    rng = np.random.default_rng(seed)
+    results = {}
+    for size in sizes:
+        vectors = rng.standard_normal((size, dimension), dtype='float32')
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        
+        # Queries near real vectors, like questions that have an answer in the corpus
+        picks = rng.choice(size, queries, replace=size < queries)
+        query_vectors = vectors[picks] + 0.1 * rng.standard_normal((queries, dimension), dtype='float32')
+        
+        for row in recall_latency_report(vectors, query_vectors, k=k, index_types=index_types, params=params):
+            if row['index_type'] not in index_types:
+                continue
+            results[f"{row['index_type']}@{size}"] = {
+                'recall_at_k': row['recall_at_k'],
+                'mean_ms': row['mean_latency_ms'],
+                'p50_ms': row['p50_latency_ms'],
+                'p95_ms': row['p95_latency_ms'],
+                'p99_ms': row['p99_latency_ms'],
+                'qps': round(1000 / row['mean_latency_ms'], 2) if row['mean_latency_ms'] else 0.0,
+                'build_s': row['build_time_s'],
+                'recall_after_remove': row['recall_after_remove'],
+            }
+        del vectors
+    return results
+
+def bench_hybrid_search(pipeline, questions: List[str], repeats: int = 3) -> Dict:
+    """HybridRetriever.search latency with the retrieval caches cleared before each query"""
+    if pipeline.retriever is None:
+        return {}
+    
+    # Query vectors are computed up front so only sparse + dense search and fusion are timed
+    vectors = [pipeline.embedder.get_query_embedding(q) for q in questions]
+    latencies = []
+    for _ in range(repeats):
+        for question, vector in zip(questions, vectors):
+            pipeline.embedder.search_cache.clear()
+            start = time.perf_counter()
+            pipeline.retriever.search(question, n_results=pipeline.config.TOP_K, query_vector=vector)
+            latencies.append(time.perf_counter() - start)
+    
+    return _latency_metrics(latencies)
+
+def bench_query_batch(pipeline, questions: List[str], copies: int = 5, concurrency: int = 16) -> Dict:
+    """RAGPipeline.query_batch throughput on `copies` distinct variants of every question, caches cold"""
+    batch = [f"{question} (variant {i})" for i in range(copies) for question in questions]
+    pipeline.embedder.query_cache.clear()
+    pipeline.embedder.search_cache.clear()
+    if pipeline.reranker:
+        pipeline.reranker.cache.clear()
+    if pipeline.answer_cache:
+        pipeline.answer_cache.clear()
+    
+    start = time.perf_counter()
+    pipeline.query_batch(batch, max_concurrency=concurrency)
+    elapsed = time.perf_counter() - start
+    
+    return {
+        'questions': len(batch),
+        'elapsed_s': round(elapsed, 3),
+        'questions_per_sec': round(len(batch) / elapsed, 2) if elapsed else 0.0,
+    }
+
+def bench_end_to_end(pipeline, questions: List[str], repeats: int = 1) -> Dict:
+    """RAGPipeline.query latency against the stub LLM, with every cache cold
+
+    Also reports the mean time per traced stage as 'stage_<name>_ms'.
+    """
+    latencies = []
+    stages = {}
+    for _ in range(repeats):
+        for question in questions:
+            pipeline.embedder.query_cache.clear()
+            pipeline.embedder.search_cache.clear()
+            if pipeline.reranker:
+                pipeline.reranker.cache.clear()
+            if pipeline.answer_cache:
+                pipeline.answer_cache.clear()
+            
+            start = time.perf_counter()
+            result = pipeline.query(question)
+            latencies.append(time.perf_counter() - start)
+            for stage, ms in result.get('timings', {}).items():
+                stages.setdefault(stage, []).append(ms)
+    
+    return {
+        **_latency_metrics(latencies),
+        **{f'stage_{stage}_ms': round(float(np.mean(values)), 3) for stage, values in stages.items()},
+    }
\ No newline at end of file
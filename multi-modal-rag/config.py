@@ -6,22 +6,119 @@ load_dotenv()
 class Config:
     # API Keys
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')  # e.g. http://127.0.0.1:8001/v1 for fake_openai_server.py
     
     # Paths
     PDF_PATH = "data/qatar_test_doc.pdf"
+    CORPUS_DIR = "data"  # Every PDF under this folder is indexed by build_corpus_index
+    
+    # Corpus ingestion
+    INGEST_WORKERS = None  # None = one worker process per CPU core
+    INGEST_PAGES_PER_TASK = 25  # Long reports are split into page ranges across workers
     
     # Chunking
+    CHUNKING_STRATEGY = "recursive"  # "recursive" (character splitter) or "semantic" (cuts where sentence embeddings diverge)
     CHUNK_SIZE = 500
     CHUNK_OVERLAP = 50
+    SEMANTIC_MIN_TOKENS = 50
+    SEMANTIC_MAX_TOKENS = 200  # Model tokens; all-MiniLM-L6-v2 reads at most 256
+    SEMANTIC_BREAKPOINT_PERCENTILE = 85  # Cut at the page's largest similarity drops
+    SEMANTIC_PAGES_PER_BATCH = 8  # Pages whose sentences are embedded in one call
+    CHUNKING_WORKERS = None  # Threads for per-page chunking work; None = one per CPU core (max 8)
+    TABLE_STRATEGY = "auto"  # "auto", "layout", "find_tables" or "simple" (old whitespace heuristic)
+    
+    # Embedded images: indexed by caption + OCR text (Tesseract via PyMuPDF, CPU only)
+    IMAGE_EXTRACTION_ENABLED = True
+    IMAGE_OCR_ENABLED = True  # Needs Tesseract language data (TESSDATA_PREFIX); captions only without it
+    IMAGE_OCR_LANGUAGE = "eng"
+    IMAGE_OCR_WORKERS = None  # None = one OCR process per CPU core
+    IMAGE_CACHE_DIR = "faiss_index/image_cache"  # OCR results keyed by image hash, kept across rebuilds
+    
+    # Embedding backend: "sentence-transformers" (fp32 PyTorch), "onnx-int8" (quantized
+    # ONNX Runtime, fastest on CPU) or "openai". Changing the model space re-embeds on the next build.
+    EMBEDDING_BACKEND = "sentence-transformers"
+    USE_OPENAI_EMBEDDINGS = False  # Legacy switch, only used when EMBEDDING_BACKEND is None
+    EMBEDDING_MODEL = "text-embedding-3-small"  # OpenAI backend
+    LOCAL_EMBEDDING_MODEL = "all-MiniLM-L6-v2"  # sentence-transformers / onnx-int8 backends
+    EMBEDDING_BACKEND_OPTIONS = {
+        'onnx-int8': {'cache_dir': './models', 'threads': None},
+        'openai': {'batch_size': 256},  # Inputs per embeddings request
+    }
+    EMBEDDING_BATCH_SIZE = 64  # Chunks per encode() call during indexing
+    INCREMENTAL_INDEXING = True  # Only embed new/changed chunks on rebuild
     
-    # Embedding - USE OPENAI (no memory issues)
-    USE_OPENAI_EMBEDDINGS = True  # Changed to True
-    EMBEDDING_MODEL = "text-embedding-3-small"
+    # Vector index: "flat" (exact), "ivf_flat", "hnsw" or "ivf_pq" (compressed)
+    INDEX_TYPE = "flat"
+    INDEX_PARAMS = {
+        'nlist': 1024,           # IVF centroids (clamped for small corpora)
+        'nprobe': 16,            # IVF lists scanned per query
+        'hnsw_m': 32,
+        'ef_construction': 200,
+        'ef_search': 64,
+        'pq_m': 48,              # Must divide the embedding dimension (384)
+        'pq_bits': 8,
+        'train_sample': 100000,  # Vectors used to train IVF/PQ centroids
+    }
+    INDEX_SHARDING = None  # None (one index), "document" (a shard per PDF) or "hash" (INDEX_SHARDS shards)
+    INDEX_SHARDS = 4
+    INDEX_SHARD_PATH = "faiss_index/shards"
+    SHARD_SEARCH_THREADS = None  # Parallel shard searches; None = one per CPU core
     
     # LLM
     LLM_MODEL = "gpt-3.5-turbo"
     LLM_TEMPERATURE = 0.1
+    PROMPT_TOKEN_BUDGETS = {  # Max prompt tokens (instructions + retrieved context) per model
+        'gpt-3.5-turbo': 3000,
+        'gpt-4o-mini': 6000,
+        'gpt-4o': 6000,
+        'default': 3000,
+    }
+    MAX_CONCURRENT_LLM_CALLS = 16  # In-flight completions per process (async path)
+    
+    # Async query path
+    QUERY_THREADS = 8  # Thread pool for embedding / FAISS search / cache lookups
+    
+    # HTTP API (server.py)
+    SERVER_HOST = "0.0.0.0"
+    SERVER_PORT = 8000
+    BATCH_WINDOW_MS = 5  # How long the first question of a batch waits for others
+    MAX_BATCH_SIZE = 32  # Questions encoded and searched together
+    MAX_IN_FLIGHT = 512  # Distinct requests admitted before the server answers 503
     
     # Retrieval
     TOP_K = 5
-    USE_RERANKING = False
\ No newline at end of file
+    USE_RERANKING = False
+    RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES = 20  # Chunks retrieved before reranking
+    RERANK_TOP_K = 3  # Chunks sent to the LLM after reranking
+    RERANK_BATCH_SIZE = 32
+    RERANK_CACHE_SIZE = 4096  # (question, chunk) pair scores
+    RERANK_EARLY_EXIT_MARGIN = None  # e.g. 3.0 to stop once a stage scores far below the cut
+    RERANK_STAGE_SIZE = 10
+    RETRIEVAL_MODE = "hybrid"  # "dense" (vector only) or "hybrid" (vector + BM25)
+    FUSION_METHOD = "rrf"  # "rrf" (reciprocal rank fusion) or "weighted"
+    HYBRID_ALPHA = 0.5  # Dense weight for weighted fusion (1 - alpha for BM25)
+    RRF_K = 60
+    HYBRID_CANDIDATES = 50  # Chunks taken from each retriever before fusion
+    TABLE_LOOKUP_ENABLED = True  # Put exact table-row matches ahead of the retrieved chunks
+    TABLE_LOOKUP_TOP_K = 2
+    TABLE_LOOKUP_MIN_SCORE = 0.6  # Share of the question's (IDF-weighted) terms a row label must cover
+    
+    # Query caching (question -> vector, vector -> retrieved chunk IDs)
+    QUERY_CACHE_SIZE = 1024
+    QUERY_CACHE_TTL = 3600  # Seconds
+    
+    # Tracing (per-stage latency spans)
+    TRACING_ENABLED = True
+    TRACE_EXPORTER = None  # None (in-memory percentiles only), "jsonl" or "otel"
+    TRACE_FILE = "logs/traces.jsonl"
+    
+    # Startup: models and indexes load on first use; warmup loads them up front
+    WARMUP_ON_START = True  # Used by the Streamlit app
+    
+    # Semantic answer cache (skips the LLM for equivalent questions over the same chunks)
+    ANSWER_CACHE_ENABLED = True
+    ANSWER_CACHE_PATH = "faiss_index/answer_cache.db"
+    ANSWER_CACHE_THRESHOLD = 0.95  # Min cosine similarity between questions
+    ANSWER_CACHE_SIZE = 5000
+    ANSWER_CACHE_TTL = 7 * 24 * 3600  # Seconds
\ No newline at end of file
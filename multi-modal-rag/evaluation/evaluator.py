@@ -1,5 +1,8 @@
 import json
-from typing import List, Dict
+from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import re
+import threading
 import time
 from datetime import datetime
 import sys
@@ -9,13 +12,72 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from pipeline import RAGPipeline
+from src.tracing import tracer, percentiles
+
+RESULTS_PATHS = {
+    'full': 'evaluation/results.json',
+    'retrieval': 'evaluation/retrieval_results.json',
+}
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads"""
+    
+    def __init__(self, rate: Optional[float] = None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+    
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+def is_relevant(question: Dict, content: str, metadata: Dict) -> bool:
+    """Whether a retrieved chunk supports the expected answer
+    
+    Uses 'expected_pages' when the benchmark provides it; otherwise every
+    number in the expected answer (or 60% of its content words) must appear
+    in the chunk.
+    """
+    if question.get('expected_pages'):
+        return metadata.get('page') in question['expected_pages']
+    
+    expected = question.get('expected_answer', '')
+    text = content.lower()
+    numbers = re.findall(r'\d+(?:[.,]\d+)?', expected)
+    if numbers:
+        return all(re.search(rf'(?<![\d.]){re.escape(n)}(?!\d)', text) for n in numbers)
+    
+    words = [w for w in re.findall(r'[a-z]+', expected.lower()) if len(w) > 3]
+    return bool(words) and sum(w in text for w in words) / len(words) >= 0.6
 
 class Evaluator:
-    def __init__(self, pipeline: RAGPipeline):
+    def __init__(self, pipeline: RAGPipeline, workers: int = 4, rate_limit: Optional[float] = None,
+                 mode: str = 'full', results_path: str = None):
+        """
+        workers: questions evaluated concurrently
+        rate_limit: max questions started per second (None = unlimited)
+        mode: 'full' (retrieval + LLM) or 'retrieval' (hit@k / MRR only, no API calls)
+        results_path: checkpoint/results file; defaults to one file per mode
+        """
+        if mode not in RESULTS_PATHS:
+            raise ValueError(f"Unknown mode '{mode}'. Choose from: {', '.join(RESULTS_PATHS)}")
+        
         self.pipeline = pipeline
+        self.workers = max(1, workers)
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.mode = mode
+        self.results_path = results_path or RESULTS_PATHS[mode]
         self.results = []
+        self.fingerprint = None
         self.start_time = None
         self.end_time = None
+        self._lock = threading.Lock()
     
     def load_benchmark(self, path: str = "evaluation/benchmark_questions.json"):
         """Load benchmark questions"""
@@ -23,72 +85,158 @@ class Evaluator:
             data = json.load(f)
         return data['questions']
     
-    def evaluate(self):
-        """Run evaluation"""
-        questions = self.load_benchmark()
+    def run_fingerprint(self, path: str) -> Dict:
+        """What a checkpoint must match to be resumed: mode, index version and question file"""
+        return {
+            'mode': self.mode,
+            'index_version': self.pipeline.embedder.index_version,
+            'questions': os.path.abspath(path),
+        }
+    
+    def load_checkpoint(self, fingerprint: Dict) -> List[Dict]:
+        """Successful results from an interrupted or partly failed run with the same fingerprint"""
+        if not os.path.exists(self.results_path):
+            return []
+        try:
+            with open(self.results_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Warning: could not read checkpoint {self.results_path}: {e}")
+            return []
+        
+        # Files without a fingerprint, another index or another question set start
+        # over, and so does a finished run with nothing left to retry
+        if saved.get('run') != fingerprint or (saved.get('complete') and not saved.get('failed')):
+            print(f"Note: {self.results_path} has nothing to resume for this run; starting over")
+            return []
+        return [r for r in saved.get('results', []) if r.get('success')]
+    
+    def _run_full(self, q: Dict) -> Dict:
+        result = self.pipeline.query(q['question'])
+        
+        # Extract key info
+        answer_preview = result['answer'][:300] + "..." if len(result['answer']) > 300 else result['answer']
+        return {
+            'answer': result['answer'],
+            'answer_preview': answer_preview,
+            'sources': result['sources'],
+            'num_sources': len(result['sources']),
+            # The generator reports API failures in the result rather than raising
+            'success': not result.get('error'),
+            'error': result.get('error'),
+        }
+    
+    def _run_retrieval(self, q: Dict) -> Dict:
+        retrieved = self.pipeline.retrieve(q['question'])
+        
+        relevant = [
+            rank for rank, (doc, meta) in enumerate(zip(retrieved['documents'], retrieved['metadatas']), 1)
+            if is_relevant(q, doc, meta)
+        ]
+        first = relevant[0] if relevant else None
+        return {
+            'retrieved_pages': [meta['page'] for meta in retrieved['metadatas']],
+            'num_sources': len(retrieved['documents']),
+            'first_relevant_rank': first,
+            'reciprocal_rank': 1.0 / first if first else 0.0,
+            'success': True,
+        }
+    
+    def _evaluate_one(self, q: Dict) -> Dict:
+        self.rate_limiter.wait()
+        record = {
+            'id': q['id'],
+            'question': q['question'],
+            'type': q['type'],
+            'category': q['category'],
+            'expected_answer': q.get('expected_answer', 'N/A'),
+        }
+        
+        start_time = time.time()
+        with tracer.span("evaluate_question", question_id=q['id'], mode=self.mode) as span:
+            try:
+                if self.mode == 'retrieval':
+                    record.update(self._run_retrieval(q))
+                else:
+                    record.update(self._run_full(q))
+            except Exception as e:
+                record.update({'success': False, 'error': str(e)})
+        record['latency'] = time.time() - start_time
+        record['timings'] = span.stage_breakdown()
+        
+        return record
+    
+    def _report(self, r: Dict, done: int, total: int):
+        print(f"\n[{done}/{total}] Question {r['id']} ({r['type'].upper()} | {r['category']})")
+        print(f"Q: {r['question']}")
+        if not r.get('success'):
+            print(f"✗ FAILED: {r.get('error')}")
+        elif self.mode == 'retrieval':
+            rank = r['first_relevant_rank']
+            print(f"✓ {'relevant chunk at rank ' + str(rank) if rank else 'no relevant chunk retrieved'} "
+                  f"({r['latency']*1000:.0f}ms)")
+        else:
+            print(f"✓ COMPLETED in {r['latency']:.2f}s")
+            print(f"A: {r['answer_preview']}")
+            print(f"Sources: {r['num_sources']} chunks retrieved")
+    
+    def evaluate(self, path: str = "evaluation/benchmark_questions.json", resume: bool = True):
+        """Run evaluation, checkpointing after every question"""
+        questions = self.load_benchmark(path)
+        
+        self.fingerprint = self.run_fingerprint(path)
+        self.results = self.load_checkpoint(self.fingerprint) if resume else []
+        done_ids = {r['id'] for r in self.results}
+        pending = [q for q in questions if q['id'] not in done_ids]
         
         print("\n" + "=" * 70)
         print("STARTING EVALUATION - MULTI-MODAL RAG SYSTEM")
         print("=" * 70)
         print(f"Total questions: {len(questions)}")
+        print(f"Mode: {self.mode} | Workers: {self.workers}")
+        if done_ids:
+            print(f"Resuming: {len(done_ids)} already done, {len(pending)} to run")
         print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print("=" * 70 + "\n")
         
         self.start_time = time.time()
         
-        for q in questions:
-            print(f"\n{'='*70}")
-            print(f"[Question {q['id']}/{len(questions)}]")
-            print(f"Type: {q['type'].upper()} | Category: {q['category']}")
-            print(f"Q: {q['question']}")
-            print(f"Expected: {q['expected_answer']}")
-            print("-" * 70)
-            
-            start_time = time.time()
-            
-            try:
-                result = self.pipeline.query(q['question'])
-                latency = time.time() - start_time
-                
-                # Extract key info
-                answer_preview = result['answer'][:300] + "..." if len(result['answer']) > 300 else result['answer']
-                
-                self.results.append({
-                    'id': q['id'],
-                    'question': q['question'],
-                    'type': q['type'],
-                    'category': q['category'],
-                    'expected_answer': q.get('expected_answer', 'N/A'),
-                    'answer': result['answer'],
-                    'answer_preview': answer_preview,
-                    'sources': result['sources'],
-                    'num_sources': len(result['sources']),
-                    'latency': latency,
-                    'success': True
-                })
-                
-                print(f"✓ COMPLETED in {latency:.2f}s")
-                print(f"A: {answer_preview}")
-                print(f"Sources: {len(result['sources'])} chunks retrieved")
-                
-            except Exception as e:
-                latency = time.time() - start_time
-                print(f"✗ FAILED: {str(e)}")
-                self.results.append({
-                    'id': q['id'],
-                    'question': q['question'],
-                    'type': q['type'],
-                    'category': q['category'],
-                    'expected_answer': q.get('expected_answer', 'N/A'),
-                    'success': False,
-                    'error': str(e),
-                    'latency': latency
-                })
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._evaluate_one, q) for q in pending]
+            for future in as_completed(futures):
+                r = future.result()
+                with self._lock:
+                    self.results.append(r)
+                    self._report(r, len(self.results), len(questions))
+                    self.write_results()
         
         self.end_time = time.time()
         self.print_summary()
         self.save_results()
     
+    def retrieval_metrics(self, ks=(1, 3, 5)) -> Dict:
+        """hit@k and MRR over successful retrieval-mode results"""
+        scored = [r for r in self.results if r.get('success') and 'reciprocal_rank' in r]
+        if not scored:
+            return {}
+        metrics = {
+            f'hit@{k}': round(sum(1 for r in scored if r['first_relevant_rank'] and r['first_relevant_rank'] <= k) / len(scored), 4)
+            for k in ks
+        }
+        metrics['mrr'] = round(sum(r['reciprocal_rank'] for r in scored) / len(scored), 4)
+        return metrics
+    
+    def stage_breakdown(self) -> Dict:
+        """{stage: {mean, p50, p95, p99}} in ms across the per-question timings"""
+        samples = {}
+        for r in self.results:
+            for stage, ms in r.get('timings', {}).items():
+                samples.setdefault(stage, []).append(ms)
+        return {
+            stage: {'mean': round(sum(values) / len(values), 2), **percentiles(values)}
+            for stage, values in samples.items()
+        }
+    
     def print_summary(self):
         """Print evaluation summary"""
         successful = [r for r in self.results if r.get('success')]
@@ -148,6 +296,15 @@ class Evaluator:
         
         print(f"\n📚 RETRIEVAL METRICS:")
         print(f"  • Avg sources per query: {avg_sources:.1f}")
+        for name, value in self.retrieval_metrics().items():
+            print(f"  • {name.upper()}: {value:.3f}")
+        
+        stages = self.stage_breakdown()
+        if stages:
+            print(f"\n🔬 STAGE BREAKDOWN (ms):")
+            print(f"  {'stage':20s} {'mean':>9s} {'p50':>9s} {'p95':>9s} {'p99':>9s}")
+            for stage, stats in sorted(stages.items(), key=lambda item: item[1]['mean'], reverse=True):
+                print(f"  {stage:20s} {stats['mean']:9.1f} {stats['p50']:9.1f} {stats['p95']:9.1f} {stats['p99']:9.1f}")
         
         print(f"\n📝 PERFORMANCE BY QUESTION TYPE:")
         for qtype, stats in sorted(by_type.items()):
@@ -169,19 +326,29 @@ class Evaluator:
         
         print("\n" + "=" * 70)
     
-    def save_results(self):
-        """Save evaluation results"""
-        os.makedirs('evaluation', exist_ok=True)
-        
-        # Save detailed results
-        with open('evaluation/results.json', 'w', encoding='utf-8') as f:
+    def write_results(self, complete: bool = False):
+        """Write results.json atomically so an interrupted run can resume from it"""
+        os.makedirs(os.path.dirname(self.results_path) or '.', exist_ok=True)
+        tmp_path = self.results_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump({
                 'timestamp': datetime.now().isoformat(),
+                'mode': self.mode,
+                'run': self.fingerprint,
+                'complete': complete,
                 'total_questions': len(self.results),
                 'successful': len([r for r in self.results if r.get('success')]),
                 'failed': len([r for r in self.results if not r.get('success')]),
-                'results': self.results
+                'results': sorted(self.results, key=lambda r: r['id'])
             }, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.results_path)
+    
+    def save_results(self):
+        """Save evaluation results"""
+        os.makedirs('evaluation', exist_ok=True)
+        
+        # Save detailed results
+        self.write_results(complete=True)
         
         # Save summary report
         successful = [r for r in self.results if r.get('success')]
@@ -195,25 +362,44 @@ class Evaluator:
                 'failed': len(self.results) - len(successful),
                 'success_rate': len(successful) / len(self.results) * 100,
                 'avg_latency': round(avg_latency, 2),
-                'avg_sources_per_query': round(sum(r.get('num_sources', 0) for r in successful) / len(successful), 1) if successful else 0
-            }
+                'avg_sources_per_query': round(sum(r.get('num_sources', 0) for r in successful) / len(successful), 1) if successful else 0,
+                **self.retrieval_metrics()
+            },
+            'stages_ms': self.stage_breakdown()
         }
+        summary_path = 'evaluation/summary.json' if self.mode == 'full' else 'evaluation/retrieval_summary.json'
         
-        with open('evaluation/summary.json', 'w', encoding='utf-8') as f:
+        with open(summary_path, 'w', encoding='utf-8') as f:
             json.dump(summary, f, indent=2)
         
         print(f"\n💾 RESULTS SAVED:")
-        print(f"  • evaluation/results.json (detailed results)")
-        print(f"  • evaluation/summary.json (summary metrics)")
+        print(f"  • {self.results_path} (detailed results)")
+        print(f"  • {summary_path} (summary metrics)")
         print("\n" + "=" * 70 + "\n")
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Evaluate the RAG pipeline on the benchmark questions")
+    parser.add_argument("--questions", default="evaluation/benchmark_questions.json")
+    parser.add_argument("--workers", type=int, default=4, help="Questions evaluated concurrently")
+    parser.add_argument("--rate", type=float, default=None, help="Max questions started per second")
+    parser.add_argument("--retrieval-only", action="store_true",
+                        help="Skip the LLM and score hit@k / MRR against the expected answers")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore results from an earlier run")
+    args = parser.parse_args()
+    
     print("\n🚀 Initializing RAG Pipeline...")
     pipeline = RAGPipeline()
     
     print("\n📋 Starting Evaluation...")
-    evaluator = Evaluator(pipeline)
-    evaluator.evaluate()
+    evaluator = Evaluator(
+        pipeline,
+        workers=args.workers,
+        rate_limit=args.rate,
+        mode='retrieval' if args.retrieval_only else 'full'
+    )
+    evaluator.evaluate(args.questions, resume=not args.no_resume)
     
     print("\n✅ Evaluation Complete!")
-    print("Check evaluation/results.json for detailed results")
\ No newline at end of file
+    print(f"Check {evaluator.results_path} for detailed results")
\ No newline at end of file
@@ -0,0 +1,167 @@
+"""
+Minimal OpenAI-compatible chat server for local testing.
+
+Answers every /v1/chat/completions request with a canned reply, streamed
+word by word when the client asks for stream=True. /v1/embeddings returns
+deterministic pseudo-random unit vectors (same text, same vector). Point the
+app at it with:
+
+    python fake_openai_server.py --port 8001 --delay 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=test streamlit run app.py
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import array
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+
+def canned_answer(messages):
+    """Deterministic reply that cites the first source in the prompt"""
+    prompt = messages[-1]['content'] if messages else ''
+    question = re.search(r'Question: (.*)', prompt)
+    source = re.search(r'\[Source (\d+), Page (\d+)', prompt)
+    cite = f" [Source {source.group(1)}, Page {source.group(2)}]" if source else ""
+    asked = question.group(1).strip() if question else "your question"
+    return f"This is a stubbed answer to: {asked}{cite}."
+
+def fake_embedding(text: str, dimension: int):
+    rng = random.Random(hashlib.sha1(text.encode('utf-8')).digest())
+    vector = [rng.gauss(0, 1) for _ in range(dimension)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+def make_handler(delay: float, first_token_delay: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        
+        def log_message(self, format, *args):
+            pass  # Keep benchmark/test output clean
+        
+        def _json(self, status, body):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            
+            if self.path.rstrip('/').endswith('/chat/completions'):
+                self._chat(body)
+            elif self.path.rstrip('/').endswith('/embeddings'):
+                self._embeddings(body)
+            else:
+                self._json(404, {'error': {'message': f'Unknown path {self.path}'}})
+        
+        def _embeddings(self, body):
+            inputs = body.get('input', [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            dimension = body.get('dimensions') or (3072 if body.get('model', '').endswith('large') else 1536)
+            data = []
+            for i, text in enumerate(inputs):
+                vector = fake_embedding(text, dimension)
+                if body.get('encoding_format') == 'base64':
+                    vector = base64.b64encode(array.array('f', vector).tobytes()).decode('ascii')
+                data.append({'object': 'embedding', 'index': i, 'embedding': vector})
+            tokens = sum(len(text.split()) for text in inputs)
+            self._json(200, {
+                'object': 'list',
+                'data': data,
+                'model': body.get('model', 'fake-embedding'),
+                'usage': {'prompt_tokens': tokens, 'total_tokens': tokens}
+            })
+        
+        def _chat(self, body):
+            answer = canned_answer(body.get('messages', []))
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            model = body.get('model', 'fake-model')
+            prompt_tokens = sum(len(m.get('content', '').split()) for m in body.get('messages', []))
+            words = answer.split(' ')
+            
+            time.sleep(first_token_delay)
+            
+            if not body.get('stream'):
+                time.sleep(delay * len(words))
+                self._json(200, {
+                    'id': completion_id,
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': answer},
+                        'finish_reason': 'stop'
+                    }],
+                    'usage': {
+                        'prompt_tokens': prompt_tokens,
+                        'completion_tokens': len(words),
+                        'total_tokens': prompt_tokens + len(words)
+                    }
+                })
+                return
+            
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            
+            for idx, word in enumerate(words):
+                delta = {'content': word if idx == 0 else ' ' + word}
+                if idx == 0:
+                    delta['role'] = 'assistant'
+                self._event({
+                    'id': completion_id,
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]
+                })
+                time.sleep(delay)
+            
+            self._event({
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]
+            })
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+        
+        def _event(self, payload):
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+    
+    return Handler
+
+def start_server(port: int = 0, delay: float = 0.0, first_token_delay: float = 0.0):
+    """Start the server on a background thread; returns (server, base_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(delay, first_token_delay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat server")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay", type=float, default=0.02, help="Seconds between streamed tokens")
+    parser.add_argument("--first-token-delay", type=float, default=0.2, help="Seconds before the first token")
+    args = parser.parse_args()
+    
+    server, base_url = start_server(args.port, args.delay, args.first_token_delay)
+    print(f"Fake OpenAI server listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
\ No newline at end of file
@@ -1,54 +1,608 @@
-from src.ingestion.pdf_processor import MultiModalPDFProcessor
-from src.chunking.smart_chunker import SmartChunker
+import time
+_IMPORT_START = time.perf_counter()
+
+# Heavy dependencies (torch, faiss, openai, pymupdf) are imported where they are first used
 from src.embedding.embedder import MultiModalEmbedder
+from src.embedding.sharding import ShardedEmbedder
+from src.embedding.metadata_index import MetadataFilter
+from src.retrieval.hybrid_retriever import HybridRetriever
+from src.retrieval.reranker import CrossEncoderReranker
 from src.generation.qa_generator import QAGenerator
+from src.caching.answer_cache import SemanticAnswerCache
+from src.caching.lru_cache import normalize_query
+from src.tracing import tracer
 from config import Config
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby, islice
+from typing import Dict, List, Tuple
+import asyncio
+import contextvars
+import numpy as np
+
+IMPORT_MS = (time.perf_counter() - _IMPORT_START) * 1000
 
 class RAGPipeline:
     def __init__(self):
+        start = time.perf_counter()
         self.config = Config()
-        self.embedder = MultiModalEmbedder(use_openai=self.config.USE_OPENAI_EMBEDDINGS)
-        self.qa_generator = QAGenerator()
+        tracer.configure(
+            enabled=self.config.TRACING_ENABLED,
+            exporter=self.config.TRACE_EXPORTER,
+            path=self.config.TRACE_FILE
+        )
+        backend = self.config.EMBEDDING_BACKEND or ('openai' if self.config.USE_OPENAI_EMBEDDINGS else None)
+        backend_options = dict(self.config.EMBEDDING_BACKEND_OPTIONS.get(backend, {}))
+        if backend == 'openai':
+            backend_options.setdefault('base_url', self.config.OPENAI_BASE_URL)
+        embedder_options = dict(
+            use_openai=self.config.USE_OPENAI_EMBEDDINGS,
+            batch_size=self.config.EMBEDDING_BATCH_SIZE,
+            index_type=self.config.INDEX_TYPE,
+            index_params=self.config.INDEX_PARAMS,
+            cache_size=self.config.QUERY_CACHE_SIZE,
+            cache_ttl=self.config.QUERY_CACHE_TTL,
+            backend=backend,
+            model_name=self.config.EMBEDDING_MODEL if backend == 'openai' else self.config.LOCAL_EMBEDDING_MODEL,
+            backend_options=backend_options
+        )
+        if self.config.INDEX_SHARDING:
+            self.embedder = ShardedEmbedder(
+                shard_by=self.config.INDEX_SHARDING,
+                num_shards=self.config.INDEX_SHARDS,
+                search_threads=self.config.SHARD_SEARCH_THREADS,
+                index_path=self.config.INDEX_SHARD_PATH,
+                **embedder_options
+            )
+        else:
+            self.embedder = MultiModalEmbedder(**embedder_options)
+        self.retriever = None
+        if self.config.RETRIEVAL_MODE == "hybrid":
+            self.retriever = HybridRetriever(
+                self.embedder,
+                alpha=self.config.HYBRID_ALPHA,
+                fusion=self.config.FUSION_METHOD,
+                rrf_k=self.config.RRF_K,
+                candidates=self.config.HYBRID_CANDIDATES
+            )
+        elif self.config.RETRIEVAL_MODE != "dense":
+            raise ValueError(f"Unknown RETRIEVAL_MODE '{self.config.RETRIEVAL_MODE}'. Choose 'dense' or 'hybrid'")
+        self.reranker = None
+        if self.config.USE_RERANKING:
+            self.reranker = CrossEncoderReranker(
+                self.config.RERANK_MODEL,
+                batch_size=self.config.RERANK_BATCH_SIZE,
+                cache_size=self.config.RERANK_CACHE_SIZE,
+                cache_ttl=self.config.QUERY_CACHE_TTL,
+                early_exit_margin=self.config.RERANK_EARLY_EXIT_MARGIN,
+                stage_size=self.config.RERANK_STAGE_SIZE
+            )
+        self.qa_generator = QAGenerator(
+            base_url=self.config.OPENAI_BASE_URL,
+            prompt_budgets=self.config.PROMPT_TOKEN_BUDGETS
+        )
+        self.answer_cache = None
+        if self.config.ANSWER_CACHE_ENABLED:
+            self.answer_cache = SemanticAnswerCache(
+                self.config.ANSWER_CACHE_PATH,
+                threshold=self.config.ANSWER_CACHE_THRESHOLD,
+                max_entries=self.config.ANSWER_CACHE_SIZE,
+                ttl=self.config.ANSWER_CACHE_TTL
+            )
+        
+        # Async query path: retrieval threads and a cap on concurrent LLM calls
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.config.QUERY_THREADS, thread_name_prefix="rag-query"
+        )
+        self._llm_semaphore = None  # (event loop, semaphore), created on first aquery
+        
+        # Models, indexes and the LLM client load on first use, so construction is cheap
+        init_ms = (time.perf_counter() - start) * 1000
+        tracer.record("pipeline_init", init_ms)
+        self.startup = {'import_ms': round(IMPORT_MS, 2), 'init_ms': round(init_ms, 2)}
+    
+    def warmup(self) -> Dict:
+        """Load every model and index now instead of on the first query
+
+        Returns ms per component; the result is also kept in self.startup
+        next to the import and constructor times.
+        """
+        def timed(load):
+            start = time.perf_counter()
+            load()
+            return round((time.perf_counter() - start) * 1000, 2)
+        
+        start = time.perf_counter()
+        with tracer.span("warmup"):
+            timings = self.embedder.warmup()
+            if self.retriever:
+                timings['sparse_index'] = timed(self.retriever.warmup)
+            if self.reranker:
+                timings['reranker'] = timed(self.reranker.warmup)
+            timings['llm_client'] = timed(lambda: self.qa_generator.client)
+        
+        self.startup['warmup'] = timings
+        self.startup['warmup_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        return timings
+    
+    def print_startup(self):
+        print("\nCold start:")
+        print(f"  {'import pipeline':24s} {self.startup['import_ms']:10.1f}ms")
+        print(f"  {'RAGPipeline()':24s} {self.startup['init_ms']:10.1f}ms")
+        for component, ms in self.startup.get('warmup', {}).items():
+            print(f"  {'warmup ' + component:24s} {ms:10.1f}ms")
+        if 'warmup_ms' in self.startup:
+            print(f"  {'warmup total':24s} {self.startup['warmup_ms']:10.1f}ms")
+    
+    def _index_stream(self, chunk_lists, chunker) -> int:
+        """Chunk and embed a stream of chunk lists, flushing to the index in batches"""
+        if not self.config.INCREMENTAL_INDEXING:
+            self.embedder.reset()
+        
+        keep_ids = set()
+        pending = []
+        
+        # Parsing and chunking are interleaved with embedding, so their time is
+        # accumulated across the stream and recorded once at the end
+        parse_ms = chunk_ms = 0.0
+        batches = 0
+        chunk_lists = iter(chunk_lists)
+        while True:
+            start = time.perf_counter()
+            chunks = next(chunk_lists, None)
+            parse_ms += (time.perf_counter() - start) * 1000
+            if chunks is None:
+                break
+            batches += 1
+            
+            start = time.perf_counter()
+            chunks = chunker.chunk_text(chunks)
+            pending.extend(chunker.add_context(chunks))
+            chunk_ms += (time.perf_counter() - start) * 1000
+            
+            if len(pending) >= self.config.EMBEDDING_BATCH_SIZE * 8:
+                keep_ids.update(self.embedder.add_chunks(pending))
+                pending = []
+        
+        if pending:
+            keep_ids.update(self.embedder.add_chunks(pending))
+        tracer.record("parse_pdf", parse_ms, batches=batches)
+        tracer.record("chunk", chunk_ms, chunks=len(keep_ids))
+        
+        # Drop chunks that no longer exist in the source documents
+        with tracer.span("prune") as span:
+            removed = self.embedder.prune(keep_ids)
+            span.set_attribute('removed', removed)
+        with tracer.span("save_index"):
+            self.embedder.save_index()
+        if self.retriever:
+            with tracer.span("build_sparse_index"):
+                self.retriever.build_sparse_index()
+        print(f"\n✓ Index synced: {self.embedder.count()} chunks ({removed} removed)")
+        
+        return self.embedder.count()
+    
+    def _chunker(self):
+        """SmartChunker, or SemanticChunker cutting with the index's own embedding model"""
+        from src.chunking.smart_chunker import SmartChunker
+        from src.chunking.semantic_chunker import SemanticChunker
+        
+        if self.config.CHUNKING_STRATEGY == "semantic":
+            return SemanticChunker(
+                self.embedder,
+                min_tokens=self.config.SEMANTIC_MIN_TOKENS,
+                max_tokens=self.config.SEMANTIC_MAX_TOKENS,
+                breakpoint_percentile=self.config.SEMANTIC_BREAKPOINT_PERCENTILE,
+                workers=self.config.CHUNKING_WORKERS
+            )
+        if self.config.CHUNKING_STRATEGY != "recursive":
+            raise ValueError(f"Unknown chunking strategy '{self.config.CHUNKING_STRATEGY}'. "
+                             f"Choose from: recursive, semantic")
+        return SmartChunker(
+            chunk_size=self.config.CHUNK_SIZE,
+            chunk_overlap=self.config.CHUNK_OVERLAP
+        )
+    
+    def _image_options(self):
+        """ImageExtractor arguments from the config, or None when images are off"""
+        if not self.config.IMAGE_EXTRACTION_ENABLED:
+            return None
+        return {
+            'cache_dir': self.config.IMAGE_CACHE_DIR,
+            'ocr': self.config.IMAGE_OCR_ENABLED,
+            'language': self.config.IMAGE_OCR_LANGUAGE,
+        }
     
     def build_index(self):
         """Build the complete RAG index"""
+        from src.ingestion.pdf_processor import MultiModalPDFProcessor
+        from src.ingestion.image_extractor import ImageExtractor
+        
         print("=" * 50)
         print("Starting Multi-Modal RAG Pipeline")
         print("=" * 50)
         
-        # Step 1: Process PDF
-        print("\n[1/4] Processing PDF...")
-        processor = MultiModalPDFProcessor(self.config.PDF_PATH)
-        chunks = processor.process_all()
+        # Steps 1-3 run as one stream: each page is parsed, chunked and
+        # queued for embedding before the next page is read
+        print("\n[1/2] Processing PDF, chunking and embedding page by page...")
+        image_options = self._image_options()
+        processor = MultiModalPDFProcessor(
+            self.config.PDF_PATH,
+            table_strategy=self.config.TABLE_STRATEGY,
+            image_extractor=ImageExtractor(**image_options, workers=self.config.IMAGE_OCR_WORKERS) if image_options else None
+        )
+        chunker = self._chunker()
+        pages = (list(chunks) for _, chunks in groupby(processor.process_all(), key=lambda c: c['page']))
+        if self.config.CHUNKING_STRATEGY == "semantic":
+            # Sentences of several pages share one embedding call
+            page_iter, size = pages, self.config.SEMANTIC_PAGES_PER_BATCH
+            batches = iter(lambda: list(islice(page_iter, size)), [])
+            pages = ([chunk for page in batch for chunk in page] for batch in batches)
+        with tracer.span("build_index", source=self.config.PDF_PATH) as span:
+            total = self._index_stream(pages, chunker)
         
-        # Step 2: Smart chunking
-        print("\n[2/4] Applying smart chunking...")
-        chunker = SmartChunker(
-            chunk_size=self.config.CHUNK_SIZE,
-            chunk_overlap=self.config.CHUNK_OVERLAP
+        print("\n[2/2] ✓ Index built successfully!")
+        print(f"Total indexed chunks: {total}")
+        self._print_timings(span)
+        
+        return total
+    
+    def build_corpus_index(self, corpus_dir: str = None):
+        """Build the index over every PDF in a directory using a worker pool"""
+        from src.ingestion.corpus import CorpusIngestor
+        
+        corpus_dir = corpus_dir or self.config.CORPUS_DIR
+        
+        print("=" * 50)
+        print(f"Indexing corpus: {corpus_dir}")
+        print("=" * 50)
+        
+        ingestor = CorpusIngestor(
+            corpus_dir,
+            workers=self.config.INGEST_WORKERS,
+            pages_per_task=self.config.INGEST_PAGES_PER_TASK,
+            table_strategy=self.config.TABLE_STRATEGY,
+            image_options=self._image_options()
         )
-        chunks = chunker.chunk_text(chunks)
-        chunks = chunker.add_context(chunks)
+        chunker = self._chunker()
+        
+        # Page ranges are chunked and embedded as workers finish them
+        with tracer.span("build_index", source=corpus_dir) as span:
+            total = self._index_stream(ingestor.iter_chunks(), chunker)
+        self._print_timings(span)
         
-        # Step 3: Embed and store
-        print("\n[3/4] Generating embeddings and building index...")
-        self.embedder.embed_and_store(chunks)
+        return total
+    
+    def _print_timings(self, span):
+        breakdown = span.stage_breakdown()
+        if breakdown:
+            print("\nStage timings:")
+            for stage, ms in sorted(breakdown.items(), key=lambda item: item[1], reverse=True):
+                print(f"  {stage:20s} {ms / 1000:8.2f}s")
+    
+    def _retrieve(self, question: str, filters=None):
+        """Query vector and retrieved chunks for a question"""
+        # Over-fetch when a reranker will pick the final chunks
+        n_results = self.config.RERANK_CANDIDATES if self.reranker else self.config.TOP_K
+        filters = MetadataFilter.parse(filters)
         
-        print("\n[4/4] ✓ Index built successfully!")
-        print(f"Total indexed chunks: {len(chunks)}")
+        query_vector = self.embedder.get_query_embedding(question)
+        with tracer.span("search", mode=self.config.RETRIEVAL_MODE, n_results=n_results):
+            if self.retriever:
+                retrieved = self.retriever.search(question, n_results=n_results, query_vector=query_vector,
+                                                  filters=filters)
+            else:
+                retrieved = self.embedder.search_vector(query_vector, n_results=n_results, filters=filters)
         
-        return len(chunks)
+        if self.reranker:
+            with tracer.span("rerank", candidates=len(retrieved['ids'])) as span:
+                scored_before = self.reranker.pairs_scored
+                retrieved = self.reranker.rerank(question, retrieved, top_k=self.config.RERANK_TOP_K)
+                span.set_attribute('pairs_scored', self.reranker.pairs_scored - scored_before)
+        if self.config.TABLE_LOOKUP_ENABLED:
+            retrieved = self._add_table_rows([question], [retrieved], filters)[0]
+        return query_vector, retrieved
     
-    def query(self, question: str):
-        """Query the system"""
-        # Retrieve relevant chunks
-        retrieved = self.embedder.search(question, n_results=self.config.TOP_K)
+    def retrieve(self, question: str, filters=None):
+        """Chunks that would be sent to the LLM for a question, without generating an answer
+
+        filters: restrict retrieval to chunks matching a MetadataFilter, a dict
+            like {'type': 'table_row', 'document': 'report.pdf', 'page': (40, 60),
+            'year': 2025} or a string like 'type=table_row page=40-60'
+        """
+        with tracer.span("retrieve"):
+            return self._retrieve(question, filters)[1]
+    
+    def _retrieve_batch(self, questions: List[str], filters=None):
+        """_retrieve for many questions: one encode pass, one FAISS search, one rerank predict"""
+        n_results = self.config.RERANK_CANDIDATES if self.reranker else self.config.TOP_K
+        filters = MetadataFilter.parse(filters)
+        
+        query_vectors = self.embedder.get_query_embeddings(questions)
+        with tracer.span("search", mode=self.config.RETRIEVAL_MODE, n_results=n_results, queries=len(questions)):
+            if self.retriever:
+                retrieved = self.retriever.search_batch(questions, n_results=n_results, query_vectors=query_vectors,
+                                                        filters=filters)
+            else:
+                retrieved = self.embedder.fetch_many(self.embedder.search_ids_batch(query_vectors, n_results, filters))
+        
+        if self.reranker:
+            with tracer.span("rerank", candidates=sum(len(r['ids']) for r in retrieved)) as span:
+                scored_before = self.reranker.pairs_scored
+                retrieved = self.reranker.rerank_batch(questions, retrieved, top_k=self.config.RERANK_TOP_K)
+                span.set_attribute('pairs_scored', self.reranker.pairs_scored - scored_before)
+        if self.config.TABLE_LOOKUP_ENABLED:
+            retrieved = self._add_table_rows(questions, retrieved, filters)
+        return query_vectors, retrieved
+    
+    def lookup_table(self, question: str, limit: int = None, filters=None) -> List[Dict]:
+        """Table rows whose label matches the question, with the values of the columns it names"""
+        filters = MetadataFilter.parse(filters)
+        with tracer.span("table_lookup", filtered=filters is not None) as span:
+            allowed = set(self.embedder.select_ids(filters).tolist()) if filters else None
+            rows = self.embedder.tables.lookup(question, limit=limit or self.config.TABLE_LOOKUP_TOP_K,
+                                               allowed=allowed)
+            span.set_attribute('rows', len(rows))
+        return rows
+    
+    def _add_table_rows(self, questions: List[str], retrieved: List[Dict], filters=None) -> List[Dict]:
+        """Put confidently matched table rows first in each result, keeping its length
+
+        A row's distance is 1 - its lookup score. Rows the search already
+        found are moved to the front rather than duplicated.
+        """
+        hit_lists = [
+            [(row['id'], 1.0 - row['score']) for row in self.lookup_table(question, filters=filters)
+             if row['score'] >= self.config.TABLE_LOOKUP_MIN_SCORE]
+            for question in questions
+        ]
+        if not any(hit_lists):
+            return retrieved
+        
+        merged = []
+        for rows, result in zip(self.embedder.fetch_many(hit_lists), retrieved):
+            if not rows['ids']:
+                merged.append(result)
+                continue
+            found = set(rows['ids'])
+            keep = [i for i, chunk_id in enumerate(result['ids']) if chunk_id not in found]
+            size = max(len(result['ids']), len(rows['ids']))
+            merged.append({
+                key: (rows[key] + [result[key][i] for i in keep])[:size]
+                for key in ('ids', 'documents', 'metadatas', 'distances')
+            })
+        return merged
+    
+    def retrieve_batch(self, questions: List[str], filters=None) -> List[Dict]:
+        """retrieve for many questions at once, in input order"""
+        if not questions:
+            return []
+        keys, unique = self._unique_questions(questions)
+        with tracer.span("retrieve_batch", questions=len(questions), unique=len(unique)):
+            retrieved = dict(zip(unique, self._retrieve_batch(list(unique.values()), filters)[1]))
+        return [retrieved[key] for key in keys]
+    
+    @staticmethod
+    def _unique_questions(questions: List[str]) -> Tuple[List[str], Dict[str, str]]:
+        """Normalized key per question, and the first phrasing seen for each key"""
+        keys = [normalize_query(question) for question in questions]
+        unique = {}
+        for key, question in zip(keys, questions):
+            unique.setdefault(key, question)
+        return keys, unique
+    
+    def _cached_answer(self, query_vector, retrieved):
+        """Answer to an equivalent question over the same chunks, if one is cached"""
+        if not self.answer_cache:
+            return None
+        with tracer.span("answer_cache") as span:
+            cached = self.answer_cache.lookup(
+                query_vector, retrieved['ids'], self.embedder.index_version, self.qa_generator.model
+            )
+            span.set_attribute('cache_hit', cached is not None)
+        if cached:
+            cached['cached'] = True
+        return cached
+    
+    def _remember_answer(self, query_vector, retrieved, result):
+        if self.answer_cache and not result.get('error'):
+            self.answer_cache.store(
+                query_vector, retrieved['ids'], self.embedder.index_version, result, self.qa_generator.model
+            )
+    
+    def query(self, question: str, filters=None):
+        """Query the system
+
+        filters: only answer from chunks matching them (see retrieve)
+        """
+        with tracer.span("query") as span:
+            # Retrieve relevant chunks
+            query_vector, retrieved = self._retrieve(question, filters)
+            
+            # Reuse the answer to an equivalent question over the same chunks
+            result = self._cached_answer(query_vector, retrieved)
+            if not result:
+                # Generate answer with LLM
+                result = self.qa_generator.generate_answer(question, retrieved)
+                self._remember_answer(query_vector, retrieved, result)
+                result['cached'] = False
+            
+            span.set_attribute('cached', result['cached'])
+            result['timings'] = span.stage_breakdown()
+        
+        return result
+    
+    def query_batch(self, questions: List[str], max_concurrency: int = None, filters=None) -> List[Dict]:
+        """Answer many questions; results come back in input order
+
+        Identical questions (after normalization) are answered once. Retrieval
+        is batched across all of them, then uncached answers are generated on
+        up to max_concurrency threads (default MAX_CONCURRENT_LLM_CALLS).
+        filters apply to every question (see retrieve).
+        """
+        if not questions:
+            return []
+        keys, unique = self._unique_questions(questions)
+        unique_questions = list(unique.values())
+        
+        with tracer.span("query_batch", questions=len(questions), unique=len(unique)) as span:
+            query_vectors, retrieved = self._retrieve_batch(unique_questions, filters)
+            results = [self._cached_answer(query_vectors[i:i + 1], r) for i, r in enumerate(retrieved)]
+            pending = [i for i, result in enumerate(results) if not result]
+            
+            def generate(i):
+                result = self.qa_generator.generate_answer(unique_questions[i], retrieved[i])
+                self._remember_answer(query_vectors[i:i + 1], retrieved[i], result)
+                result['cached'] = False
+                return result
+            
+            if pending:
+                workers = min(max_concurrency or self.config.MAX_CONCURRENT_LLM_CALLS, len(pending))
+                with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="rag-generate") as pool:
+                    # Each call runs in a copy of this context so its spans join the batch trace
+                    futures = [pool.submit(contextvars.copy_context().run, generate, i) for i in pending]
+                    for i, future in zip(pending, futures):
+                        results[i] = future.result()
+            
+            span.set_attribute('cached', len(unique) - len(pending))
         
-        # Generate answer with LLM
-        result = self.qa_generator.generate_answer(question, retrieved)
+        # Duplicates get their own copy of the shared answer
+        by_key = dict(zip(unique, results))
+        return [dict(by_key[key]) for key in keys]
+    
+    async def aquery_batch(self, questions: List[str], filters=None) -> List[Dict]:
+        """Async query_batch; generation is capped by the same semaphore as aquery"""
+        if not questions:
+            return []
+        keys, unique = self._unique_questions(questions)
+        unique_questions = list(unique.values())
+        
+        with tracer.span("query_batch", path="async", questions=len(questions), unique=len(unique)) as span:
+            query_vectors, retrieved = await self.aretrieve_batch(unique_questions, filters)
+            results = await asyncio.gather(*(
+                self.aanswer(question, query_vectors[i:i + 1], retrieved[i])
+                for i, question in enumerate(unique_questions)
+            ))
+            span.set_attribute('cached', sum(result['cached'] for result in results))
+        
+        by_key = dict(zip(unique, results))
+        return [dict(by_key[key]) for key in keys]
+    
+    def stream_query(self, question: str, filters=None):
+        """Query the system, yielding the sources first and then answer tokens as they arrive
+        
+        Yields the same events as QAGenerator.stream_answer; the final 'done'
+        event also carries 'cached' and per-stage 'timings'.
+        """
+        with tracer.span("stream_query") as span:
+            query_vector, retrieved = self._retrieve(question, filters)
+            
+            cached = self._cached_answer(query_vector, retrieved)
+            if cached:
+                span.set_attribute('cached', True)
+                yield {'type': 'sources', 'sources': cached['sources'], 'context_used': cached['context_used']}
+                yield {'type': 'token', 'content': cached['answer']}
+                yield {'type': 'done', **cached, 'timings': span.stage_breakdown()}
+                return
+            
+            for event in self.qa_generator.stream_answer(question, retrieved):
+                if event['type'] == 'done':
+                    self._remember_answer(query_vector, retrieved, {k: v for k, v in event.items() if k != 'type'})
+                    span.set_attribute('cached', False)
+                    event = {**event, 'cached': False, 'timings': span.stage_breakdown()}
+                yield event
+    
+    def _llm_slots(self) -> asyncio.Semaphore:
+        """Semaphore capping in-flight LLM calls for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._llm_semaphore is None or self._llm_semaphore[0] is not loop:
+            self._llm_semaphore = (loop, asyncio.Semaphore(self.config.MAX_CONCURRENT_LLM_CALLS))
+        return self._llm_semaphore[1]
+    
+    def _in_thread(self, fn, *args):
+        """Run fn on the query thread pool without blocking the event loop
         
+        Executor threads don't inherit context variables; each call runs in a
+        copy of ours so its spans join the caller's trace.
+        """
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._executor, contextvars.copy_context().run, fn, *args)
+    
+    async def aretrieve_batch(self, questions: List[str], filters=None) -> Tuple[np.ndarray, List[Dict]]:
+        """Query vectors and retrieved chunks for many questions, in input order
+        
+        The retrieval half of aquery_batch (one encode pass, one FAISS search),
+        run on the query thread pool; aanswer is the other half.
+        """
+        return await self._in_thread(self._retrieve_batch, questions, filters)
+    
+    async def aanswer(self, question: str, query_vector: np.ndarray, retrieved: Dict) -> Dict:
+        """Cached or newly generated answer over already retrieved chunks"""
+        result = await self._in_thread(self._cached_answer, query_vector, retrieved)
+        if result:
+            return result
+        async with self._llm_slots():
+            result = await self.qa_generator.agenerate_answer(question, retrieved)
+        await self._in_thread(self._remember_answer, query_vector, retrieved, result)
+        result['cached'] = False
         return result
+    
+    async def aquery(self, question: str, filters=None):
+        """Async query: CPU-bound retrieval runs on a bounded thread pool and the
+        LLM call is awaited, so one event loop can serve many questions at once"""
+        with tracer.span("query", path="async") as span:
+            # Embedding, FAISS search and SQLite lookups release the loop while they run
+            query_vector, retrieved = await self._in_thread(self._retrieve, question, filters)
+            result = await self.aanswer(question, query_vector, retrieved)
+            span.set_attribute('cached', result['cached'])
+            result['timings'] = span.stage_breakdown()
+        
+        return result
+    
+    def stage_stats(self):
+        """p50/p95/p99 latency (ms) per traced stage since startup"""
+        return tracer.stage_stats()
+    
+    def cache_stats(self):
+        """Hit/miss counters for every cache on the query path"""
+        stats = self.embedder.cache_stats()
+        if self.reranker:
+            stats['rerank_scores'] = self.reranker.stats()
+        if self.answer_cache:
+            stats['answers'] = self.answer_cache.stats()
+        return stats
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Build the RAG index")
+    parser.add_argument("--corpus", nargs="?", const=Config.CORPUS_DIR,
+                        help="Index every PDF in a directory instead of Config.PDF_PATH")
+    parser.add_argument("--cold-start", action="store_true",
+                        help="Report import, construction and warmup times instead of building the index")
+    parser.add_argument("--embedding-parity", metavar="BACKEND",
+                        help="Compare another embedding backend (e.g. onnx-int8) against the configured one "
+                             "on the indexed chunks instead of building the index")
+    args = parser.parse_args()
+    
     pipeline = RAGPipeline()
-    pipeline.build_index()
\ No newline at end of file
+    if args.cold_start:
+        from src.tracing import import_times
+        
+        pipeline.warmup()
+        pipeline.print_startup()
+        print("\nImport time of heavy dependencies (fresh interpreter each):")
+        for module, ms in import_times().items():
+            print(f"  {module:26s} " + (f"{ms:10.1f}ms" if ms is not None else "  not installed"))
+    elif args.embedding_parity:
+        import json
+        
+        backend = args.embedding_parity
+        with open("evaluation/benchmark_questions.json", 'r', encoding='utf-8') as f:
+            questions = [q['question'] for q in json.load(f)['questions']]
+        options = dict(Config.EMBEDDING_BACKEND_OPTIONS.get(backend, {}))
+        options['model_name'] = Config.EMBEDDING_MODEL if backend == 'openai' else Config.LOCAL_EMBEDDING_MODEL
+        pipeline.embedder.parity_report(backend, queries=questions, candidate_options=options)
+    elif args.corpus:
+        pipeline.build_corpus_index(args.corpus)
+    else:
+        pipeline.build_index()
\ No newline at end of file
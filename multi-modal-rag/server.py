@@ -0,0 +1,122 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Union
+
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, field_validator
+
+from pipeline import RAGPipeline
+from src.serving import QueryScheduler, Overloaded
+from config import Config
+
+class Question(BaseModel):
+    question: str = Field(min_length=1)
+    filters: Optional[Union[str, Dict]] = None  # See RAGPipeline.retrieve
+    
+    @field_validator('question', mode='before')
+    @classmethod
+    def strip_question(cls, value):
+        # Whitespace-only questions fail min_length (422) before reaching the scheduler
+        return value.strip() if isinstance(value, str) else value
+
+class ResultResponse(JSONResponse):
+    """JSON response that accepts the numpy scalars found in search results"""
+    
+    def render(self, content) -> bytes:
+        def plain(value):
+            if isinstance(value, np.generic):
+                return value.item()
+            if isinstance(value, np.ndarray):
+                return value.tolist()
+            raise TypeError(f"{type(value).__name__} is not JSON serializable")
+        return json.dumps(content, default=plain, ensure_ascii=False).encode('utf-8')
+
+pipeline = RAGPipeline()
+scheduler = QueryScheduler(
+    pipeline,
+    window_ms=Config.BATCH_WINDOW_MS,
+    max_batch=Config.MAX_BATCH_SIZE,
+    max_in_flight=Config.MAX_IN_FLIGHT
+)
+state = {'ready': False, 'draining': False, 'error': None}
+
+def _load():
+    if Config.WARMUP_ON_START:
+        pipeline.warmup()
+    if pipeline.embedder.count() == 0:
+        raise RuntimeError("The index is empty; run `python pipeline.py` first")
+
+async def _warmup():
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, _load)
+        state['ready'] = True
+    except Exception as e:
+        state['error'] = str(e)
+        print(f"Warmup failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Listen immediately; /readyz reports 503 until models and indexes are loaded
+    warmup = asyncio.ensure_future(_warmup())
+    yield
+    state['ready'], state['draining'] = False, True
+    warmup.cancel()
+    await scheduler.drain()
+
+app = FastAPI(title="Multi-Modal RAG API", lifespan=lifespan)
+
+async def _serve(handler, request: Question):
+    if state['draining']:
+        raise HTTPException(status_code=503, detail="Shutting down", headers={'Retry-After': '1'})
+    try:
+        return ResultResponse(await handler(request.question, filters=request.filters))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=f"Overloaded: {e}", headers={'Retry-After': '1'})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/query")
+async def query(request: Question):
+    """Answer a question; concurrent questions share retrieval batches"""
+    return await _serve(scheduler.query, request)
+
+@app.post("/retrieve")
+async def retrieve(request: Question):
+    """Chunks that would be sent to the LLM, without generating an answer"""
+    return await _serve(scheduler.retrieve, request)
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and its event loop responds"""
+    return {'status': 'ok'}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: warmed up, index loaded, not shutting down and below the in-flight limit"""
+    checks = {
+        'warmed_up': state['ready'],
+        'draining': state['draining'],
+        'saturated': scheduler.saturated(),
+        'error': state['error'],
+    }
+    ready = state['ready'] and not state['draining'] and not scheduler.saturated()
+    return JSONResponse({'ready': ready, **checks}, status_code=200 if ready else 503)
+
+@app.get("/metrics")
+async def metrics():
+    """Queue depth, batching and coalescing counters, stage latencies and cache hit rates"""
+    return ResultResponse({
+        'scheduler': scheduler.stats(),
+        'stages': pipeline.stage_stats(),
+        'caches': pipeline.cache_stats(),
+        'startup': pipeline.startup,
+    })
+
+if __name__ == "__main__":
+    import uvicorn
+    
+    # One worker per node: the models and indexes are loaded once and shared by every request
+    uvicorn.run(app, host=Config.SERVER_HOST, port=Config.SERVER_PORT)
\ No newline at end of file
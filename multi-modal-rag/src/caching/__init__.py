@@ -0,0 +1,10 @@
+# src/caching/__init__.py
+"""
+Caching module
+Bounded in-process caches for query embeddings, retrieval results and answers
+"""
+
+from .lru_cache import TTLCache, normalize_query
+from .answer_cache import SemanticAnswerCache
+
+__all__ = ['TTLCache', 'normalize_query', 'SemanticAnswerCache']
@@ -0,0 +1,129 @@
+from typing import Dict, List, Optional
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+class SemanticAnswerCache:
+    """Persistent cache of generated answers, matched by question similarity
+
+    An entry is reused only when the new question retrieved exactly the same
+    chunks (same index version) and its embedding is within `threshold`
+    cosine similarity of the cached question.
+    """
+    
+    def __init__(self, db_path: str, threshold: float = 0.95, max_entries: int = 5000,
+                 ttl: Optional[float] = None):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    index_version TEXT NOT NULL,
+                    context_key TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    result TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS answers_context ON answers (index_version, context_key)"
+            )
+            self._conn.commit()
+    
+    @staticmethod
+    def context_key(chunk_ids: List[int], model: str = '') -> str:
+        """Order-insensitive key for the retrieved chunk set (plus the LLM that answered)"""
+        key = model + ':' + ','.join(str(i) for i in sorted(chunk_ids))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+    
+    def lookup(self, vector: np.ndarray, chunk_ids: List[int], index_version: str,
+               model: str = '') -> Optional[Dict]:
+        """Stored result for a semantically equivalent question, or None"""
+        vector = np.asarray(vector, dtype='float32').ravel()
+        now = time.time()
+        
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, vector, result, created FROM answers WHERE index_version = ? AND context_key = ?",
+                (index_version, self.context_key(chunk_ids, model))
+            ).fetchall()
+            
+            best_id, best_score, best_result = None, -1.0, None
+            for row_id, blob, result, created in rows:
+                if self.ttl is not None and now - created > self.ttl:
+                    continue
+                cached = np.frombuffer(blob, dtype='float32')
+                score = float(vector @ cached / (np.linalg.norm(vector) * np.linalg.norm(cached) + 1e-10))
+                if score > best_score:
+                    best_id, best_score, best_result = row_id, score, result
+            
+            if best_id is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+            
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, best_id))
+            self._conn.commit()
+            self.hits += 1
+        
+        result = json.loads(best_result)
+        result['cache_similarity'] = round(best_score, 4)
+        return result
+    
+    def store(self, vector: np.ndarray, chunk_ids: List[int], index_version: str, result: Dict,
+              model: str = ''):
+        vector = np.asarray(vector, dtype='float32').ravel()
+        now = time.time()
+        
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO answers (index_version, context_key, vector, result, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (index_version, self.context_key(chunk_ids, model), vector.tobytes(),
+                 json.dumps(result), now, now)
+            )
+            self._evict(index_version, now)
+            self._conn.commit()
+    
+    def _evict(self, index_version: str, now: float):
+        # Answers for another index version can never match again
+        self._conn.execute("DELETE FROM answers WHERE index_version != ?", (index_version,))
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+        
+        # Least recently used beyond max_entries
+        self._conn.execute("""
+            DELETE FROM answers WHERE id IN (
+                SELECT id FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+    
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'size': size,
+            'max_size': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
\ No newline at end of file
@@ -0,0 +1,74 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import re
+import threading
+import time
+import unicodedata
+
+def normalize_query(text: str) -> str:
+    """Canonical form of a question so trivially different phrasings share cache entries"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.rstrip('?!. ')
+
+class TTLCache:
+    """Thread-safe LRU cache with an optional time-to-live per entry"""
+    
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        """
+        max_size: entries kept before the least recently used is evicted
+        ttl: seconds an entry stays valid (None = no expiry)
+        """
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            stored_at, value = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
\ No newline at end of file
@@ -5,5 +5,6 @@ Semantic and structural document segmentation
 """
 
 from .smart_chunker import SmartChunker
+from .semantic_chunker import SemanticChunker
 
-__all__ = ['SmartChunker']
+__all__ = ['SmartChunker', 'SemanticChunker']
@@ -0,0 +1,181 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+import math
+import os
+import re
+import numpy as np
+
+from .smart_chunker import SmartChunker
+from ..tracing import tracer
+
+# Candidate sentence ends: terminal punctuation (plus closing quotes/brackets) and whitespace
+SENTENCE_END = re.compile(r"[.!?][\"'”’)\]]*\s+")
+SENTENCE_START = re.compile(r"[\"'“‘(\[]?[A-Z0-9•▪–-]")
+ABBREVIATIONS = {
+    'e.g', 'i.e', 'etc', 'vs', 'cf', 'no', 'nos', 'fig', 'figs', 'p', 'pp', 'para', 'st', 'mr', 'mrs',
+    'ms', 'dr', 'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec',
+    'u.s', 'u.k', 'u.a.e', 'approx', 'est', 'incl', 'avg'
+}
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences of a paragraph; line breaks and bullets inside it are treated as spaces"""
+    text = re.sub(r"\s+", " ", text).strip()
+    sentences, start = [], 0
+    for match in SENTENCE_END.finditer(text):
+        end = match.end()
+        previous = text[start:match.start()].rsplit(' ', 1)[-1].lower()
+        if end >= len(text) or not SENTENCE_START.match(text, end):
+            continue
+        if previous in ABBREVIATIONS or len(previous) == 1:
+            continue  # "e.g. GDP", "U.S. dollar", "A. Fiscal policy"
+        sentences.append(text[start:match.start() + 1].strip())
+        start = end
+    if text[start:].strip():
+        sentences.append(text[start:].strip())
+    return sentences
+
+def segment(distances: np.ndarray, tokens: List[int], min_tokens: int, max_tokens: int,
+            threshold: float) -> List[Tuple[int, int]]:
+    """[start, end) sentence ranges for one page
+
+    distances[i - 1] is the cosine distance between sentences i - 1 and i.
+    A chunk ends at a distance of at least threshold once it holds
+    min_tokens; a chunk that would pass max_tokens ends at its strongest
+    boundary after min_tokens instead.
+    """
+    ranges, start, size = [], 0, 0
+    for i, count in enumerate(tokens):
+        if i > start and size + count <= max_tokens and size >= min_tokens and distances[i - 1] >= threshold:
+            ranges.append((start, i))
+            start, size = i, 0
+        while i > start and size + count > max_tokens:
+            sizes = np.cumsum(tokens[start:i])
+            candidates = [j for j in range(start + 1, i + 1) if sizes[j - start - 1] >= min_tokens] or [i]
+            cut = max(candidates, key=lambda j: (distances[j - 1], j))
+            ranges.append((start, cut))
+            start, size = cut, int(sum(tokens[cut:i]))
+        size += count
+    ranges.append((start, len(tokens)))
+    
+    # A short tail joins the chunk before it when both fit
+    if len(ranges) > 1 and size < min_tokens and sum(tokens[ranges[-2][0]:]) <= max_tokens:
+        ranges[-2:] = [(ranges[-2][0], len(tokens))]
+    return ranges
+
+class SemanticChunker(SmartChunker):
+    """Re-chunks each page's text where the topic shifts
+
+    A page's paragraphs are split into sentences and every sentence is
+    embedded with the index's own model (one batched call per chunk_text
+    call). A chunk ends where consecutive sentences are least similar -
+    distances above the page's breakpoint_percentile - as long as it holds
+    min_tokens, and never grows past max_tokens model tokens. Sentence
+    splitting, token counting and cutting run per page on a thread pool.
+
+    Chunks get a per-page chunk_id (0, 1, ...) in reading order. Cuts depend
+    only on the page's own text, so unchanged pages produce the same chunks,
+    and with them the same content-addressed vector IDs, on every rebuild.
+    Table, row and image chunks pass through unchanged.
+    """
+    
+    def __init__(self, embedder, min_tokens: int = 50, max_tokens: int = 200,
+                 breakpoint_percentile: float = 85.0, workers: Optional[int] = None,
+                 chunk_size: int = 500, chunk_overlap: int = 50):
+        """
+        embedder: MultiModalEmbedder whose model embeds and counts tokens
+        max_tokens: upper bound per chunk; all-MiniLM-L6-v2 reads at most 256
+        workers: threads for the per-page work (defaults to one per CPU core, max 8)
+        """
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.embedder = embedder
+        self.min_tokens = min_tokens
+        self.max_tokens = max(max_tokens, min_tokens)
+        self.breakpoint_percentile = breakpoint_percentile
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self._pool = None
+    
+    def _map(self, fn, items):
+        if self.workers <= 1 or len(items) <= 1:
+            return [fn(item) for item in items]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rag-chunk")
+        return list(self._pool.map(fn, items))
+    
+    def _sentences(self, paragraphs: List[Dict]) -> Tuple[List[str], List[int]]:
+        """A page's sentences with their token counts; sentences over max_tokens are cut into word runs"""
+        sentences = [s for paragraph in paragraphs for s in split_sentences(paragraph['content'])]
+        counts = self.embedder.backend.count_tokens(sentences) if sentences else []
+        
+        pieces, piece_counts = [], []
+        for sentence, count in zip(sentences, counts):
+            if count <= self.max_tokens:
+                pieces.append(sentence)
+                piece_counts.append(count)
+                continue
+            words = sentence.split()
+            parts = math.ceil(count / self.max_tokens)
+            step = math.ceil(len(words) / parts)
+            for start in range(0, len(words), step):
+                pieces.append(" ".join(words[start:start + step]))
+                piece_counts.append(math.ceil(count * len(words[start:start + step]) / len(words)))
+        return pieces, piece_counts
+    
+    def _page_chunks(self, task) -> List[Dict]:
+        paragraphs, sentences, counts, vectors = task
+        if not sentences:
+            return []
+        
+        # Rounded, so float noise between batch compositions can't move a cut
+        unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        distances = np.round(1.0 - np.sum(unit[1:] * unit[:-1], axis=1), 4)
+        threshold = float(np.percentile(distances, self.breakpoint_percentile)) if len(distances) else 1.0
+        
+        base = paragraphs[0]
+        chunks = []
+        for chunk_id, (start, end) in enumerate(segment(distances, counts, self.min_tokens, self.max_tokens, threshold)):
+            chunks.append({
+                **base,
+                'content': " ".join(sentences[start:end]),
+                'metadata': {
+                    **base['metadata'],
+                    'chunk_id': chunk_id,
+                    'chunking': 'semantic',
+                    'tokens': int(sum(counts[start:end])),
+                    'sentences': end - start
+                }
+            })
+        return chunks
+    
+    def chunk_text(self, chunks: List[Dict]) -> List[Dict]:
+        """Semantic chunks for the text of every page in `chunks`, followed by that page's other chunks"""
+        pages = {}
+        for chunk in chunks:
+            key = (chunk.get('metadata', {}).get('document'), chunk['page'])
+            pages.setdefault(key, {'text': [], 'other': []})
+            pages[key]['text' if chunk['type'] == 'text' else 'other'].append(chunk)
+        
+        with tracer.span("semantic_chunking", pages=len(pages)) as span:
+            groups = list(pages.values())
+            split = self._map(lambda group: self._sentences(group['text']), groups)
+            
+            # One batched encode for every sentence of every page
+            sentences = [s for page_sentences, _ in split for s in page_sentences]
+            vectors = self.embedder.get_embeddings(sentences) if sentences else None
+            span.set_attribute('sentences', len(sentences))
+            
+            tasks, offset = [], 0
+            for group, (page_sentences, counts) in zip(groups, split):
+                tasks.append((group['text'], page_sentences, counts, vectors[offset:offset + len(page_sentences)]
+                              if page_sentences else None))
+                offset += len(page_sentences)
+            text_chunks = self._map(self._page_chunks, tasks)
+        
+        chunked = []
+        for group, page_chunks in zip(groups, text_chunks):
+            chunked.extend(page_chunks)
+            chunked.extend(group['other'])
+        return chunked
+    
+    def add_context(self, chunks: List[Dict]) -> List[Dict]:
+        """No neighbour snippets: chunks are cut at topic shifts to stand on their own"""
+        return chunks
\ No newline at end of file
@@ -3,6 +3,7 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 class SmartChunker:
     def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50):
+        self.chunk_size = chunk_size
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
@@ -12,10 +13,15 @@ class SmartChunker:
     def chunk_text(self, chunks: List[Dict]) -> List[Dict]:
         """Apply semantic chunking to text"""
         chunked = []
+        paragraphs = {}  # (document, page) -> text chunks seen on that page
         
         for chunk in chunks:
-            if chunk['type'] == 'text' and len(chunk['content']) > 1000:
-                # Split long text
+            if chunk['type'] == 'text':
+                position = (chunk['metadata'].get('document'), chunk['page'])
+                para_id = paragraphs.get(position, 0)
+                paragraphs[position] = para_id + 1
+            if chunk['type'] == 'text' and len(chunk['content']) > self.chunk_size:
+                # Split long text; (para_id, chunk_id) places a split within its page
                 splits = self.text_splitter.split_text(chunk['content'])
                 for idx, split in enumerate(splits):
                     chunked.append({
@@ -23,6 +29,7 @@ class SmartChunker:
                         'content': split,
                         'metadata': {
                             **chunk['metadata'],
+                            'para_id': para_id,
                             'chunk_id': idx
                         }
                     })
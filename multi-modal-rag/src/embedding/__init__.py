@@ -5,6 +5,10 @@ Handles text embeddings and ChromaDB operations
 """
 
 from .embedder import MultiModalEmbedder
+from .sharding import ShardedEmbedder
+from .document_store import DocumentStore
+from .table_store import TableStore
+from .metadata_index import MetadataFilter, MetadataIndex
+from .backends import EmbeddingBackend, create_backend, parity_report
 
-__all__ = ['MultiModalEmbedder']
-
+__all__ = ['MultiModalEmbedder', 'ShardedEmbedder', 'DocumentStore', 'TableStore', 'MetadataFilter', 'MetadataIndex', 'EmbeddingBackend', 'create_backend', 'parity_report']
@@ -0,0 +1,361 @@
+from typing import Dict, List, Optional
+import inspect
+import json
+import os
+import re
+import threading
+import time
+import numpy as np
+
+from ..tracing import tracer
+
+BACKENDS = ('sentence-transformers', 'onnx-int8', 'openai')
+
+# Output size of known models, so the index can be sized before a model is loaded
+MODEL_DIMENSIONS = {
+    'all-MiniLM-L6-v2': 384,
+    'sentence-transformers/all-MiniLM-L6-v2': 384,
+    'text-embedding-3-small': 1536,
+    'text-embedding-3-large': 3072,
+    'text-embedding-ada-002': 1536,
+}
+
+class EmbeddingBackend:
+    """Turns texts into float32 (n, dimension) vectors; the model loads on first use"""
+    
+    name = None
+    
+    def __init__(self, model_name: str, dimension: Optional[int] = None, batch_size: Optional[int] = None):
+        """
+        dimension: output size; only needed for models missing from MODEL_DIMENSIONS
+        batch_size: texts per encode call, overriding the embedder's batch size
+        """
+        self.model_name = model_name
+        self.dimension = dimension or MODEL_DIMENSIONS.get(model_name)
+        if self.dimension is None:
+            raise ValueError(f"Unknown output dimension for '{model_name}'; pass dimension=")
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+    
+    @property
+    def space(self) -> str:
+        """Vectors from backends in the same space can share one index"""
+        return self.model_name
+    
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    with tracer.span("load_embedding_model", backend=self.name, model=self.model_name):
+                        self._model = self._load()
+        return self._model
+    
+    def _load(self):
+        raise NotImplementedError
+    
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        raise NotImplementedError
+    
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dimension), dtype='float32')
+        return np.asarray(self._encode(list(texts), max(1, batch_size)), dtype='float32')
+    
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Model tokens per text, without special tokens; estimated from words and punctuation
+        unless the backend has the model's tokenizer"""
+        return [len(re.findall(r"\w+|[^\w\s]", text)) for text in texts]
+    
+    @staticmethod
+    def _tokenizer_counts(tokenizer, texts: List[str]) -> List[int]:
+        # Fast (Rust) tokenizers encode the whole batch in parallel
+        return [len(ids) for ids in tokenizer(list(texts), add_special_tokens=False)['input_ids']]
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """fp32 PyTorch model through sentence-transformers (the original behaviour)"""
+    
+    name = 'sentence-transformers'
+    
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', device: str = 'cpu', **kwargs):
+        super().__init__(model_name, **kwargs)
+        self.device = device
+    
+    def _load(self):
+        from sentence_transformers import SentenceTransformer
+        # Always use local embeddings (free)
+        print("Using FREE local embeddings (Sentence Transformers)")
+        return SentenceTransformer(self.model_name, device=self.device)
+    
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+    
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        tokenizer = getattr(self.model, 'tokenizer', None)
+        if tokenizer is None:
+            return super().count_tokens(texts)
+        return self._tokenizer_counts(tokenizer, texts)
+
+class OnnxBackend(EmbeddingBackend):
+    """The same sentence-transformers model exported to ONNX Runtime with int8 dynamic quantization
+
+    The export runs once (needs torch, transformers and onnx) and is cached
+    under cache_dir; afterwards only onnxruntime and the tokenizer are loaded.
+    Vectors stay in the source model's space, so an index built with the
+    PyTorch backend keeps working (see parity_report for how close they are).
+    """
+    
+    name = 'onnx-int8'
+    
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', cache_dir: str = './models',
+                 quantize: bool = True, threads: Optional[int] = None, **kwargs):
+        """
+        quantize: False runs the fp32 export (useful to separate export drift from quantization drift)
+        threads: ONNX Runtime intra-op threads (None = one per core)
+        """
+        super().__init__(model_name, **kwargs)
+        self.model_dir = os.path.join(cache_dir, model_name.replace('/', '__') + '-onnx')
+        self.quantize = quantize
+        self.threads = threads
+    
+    @property
+    def model_file(self) -> str:
+        return os.path.join(self.model_dir, 'model.int8.onnx' if self.quantize else 'model.onnx')
+    
+    def export(self):
+        """Export the transformer to ONNX and write the int8 quantized copy next to it"""
+        import torch
+        from sentence_transformers import SentenceTransformer
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        
+        print(f"Exporting {self.model_name} to ONNX (one-off)...")
+        source = SentenceTransformer(self.model_name, device='cpu')
+        # Older sentence-transformers spell the pooling mode as one flag per mode
+        config = source[1].get_config_dict()
+        mode = config.get('pooling_mode')
+        if mode is None:
+            mode = 'mean' if config.get('pooling_mode_mean_tokens') else 'cls' if config.get('pooling_mode_cls_token') else None
+        if mode not in ('mean', 'cls'):
+            raise ValueError(f"{self.model_name}: only mean or CLS pooling can be exported")
+        
+        os.makedirs(self.model_dir, exist_ok=True)
+        source.tokenizer.save_pretrained(self.model_dir)
+        with open(os.path.join(self.model_dir, 'pooling.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'pooling': mode,
+                'normalize': any(type(module).__name__ == 'Normalize' for module in source),
+                'max_length': source.max_seq_length,
+            }, f)
+        
+        dummy = source.tokenizer(["an example sentence"], return_tensors='pt')
+        input_names = list(dummy.keys())
+        
+        class Transformer(torch.nn.Module):
+            """Positional inputs in tokenizer order -> last hidden state"""
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+            
+            def forward(self, *inputs):
+                return self.model(**dict(zip(input_names, inputs)), return_dict=False)[0]
+        
+        options = {}
+        if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+            options['dynamo'] = False  # The TorchScript exporter handles dynamic axes without onnxscript
+        fp32_file = os.path.join(self.model_dir, 'model.onnx')
+        torch.onnx.export(
+            Transformer(source[0].auto_model.eval()),
+            tuple(dummy[name] for name in input_names),
+            fp32_file,
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes={name: {0: 'batch', 1: 'sequence'} for name in input_names + ['last_hidden_state']},
+            opset_version=14,
+            **options
+        )
+        quantize_dynamic(fp32_file, os.path.join(self.model_dir, 'model.int8.onnx'), weight_type=QuantType.QInt8)
+        
+        sizes = {name: os.path.getsize(os.path.join(self.model_dir, name)) / 1e6
+                 for name in ('model.onnx', 'model.int8.onnx')}
+        print(f"✓ ONNX export: {sizes['model.onnx']:.1f}MB fp32, {sizes['model.int8.onnx']:.1f}MB int8")
+    
+    def _load(self):
+        if not os.path.exists(self.model_file):
+            self.export()
+        
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        
+        print(f"Using ONNX Runtime embeddings ({os.path.basename(self.model_file)})")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        session = ort.InferenceSession(self.model_file, options, providers=['CPUExecutionProvider'])
+        with open(os.path.join(self.model_dir, 'pooling.json'), 'r', encoding='utf-8') as f:
+            pooling = json.load(f)
+        return AutoTokenizer.from_pretrained(self.model_dir), session, pooling
+    
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        tokenizer, session, pooling = self.model
+        inputs = {i.name for i in session.get_inputs()}
+        
+        # Longest first, so texts of similar length share a batch and padding stays small
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        embeddings = np.empty((len(texts), self.dimension), dtype='float32')
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            encoded = tokenizer(
+                [texts[i] for i in rows], padding=True, truncation=True,
+                max_length=pooling['max_length'], return_tensors='np'
+            )
+            hidden = session.run(None, {k: v.astype('int64') for k, v in encoded.items() if k in inputs})[0]
+            
+            if pooling['pooling'] == 'cls':
+                vectors = hidden[:, 0]
+            else:
+                mask = encoded['attention_mask'][..., None].astype('float32')
+                vectors = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if pooling['normalize']:
+                vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            embeddings[rows] = vectors
+        
+        return embeddings
+    
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        return self._tokenizer_counts(self.model[0], texts)
+
+class OpenAIBackend(EmbeddingBackend):
+    """OpenAI embeddings API, many texts per request"""
+    
+    name = 'openai'
+    
+    def __init__(self, model_name: str = 'text-embedding-3-small', api_key: Optional[str] = None,
+                 base_url: Optional[str] = None, batch_size: int = 256, max_retries: int = 5, **kwargs):
+        """
+        batch_size: inputs per request (the API accepts up to 2048)
+        max_retries: client retries with backoff on rate limits and transient errors
+        """
+        super().__init__(model_name, batch_size=min(batch_size, 2048), **kwargs)
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY')
+        if not self.api_key:
+            raise ValueError("OpenAI API key not found!")
+        self.base_url = base_url or os.getenv('OPENAI_BASE_URL')
+        self.max_retries = max_retries
+        self.tokens_used = 0
+    
+    @property
+    def space(self) -> str:
+        return f"openai:{self.model_name}:{self.dimension}"
+    
+    def _load(self):
+        from openai import OpenAI
+        return OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=self.max_retries)
+    
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        options = {}
+        if self.dimension != MODEL_DIMENSIONS.get(self.model_name):
+            options['dimensions'] = self.dimension  # text-embedding-3 models can be shortened
+        
+        embeddings = np.empty((len(texts), self.dimension), dtype='float32')
+        for start in range(0, len(texts), batch_size):
+            # The API rejects empty strings
+            batch = [text if text.strip() else " " for text in texts[start:start + batch_size]]
+            with tracer.span("openai_embeddings", inputs=len(batch)) as span:
+                response = self.model.embeddings.create(model=self.model_name, input=batch, **options)
+                span.set_attribute('tokens', response.usage.total_tokens)
+            self.tokens_used += response.usage.total_tokens
+            for item in response.data:
+                embeddings[start + item.index] = item.embedding
+        
+        return embeddings
+    
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        try:
+            import tiktoken
+        except ImportError:
+            return super().count_tokens(texts)
+        try:
+            encoding = tiktoken.encoding_for_model(self.model_name)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return [len(tokens) for tokens in encoding.encode_batch(list(texts))]
+
+def create_backend(name: str, model_name: Optional[str] = None, **options) -> EmbeddingBackend:
+    """Backend by name: 'sentence-transformers', 'onnx-int8' or 'openai'"""
+    classes = {
+        'sentence-transformers': SentenceTransformerBackend,
+        'onnx-int8': OnnxBackend,
+        'openai': OpenAIBackend,
+    }
+    if name not in classes:
+        raise ValueError(f"Unknown embedding backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+    if model_name:
+        options['model_name'] = model_name
+    return classes[name](**options)
+
+def parity_report(reference: EmbeddingBackend, candidate: EmbeddingBackend, texts: List[str],
+                  queries: List[str], k: int = 10, batch_size: int = 64) -> Dict:
+    """Accuracy and speed of `candidate` relative to `reference`
+
+    topk_overlap is the share of each query's top-k texts (by cosine) that both
+    backends agree on; it is comparable across embedding spaces. cosine_* compare
+    the vectors themselves and are only reported when both share a space.
+    """
+    def run(backend):
+        backend.encode(texts[:1], batch_size)  # Load the model outside the timings
+        start = time.perf_counter()
+        docs = backend.encode(texts, batch_size)
+        ingest_s = time.perf_counter() - start
+        
+        latencies = []
+        query_vectors = []
+        for query in queries:
+            start = time.perf_counter()
+            query_vectors.append(backend.encode([query], 1)[0])
+            latencies.append((time.perf_counter() - start) * 1000)
+        return docs, np.stack(query_vectors), ingest_s, latencies
+    
+    def unit(vectors):
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    
+    k = min(k, len(texts))
+    report = {'reference': reference.name, 'candidate': candidate.name, 'texts': len(texts), 'queries': len(queries)}
+    docs, top = {}, {}
+    for role, backend in (('reference', reference), ('candidate', candidate)):
+        docs[role], query_vectors, ingest_s, latencies = run(backend)
+        top[role] = np.argsort(-(unit(query_vectors) @ unit(docs[role]).T), axis=1)[:, :k]
+        report[f'{role}_texts_per_sec'] = round(len(texts) / ingest_s, 1) if ingest_s else 0.0
+        report[f'{role}_query_p50_ms'] = round(float(np.percentile(latencies, 50)), 3)
+    
+    report['topk_overlap'] = round(float(np.mean([
+        len(set(a) & set(b)) / k for a, b in zip(top['reference'], top['candidate'])
+    ])), 4)
+    if reference.space == candidate.space:
+        cosine = np.sum(unit(docs['reference']) * unit(docs['candidate']), axis=1)
+        report['cosine_mean'] = round(float(cosine.mean()), 5)
+        report['cosine_min'] = round(float(cosine.min()), 5)
+    report['query_speedup'] = round(report['reference_query_p50_ms'] / report['candidate_query_p50_ms'], 2) \
+        if report['candidate_query_p50_ms'] else 0.0
+    report['ingest_speedup'] = round(report['candidate_texts_per_sec'] / report['reference_texts_per_sec'], 2) \
+        if report['reference_texts_per_sec'] else 0.0
+    return report
+
+def print_parity(report: Dict):
+    print("\n" + "=" * 70)
+    print(f"EMBEDDING PARITY: {report['candidate']} vs {report['reference']} "
+          f"({report['texts']} texts, {report['queries']} queries)")
+    print("=" * 70)
+    if 'cosine_mean' in report:
+        print(f"  Cosine similarity      mean {report['cosine_mean']:.4f}   min {report['cosine_min']:.4f}")
+    print(f"  Top-k agreement        {report['topk_overlap']*100:.1f}%")
+    print(f"  Query encode p50       {report['reference_query_p50_ms']:.2f}ms → "
+          f"{report['candidate_query_p50_ms']:.2f}ms ({report['query_speedup']:.2f}x)")
+    print(f"  Ingestion              {report['reference_texts_per_sec']:.0f} → "
+          f"{report['candidate_texts_per_sec']:.0f} texts/sec ({report['ingest_speedup']:.2f}x)")
\ No newline at end of file
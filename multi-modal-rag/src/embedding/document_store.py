@@ -0,0 +1,180 @@
+from typing import List, Dict, Iterable, Iterator, Optional, Set, Tuple
+import json
+import os
+import pickle
+import random
+import sqlite3
+import threading
+
+class DocumentStore:
+    """Chunk text and metadata in SQLite, keyed by FAISS vector ID
+
+    Nothing is loaded up front: searches fetch only the rows for their hits,
+    so startup time and memory don't grow with the corpus.
+    """
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        
+        # Shared across Streamlit/worker threads; the lock serialises access
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id INTEGER PRIMARY KEY,
+                    chunk_hash TEXT,
+                    type TEXT,
+                    page INTEGER,
+                    document TEXT,
+                    content TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )
+            """)
+            self._conn.commit()
+    
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+    
+    def existing_ids(self, ids: Iterable[int]) -> Set[int]:
+        """Subset of `ids` already stored"""
+        ids = list(ids)
+        found = set()
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT id FROM chunks WHERE id IN ({placeholders})", batch
+                ).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+    
+    def all_ids(self) -> Set[int]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT id FROM chunks")}
+    
+    def metadata_columns(self) -> List[Tuple[int, str, Optional[int], Optional[str], Optional[int]]]:
+        """(id, type, page, document, year) for every chunk, ordered by ID"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, type, page, document, json_extract(metadata, '$.year') FROM chunks ORDER BY id"
+            ).fetchall()
+    
+    def put_many(self, rows: Iterable[Tuple[int, str, Dict]]):
+        """Insert or replace (id, content, metadata) rows"""
+        records = [
+            (vector_id, metadata.get('chunk_hash'), metadata.get('type'), metadata.get('page'),
+             metadata.get('document'), content, json.dumps(metadata))
+            for vector_id, content, metadata in rows
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, chunk_hash, type, page, document, content, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                records
+            )
+    
+    def update_metadata_many(self, rows: Iterable[Tuple[int, Dict]]):
+        """Refresh metadata for rows whose content is unchanged"""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunks SET metadata = ? WHERE id = ?",
+                [(json.dumps(metadata), vector_id) for vector_id, metadata in rows]
+            )
+    
+    def delete_many(self, ids: Iterable[int]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(i,) for i in ids])
+    
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+    
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+    
+    def get_many(self, ids: List[int]) -> Dict[int, Tuple[str, Dict]]:
+        """{id: (content, metadata)} for the requested IDs that exist"""
+        ids = [int(i) for i in ids]
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT id, content, metadata FROM chunks WHERE id IN ({placeholders})", batch
+                ).fetchall()
+                for vector_id, content, metadata in rows:
+                    found[vector_id] = (content, json.loads(metadata))
+        return found
+    
+    def sample(self, n: int, seed: int = 0) -> List[Dict]:
+        """Up to n random chunks as {'id', 'content', 'type'} dicts"""
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute("SELECT id FROM chunks ORDER BY id")]
+        if len(ids) > n:
+            ids = random.Random(seed).sample(ids, n)
+        
+        return [
+            {'id': vector_id, 'content': content, 'type': metadata['type']}
+            for vector_id, (content, metadata) in self.get_many(ids).items()
+        ]
+    
+    def iter_chunks(self, batch_size: int = 1000) -> Iterator[Tuple[int, str, Dict]]:
+        """Stream every (id, content, metadata) row without loading the table"""
+        last_id = None
+        while True:
+            with self._lock:
+                if last_id is None:
+                    rows = self._conn.execute(
+                        "SELECT id, content, metadata FROM chunks ORDER BY id LIMIT ?", (batch_size,)
+                    ).fetchall()
+                else:
+                    rows = self._conn.execute(
+                        "SELECT id, content, metadata FROM chunks WHERE id > ? ORDER BY id LIMIT ?",
+                        (last_id, batch_size)
+                    ).fetchall()
+            if not rows:
+                return
+            for vector_id, content, metadata in rows:
+                yield vector_id, content, json.loads(metadata)
+            last_id = rows[-1][0]
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def migrate_pickles(index_path: str, store: DocumentStore) -> Optional[str]:
+    """Copy documents.pkl / metadatas.pkl into the store
+
+    Returns 'positional' for the original list layout (row i is FAISS
+    position i), 'id_mapped' for the dict layout keyed by vector ID, or None
+    if there was nothing to migrate. The pickles are left in place.
+    """
+    docs_file = f"{index_path}/documents.pkl"
+    meta_file = f"{index_path}/metadatas.pkl"
+    if not (os.path.exists(docs_file) and os.path.exists(meta_file)):
+        return None
+    
+    with open(docs_file, 'rb') as f:
+        documents = pickle.load(f)
+    with open(meta_file, 'rb') as f:
+        metadatas = pickle.load(f)
+    
+    if isinstance(documents, list):
+        layout = 'positional'
+        rows = ((i, doc, meta) for i, (doc, meta) in enumerate(zip(documents, metadatas)))
+    else:
+        layout = 'id_mapped'
+        rows = ((i, doc, metadatas[i]) for i, doc in documents.items())
+    
+    store.clear()
+    store.put_many(rows)
+    store.commit()
+    return layout
\ No newline at end of file
@@ -1,130 +1,602 @@
-from typing import List, Dict
-import faiss
+from typing import List, Dict, Tuple
 import numpy as np
-from sentence_transformers import SentenceTransformer
+import hashlib
+import json
 import os
-import pickle
+import threading
+import time
+import uuid
+
+from ..caching.lru_cache import TTLCache, normalize_query
+from ..tracing import tracer
+from .backends import EmbeddingBackend, create_backend, parity_report, print_parity
+from .document_store import DocumentStore, migrate_pickles
+from .index_factory import (build_index, configure_search, index_kind, remove_vectors, resolve_params,
+                            search_parameters, train_index, unwrap_ivf)
+from .metadata_index import MetadataFilter, MetadataIndex
+from .table_store import TableStore
+
+def chunk_hash(chunk: Dict) -> str:
+    """Content address of a chunk: same text on the same page hashes the same"""
+    source = chunk.get('metadata', {}).get('document', '')
+    key = f"{source}\x00{chunk['page']}\x00{chunk['type']}\x00{chunk['content']}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def hash_to_id(digest: str) -> int:
+    """FAISS vector ID for a chunk hash (60 bits, fits in int64)"""
+    return int(digest[:15], 16)
 
 class MultiModalEmbedder:
-    def __init__(self, use_openai: bool = False):  # Changed default to False
-        """Initialize embedder with FREE local model"""
+    def __init__(self, use_openai: bool = False, batch_size: int = 64,  # Changed default to False
+                 index_type: str = 'flat', index_params: Dict = None,
+                 cache_size: int = 1024, cache_ttl: float = 3600,
+                 backend=None, model_name: str = None, backend_options: Dict = None,
+                 index_path: str = "./faiss_index"):
+        """Initialize embedder with FREE local model
+
+        backend: 'sentence-transformers', 'onnx-int8' or 'openai'; defaults to
+            'openai' when use_openai is set, the local model otherwise. An
+            EmbeddingBackend instance is used as is (shards share one model)
+        index_path: directory holding index.faiss, manifest.json and the stores
+        """
+        if isinstance(backend, EmbeddingBackend):
+            self.backend = backend
+        else:
+            self.backend = create_backend(
+                backend or ('openai' if use_openai else 'sentence-transformers'),
+                model_name, **(backend_options or {})
+            )
+        self.batch_size = max(1, self.backend.batch_size or batch_size)
+        self.index_type = index_type
+        self.index_params = resolve_params(index_params)
+        
+        # The model and the FAISS index are loaded on first use (see warmup)
+        self.dimension = self.backend.dimension
+        self._index = None
+        self._index_lock = threading.RLock()
+        self._pending = []  # (embeddings, ids) waiting for an IVF/PQ index to be trained
+        
+        # Changes on every index mutation; part of every retrieval cache key
+        self.index_version = uuid.uuid4().hex[:12]
+        
+        # normalized question -> query vector, (vector, top_k, version) -> hits
+        self.query_cache = TTLCache(cache_size, cache_ttl)
+        self.search_cache = TTLCache(cache_size, cache_ttl)
+        self._metadata_index = None  # (index_version, MetadataIndex), rebuilt after the index changes
+        
+        self.index_path = index_path
+        self._open_storage()
+    
+    def _open_storage(self):
+        """Open the document/table stores and read the manifest (no FAISS load)"""
+        # Chunk text/metadata live in SQLite and are fetched per hit
+        self.store = DocumentStore(f"{self.index_path}/documents.db")
+        # Table rows again, cell by cell, for exact label/column lookups
+        self.tables = TableStore(f"{self.index_path}/tables.db")
+        
+        # Cheap to read, and enough for retrievers and cache keys to see the saved version.
+        # Indexes saved before pluggable backends were always all-MiniLM-L6-v2
+        manifest = self._read_manifest()
+        self.indexed_space = manifest.get('embedding_space', 'all-MiniLM-L6-v2') if manifest else None
+        self._reembed = self.indexed_space is not None and self.indexed_space != self.backend.space
+    
+    @property
+    def index(self):
+        """FAISS index; vectors are keyed by chunk ID rather than position. Read from disk on first use"""
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    with tracer.span("load_faiss_index", index_type=self.index_type):
+                        self.load_index()
+        return self._index
+    
+    @index.setter
+    def index(self, index):
+        self._index = index
+    
+    def warmup(self) -> Dict[str, float]:
+        """Load the model and index now instead of on the first query; returns ms per step"""
+        timings = {}
+        start = time.perf_counter()
+        if self.backend.name == 'openai':
+            self.backend.model  # Client only: a dummy request would cost money
+        else:
+            self.get_embeddings(["warmup"])  # First forward pass also initializes the backend
+        timings['embedding_model'] = round((time.perf_counter() - start) * 1000, 2)
+        
+        start = time.perf_counter()
+        self.index
+        timings['faiss_index'] = round((time.perf_counter() - start) * 1000, 2)
+        return timings
+    
+    def parity_report(self, candidate: str, sample_size: int = 2000, queries: List[str] = None,
+                      k: int = 10, candidate_options: Dict = None) -> Dict:
+        """Compare another backend against this one on a sample of the stored chunks
+
+        queries defaults to the opening words of sampled chunks.
+        """
+        texts = [self.prepare_text(chunk) for chunk in self.store.sample(sample_size)]
+        if not texts:
+            raise ValueError("No documents in index!\nPlease run: python pipeline.py")
+        if queries is None:
+            queries = [' '.join(text.split()[:12]) for text in texts[:200]]
+        
+        other = create_backend(candidate, **(candidate_options or {}))
+        report = parity_report(self.backend, other, texts, queries, k=k, batch_size=self.batch_size)
+        print_parity(report)
+        return report
+    
+    def count(self) -> int:
+        """Number of indexed chunks"""
+        return self.store.count()
+    
+    def _mark_changed(self):
+        """New index version; cached retrieval results for the old one are dropped"""
+        self.index  # Load first, so a lazy load can't bring back the on-disk version afterwards
+        self.index_version = uuid.uuid4().hex[:12]
+        self.search_cache.clear()
+    
+    def cache_stats(self) -> Dict:
+        return {
+            'query_embeddings': self.query_cache.stats(),
+            'search_results': self.search_cache.stats(),
+        }
+    
+    def _new_index(self, n_train: int = None):
+        return build_index(self.index_type, self.dimension, self.index_params, n_train=n_train)
+    
+    def _add_vectors(self, embeddings: np.ndarray, ids: np.ndarray):
+        """Add vectors, buffering them until there is enough data to train the index"""
+        self._mark_changed()
+        if self.index.is_trained:
+            self.index.add_with_ids(embeddings, ids)
+            return
         
-        # Always use local embeddings (free)
-        print("Using FREE local embeddings (Sentence Transformers)")
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.dimension = 384
+        self._pending.append((embeddings, ids))
+        if sum(len(batch_ids) for _, batch_ids in self._pending) >= self.index_params['train_sample']:
+            self._train_pending()
+    
+    def _train_pending(self):
+        """Train the index on the buffered vectors, then add them"""
+        if not self._pending:
+            return
         
-        # Initialize FAISS
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.documents = []
-        self.metadatas = []
+        embeddings = np.concatenate([e for e, _ in self._pending])
+        ids = np.concatenate([i for _, i in self._pending])
+        self._pending = []
         
-        # Try to load existing index
-        self.index_path = "./faiss_index"
-        self.load_index()
+        print(f"  Training {self.index_type} index on {min(len(ids), self.index_params['train_sample'])} vectors...")
+        self.index = self._new_index(n_train=min(len(ids), self.index_params['train_sample']))
+        train_index(self.index, embeddings, self.index_params['train_sample'])
+        self.index.add_with_ids(embeddings, ids)
     
     def get_embedding(self, text: str) -> List[float]:
         """Get embedding using FREE local model"""
-        return self.model.encode(text).tolist()
+        return self.get_embeddings([text])[0].tolist()
     
-    def embed_and_store(self, chunks: List[Dict]):
-        """Embed all chunks and store in FAISS"""
-        embeddings = []
+    def get_query_embedding(self, query: str) -> np.ndarray:
+        """(1, dimension) query vector, served from cache for repeated questions"""
+        with tracer.span("embed_query") as span:
+            key = normalize_query(query)
+            vector = self.query_cache.get(key)
+            span.set_attribute('cache_hit', vector is not None)
+            if vector is None:
+                vector = self.get_embeddings([key])
+                vector.flags.writeable = False
+                self.query_cache.put(key, vector)
+        return vector
+    
+    def get_query_embeddings(self, queries: List[str]) -> np.ndarray:
+        """(n, dimension) query vectors; questions not in the cache are encoded in one batch"""
+        with tracer.span("embed_query", queries=len(queries)) as span:
+            keys = [normalize_query(query) for query in queries]
+            vectors = [self.query_cache.get(key) for key in keys]
+            missing = list(dict.fromkeys(key for key, vector in zip(keys, vectors) if vector is None))
+            span.set_attribute('cache_hits', sum(vector is not None for vector in vectors))
+            
+            if missing:
+                encoded = {}
+                for key, row in zip(missing, self.get_embeddings(missing)):
+                    vector = row[None, :].copy()
+                    vector.flags.writeable = False
+                    self.query_cache.put(key, vector)
+                    encoded[key] = vector
+                vectors = [encoded[key] if vector is None else vector for key, vector in zip(keys, vectors)]
         
-        print(f"\nEmbedding {len(chunks)} chunks with local model...")
+        if not vectors:
+            return np.empty((0, self.dimension), dtype='float32')
+        return np.concatenate(vectors)
+    
+    def get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Encode a batch of texts in one forward pass"""
+        return self.backend.encode(texts, self.batch_size)
+    
+    def prepare_text(self, chunk: Dict) -> str:
+        """Text that actually gets embedded for a chunk"""
+        if chunk['type'] == 'table':
+            return f"Table: {chunk['content'][:500]}"
+        return chunk['content'][:1000]  # Limit length
+    
+    def _chunk_metadata(self, chunk: Dict, digest: str) -> Dict:
+        metadata = {
+            'type': chunk['type'],
+            'page': chunk['page'],
+        }
+        if 'metadata' in chunk:
+            for key, value in chunk['metadata'].items():
+                metadata[key] = value
+        metadata['chunk_hash'] = digest
+        return metadata
+    
+    def _embed_batches(self, chunks: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """Embed chunks in batches; returns the matrix and a mask of rows that succeeded"""
+        total = len(chunks)
         
-        for idx, chunk in enumerate(chunks):
-            # Show progress every 50 chunks
-            if (idx + 1) % 50 == 0 or idx == 0:
-                print(f"  Progress: {idx + 1}/{len(chunks)} chunks")
-            
-            # Prepare text for embedding
-            if chunk['type'] == 'table':
-                text = f"Table: {chunk['content'][:500]}"
-            else:
-                text = chunk['content'][:1000]  # Limit length
+        # Preallocate the matrix; failed rows are masked out before indexing
+        embeddings = np.empty((total, self.dimension), dtype='float32')
+        ok = np.zeros(total, dtype=bool)
+        
+        for start in range(0, total, self.batch_size):
+            batch = chunks[start:start + self.batch_size]
+            texts = [self.prepare_text(chunk) for chunk in batch]
             
-            # Get embedding
             try:
-                embedding = self.get_embedding(text)
-                embeddings.append(embedding)
-                
-                # Store document and metadata
-                self.documents.append(chunk['content'])
-                metadata = {
-                    'type': chunk['type'],
-                    'page': chunk['page'],
-                }
-                if 'metadata' in chunk:
-                    for key, value in chunk['metadata'].items():
-                        metadata[key] = value
-                
-                self.metadatas.append(metadata)
-                
+                embeddings[start:start + len(batch)] = self.get_embeddings(texts)
+                ok[start:start + len(batch)] = True
             except Exception as e:
-                print(f"  Warning: Failed to embed chunk {idx}: {e}")
-                continue
+                # Fall back to one chunk at a time so one bad chunk doesn't sink the batch
+                print(f"  Warning: Batch at chunk {start} failed ({e}), retrying per chunk")
+                for offset, text in enumerate(texts):
+                    try:
+                        embeddings[start + offset] = self.get_embeddings([text])[0]
+                        ok[start + offset] = True
+                    except Exception as chunk_error:
+                        print(f"  Warning: Failed to embed chunk {start + offset}: {chunk_error}")
+            
+            done = min(start + self.batch_size, total)
+            print(f"  Progress: {done}/{total} chunks")
+        
+        return embeddings, ok
+    
+    def add_chunks(self, chunks: List[Dict]) -> List[int]:
+        """Embed and add chunks not already in the index; returns IDs of all given chunks"""
+        hashes = [chunk_hash(chunk) for chunk in chunks]
+        ids = [hash_to_id(digest) for digest in hashes]
+        # After an embedding model change every chunk needs a new vector
+        existing = set() if self._reembed else self.store.existing_ids(ids)
+        
+        new_chunks = []
+        new_hashes = []
+        refreshed = []
+        seen = set()
         
-        # Convert to numpy and add to FAISS
-        embeddings_array = np.array(embeddings).astype('float32')
-        self.index.add(embeddings_array)
+        for chunk, digest, vector_id in zip(chunks, hashes, ids):
+            if vector_id in existing:
+                # Unchanged content: keep the vector, refresh cheap metadata only
+                refreshed.append((vector_id, self._chunk_metadata(chunk, digest)))
+            elif digest not in seen:
+                new_chunks.append(chunk)
+                new_hashes.append(digest)
+                seen.add(digest)
+        
+        self.store.update_metadata_many(refreshed)
+        self._put_table_rows(refreshed)
+        
+        skipped = len(chunks) - len(new_chunks)
+        print(f"\nEmbedding {len(new_chunks)} new chunks with {self.backend.name} "
+              f"(batch size {self.batch_size}, {skipped} unchanged)...")
+        
+        if not new_chunks:
+            return ids
+        
+        start_time = time.perf_counter()
+        with tracer.span("embed", chunks=len(new_chunks), batch_size=self.batch_size) as span:
+            embeddings, ok = self._embed_batches(new_chunks)
+            span.set_attribute('failed', int((~ok).sum()))
+        elapsed = time.perf_counter() - start_time
+        
+        with tracer.span("index_add", vectors=int(ok.sum())):
+            # Store documents and metadata for the chunks that embedded successfully
+            rows = []
+            for idx in np.flatnonzero(ok):
+                chunk = new_chunks[idx]
+                digest = new_hashes[idx]
+                rows.append((hash_to_id(digest), chunk['content'], self._chunk_metadata(chunk, digest)))
+            self.store.put_many(rows)
+            self._put_table_rows((vector_id, metadata) for vector_id, _, metadata in rows)
+            added_ids = [vector_id for vector_id, _, _ in rows]
+            
+            # Add to FAISS
+            if added_ids:
+                self._add_vectors(embeddings[ok], np.array(added_ids, dtype='int64'))
+        
+        throughput = len(added_ids) / elapsed if elapsed > 0 else 0.0
+        print(f"✓ Embedded {len(added_ids)} chunks in {elapsed:.2f}s ({throughput:.1f} chunks/sec)")
+        
+        return ids
+    
+    def _put_table_rows(self, rows):
+        """Index (id, metadata) pairs of structured table rows in the table store"""
+        self.tables.put_rows(
+            (vector_id, metadata) for vector_id, metadata in rows
+            if metadata.get('type') == 'table_row' and 'values' in metadata
+        )
+    
+    def remove_ids(self, ids) -> int:
+        """Remove vectors and stored chunks for the given IDs"""
+        present = self.store.existing_ids(ids)
+        ids = [vector_id for vector_id in ids if vector_id in present]
+        if not ids:
+            return 0
+        
+        self._train_pending()
+        self._mark_changed()
+        self.index = remove_vectors(self.index, ids, self.index_params)
+        
+        self.store.delete_many(ids)
+        self.tables.delete_many(ids)
+        return len(ids)
+    
+    def prune(self, keep_ids) -> int:
+        """Remove every chunk whose ID is not in `keep_ids`"""
+        stale = self.store.all_ids() - set(keep_ids)
+        return self.remove_ids(stale)
+    
+    def sync(self, chunks: List[Dict]):
+        """Make the index match `chunks`: embed new ones, drop ones that disappeared"""
+        removed = self.prune(self.add_chunks(chunks))
+        
+        self.save_index()
+        print(f"✓ Index synced: {self.count()} chunks ({removed} removed)\n")
+    
+    def reset(self):
+        """Drop everything in the index"""
+        self.index = self._new_index()
+        self.store.clear()
+        self.tables.clear()
+        self._pending = []
+        self._reembed = False
+        self._mark_changed()
+    
+    def embed_and_store(self, chunks: List[Dict], incremental: bool = False):
+        """Embed all chunks and store in FAISS"""
+        if incremental:
+            self.sync(chunks)
+            return
+        
+        # Full rebuild: start from an empty index so vectors are never duplicated
+        self.reset()
+        self.add_chunks(chunks)
         
         # Save index
         self.save_index()
         
-        print(f"✓ Successfully stored {len(embeddings)} chunks\n")
+        print(f"✓ Successfully stored {self.count()} chunks\n")
+    
+    def search(self, query: str, n_results: int = 5, filters=None) -> Dict:
+        """Search for relevant chunks
+
+        filters: only return chunks matching a MetadataFilter, a dict like
+            {'type': 'table_row', 'page': (40, 60)} or a string like
+            'type=table_row page=40-60'; see MetadataFilter
+        """
+        return self.search_vector(self.get_query_embedding(query), n_results, filters)
+    
+    def search_vector(self, query_array: np.ndarray, n_results: int = 5, filters=None) -> Dict:
+        """Search with an already-encoded (1, dimension) query vector"""
+        return self.fetch(self.search_ids(query_array, n_results, filters))
+    
+    def metadata_index(self) -> MetadataIndex:
+        """Bitmap index over the stored chunks' metadata; built on the first filtered search after a change"""
+        version = self.index_version
+        built = self._metadata_index
+        if built is None or built[0] != version:
+            with tracer.span("build_metadata_index") as span:
+                index = MetadataIndex(self.store.metadata_columns())
+                span.set_attribute('chunks', len(index))
+            self._metadata_index = built = (version, index)
+        return built[1]
     
-    def search(self, query: str, n_results: int = 5) -> Dict:
-        """Search for relevant chunks"""
-        if len(self.documents) == 0:
+    def select_ids(self, filters) -> np.ndarray:
+        """Ascending IDs of the chunks a filter accepts"""
+        return self.metadata_index().select(MetadataFilter.parse(filters))
+    
+    def search_index(self, query_matrix: np.ndarray, n_results: int = 5,
+                     filters: MetadataFilter = None) -> List[Tuple[Tuple[int, float], ...]]:
+        """Uncached FAISS search: a tuple of (chunk ID, L2 distance) hits per query row, nearest first
+
+        With filters, the allowed IDs are handed to FAISS as an ID selector,
+        so the search itself skips every other vector instead of the top k
+        being filtered afterwards.
+        """
+        if self.index.ntotal == 0 and not self._pending:
             raise ValueError(
                 "No documents in index!\n"
                 "Please run: python pipeline.py"
             )
+        self._train_pending()
         
-        query_embedding = self.get_embedding(query)
-        query_array = np.array([query_embedding]).astype('float32')
+        params = None
+        if filters is not None:
+            import faiss
+            selected = self.select_ids(filters)
+            if not len(selected):
+                return [() for _ in range(len(query_matrix))]
+            selector = faiss.IDSelectorBatch(selected)
+            params = search_parameters(self.index, self.index_params, selector,
+                                       selectivity=len(selected) / max(1, self.index.ntotal))
+        distances, indices = self.index.search(query_matrix, n_results, params=params)
+        # -1 marks an empty slot when the index has < n_results vectors
+        return [
+            tuple((int(i), float(d)) for i, d in zip(index_row, distance_row) if i != -1)
+            for index_row, distance_row in zip(indices, distances)
+        ]
+    
+    def search_ids(self, query_array: np.ndarray, n_results: int = 5, filters=None) -> List[Tuple[int, float]]:
+        """(chunk ID, L2 distance) pairs for the nearest chunks, without reading the store"""
+        filters = MetadataFilter.parse(filters)
+        with tracer.span("vector_search", n_results=n_results, index_type=self.index_type,
+                         filtered=filters is not None) as span:
+            key = (hashlib.sha1(query_array.tobytes()).hexdigest(), n_results, self.index_version,
+                   filters and filters.key)
+            hits = self.search_cache.get(key)
+            span.set_attribute('cache_hit', hits is not None)
+            if hits is None:
+                hits = self.search_index(query_array, n_results, filters)[0]
+                self.search_cache.put(key, hits)
         
-        # Search
-        distances, indices = self.index.search(query_array, n_results)
+        return list(hits)
+    
+    def search_ids_batch(self, query_matrix: np.ndarray, n_results: int = 5,
+                         filters=None) -> List[List[Tuple[int, float]]]:
+        """search_ids for an (n, dimension) matrix of queries, with one FAISS search for the uncached rows"""
+        # Row bytes must match what search_ids hashes, so the two share cache entries
+        query_matrix = np.ascontiguousarray(query_matrix, dtype='float32')
+        filters = MetadataFilter.parse(filters)
+        with tracer.span("vector_search", n_results=n_results, index_type=self.index_type,
+                         queries=len(query_matrix), filtered=filters is not None) as span:
+            keys = [(hashlib.sha1(row.tobytes()).hexdigest(), n_results, self.index_version, filters and filters.key)
+                    for row in query_matrix]
+            hits = [self.search_cache.get(key) for key in keys]
+            missing = [i for i, cached in enumerate(hits) if cached is None]
+            span.set_attribute('cache_hits', len(hits) - len(missing))
+            
+            if missing:
+                for i, found in zip(missing, self.search_index(query_matrix[missing], n_results, filters)):
+                    hits[i] = found
+                    self.search_cache.put(keys[i], found)
         
-        # Prepare results
+        return [list(row) for row in hits]
+    
+    def fetch(self, hits: List[Tuple[int, float]]) -> Dict:
+        """Results dict (ids, documents, metadatas, distances) for (ID, distance) pairs"""
+        return self.fetch_many([hits])[0]
+    
+    def fetch_many(self, hit_lists: List[List[Tuple[int, float]]]) -> List[Dict]:
+        """fetch for several queries with a single document store read"""
+        ids = list(dict.fromkeys(i for hits in hit_lists for i, _ in hits))
+        with tracer.span("fetch_chunks", chunks=len(ids)):
+            rows = self.store.get_many(ids)
+        return [self._results(hits, rows) for hits in hit_lists]
+    
+    def _results(self, hits: List[Tuple[int, float]], rows: Dict) -> Dict:
+        hits = [(i, d) for i, d in hits if i in rows]
         results = {
-            'documents': [self.documents[i] for i in indices[0]],
-            'metadatas': [self.metadatas[i] for i in indices[0]],
-            'distances': distances[0].tolist()
+            'ids': [i for i, _ in hits],
+            'documents': [rows[i][0] for i, _ in hits],
+            'metadatas': [rows[i][1] for i, _ in hits],
+            'distances': [d for _, d in hits]
         }
         
         return results
     
+    def index_report(self, sample_size: int = 20000, n_queries: int = 200, k: int = 10) -> List[Dict]:
+        """Recall-vs-latency of each index type on a sample of the stored chunks"""
+        from .index_factory import recall_latency_report, print_report
+        
+        rng = np.random.default_rng(0)
+        chunks = self.store.sample(sample_size)
+        
+        vectors, ok = self._embed_batches(chunks)
+        vectors = vectors[ok]
+        queries = vectors[rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)]
+        
+        report = recall_latency_report(vectors, queries, k=k, params=self.index_params)
+        print_report(report, k)
+        return report
+    
     def save_index(self):
         """Save FAISS index and metadata"""
+        import faiss
         os.makedirs(self.index_path, exist_ok=True)
+        self._train_pending()
         
         faiss.write_index(self.index, f"{self.index_path}/index.faiss")
+        self.store.commit()
+        self.tables.commit()
+        self._reembed = False
+        self.indexed_space = self.backend.space
         
-        with open(f"{self.index_path}/documents.pkl", 'wb') as f:
-            pickle.dump(self.documents, f)
+        # Chunk hashes live in the document store; the manifest describes the index
+        with open(f"{self.index_path}/manifest.json", 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': 2,
+                'index_type': self.index_type,
+                'index_version': self.index_version,
+                'embedding_backend': self.backend.name,
+                'embedding_space': self.backend.space,
+                'dimension': self.dimension,
+                'chunks': self.count()
+            }, f)
+    
+    def _upgrade_legacy_index(self):
+        """Convert a positional IndexFlatL2 into the ID-mapped layout"""
+        count = self.index.ntotal
+        vectors = self.index.reconstruct_n(0, count) if count else np.empty((0, self.dimension), dtype='float32')
         
-        with open(f"{self.index_path}/metadatas.pkl", 'wb') as f:
-            pickle.dump(self.metadatas, f)
+        # Legacy rows keep their positions as IDs; they match no chunk hash,
+        # so the next incremental sync replaces them with content-addressed ones
+        self.index = self._new_index()
+        if count:
+            self._add_vectors(vectors, np.arange(count, dtype='int64'))
+            self._train_pending()
+    
+    def _read_manifest(self) -> Dict:
+        manifest_file = f"{self.index_path}/manifest.json"
+        manifest = {}
+        if os.path.exists(manifest_file):
+            try:
+                with open(manifest_file, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                pass
+        self.index_version = manifest.get('index_version', self.index_version)
+        return manifest
     
     def load_index(self):
         """Load existing FAISS index"""
+        import faiss
+        self.index = self._new_index()
         try:
             index_file = f"{self.index_path}/index.faiss"
-            docs_file = f"{self.index_path}/documents.pkl"
-            meta_file = f"{self.index_path}/metadatas.pkl"
             
             if os.path.exists(index_file):
                 self.index = faiss.read_index(index_file)
                 
-                with open(docs_file, 'rb') as f:
-                    self.documents = pickle.load(f)
+                # Indexes saved before the document store kept chunks in pickles
+                if self.store.count() == 0:
+                    layout = migrate_pickles(self.index_path, self.store)
+                    if layout:
+                        print(f"  Migrated {self.store.count()} chunks from pickles to {self.store.db_path}")
+                    if layout == 'positional':
+                        print("  Upgrading legacy index to ID-mapped layout")
+                        self._upgrade_legacy_index()
+                        faiss.write_index(self.index, index_file)
+                
+                # IVF indexes used to be wrapped in IndexIDMap2, which breaks on removal
+                unwrapped = unwrap_ivf(self.index)
+                if unwrapped is not self.index:
+                    print("  Moving chunk IDs into the IVF index's own lists")
+                    self.index = unwrapped
+                    faiss.write_index(self.index, index_file)
+                
+                self._read_manifest()
+                
+                # Vectors from another embedding model are useless for our queries
+                if self._reembed or self.index.d != self.dimension:
+                    print(f"  Index on disk holds '{self.indexed_space}' vectors, the embedder produces "
+                          f"'{self.backend.space}'. Every chunk will be re-embedded on the next build.")
+                    self.index = self._new_index()
+                    self._reembed = True
+                    return
                 
-                with open(meta_file, 'rb') as f:
-                    self.metadatas = pickle.load(f)
+                configure_search(self.index, self.index_params)
+                loaded_type = index_kind(self.index)
+                if loaded_type != self.index_type:
+                    print(f"  Note: index on disk is '{loaded_type}', config asks for '{self.index_type}'. "
+                          f"Run a full (non-incremental) rebuild to switch.")
                 
-                print(f"✓ Loaded existing index with {len(self.documents)} documents")
+                print(f"✓ Loaded existing index with {self.index.ntotal} documents")
         except Exception as e:
+            self.index = self._new_index()
             print(f"No existing index found. Will create new one.")
\ No newline at end of file
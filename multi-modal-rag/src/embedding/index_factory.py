@@ -0,0 +1,242 @@
+from typing import List, Dict, Optional
+import math
+import time
+import numpy as np
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'hnsw', 'ivf_pq')
+
+DEFAULT_INDEX_PARAMS = {
+    'nlist': 1024,           # IVF centroids (clamped to the training sample size)
+    'nprobe': 16,            # IVF lists scanned per query
+    'hnsw_m': 32,            # HNSW graph degree
+    'ef_construction': 200,  # HNSW build-time beam width
+    'ef_search': 64,         # HNSW query-time beam width
+    'pq_m': 48,              # PQ sub-quantizers (must divide the dimension)
+    'pq_bits': 8,            # bits per PQ code
+    'train_sample': 100000,  # max vectors used to train IVF/PQ
+}
+
+def resolve_params(params: Optional[Dict]) -> Dict:
+    return {**DEFAULT_INDEX_PARAMS, **(params or {})}
+
+def needs_training(index_type: str) -> bool:
+    return index_type in ('ivf_flat', 'ivf_pq')
+
+def build_index(index_type: str, dimension: int, params: Optional[Dict] = None,
+                n_train: Optional[int] = None):
+    """Create an empty FAISS index of the given type that stores chunk IDs
+
+    Flat and HNSW indexes are wrapped in IndexIDMap2. IVF indexes keep IDs
+    in their inverted lists and are returned unwrapped: removing IDs through
+    an IndexIDMap2 leaves the IVF lists pointing at the wrong vectors.
+
+    n_train: size of the training sample, used to shrink nlist / PQ codebooks
+    so small corpora can still be trained
+    """
+    import faiss  # Imported on first use to keep module import cheap
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    
+    p = resolve_params(params)
+    
+    if index_type == 'flat':
+        base = faiss.IndexFlatL2(dimension)
+    elif index_type == 'hnsw':
+        base = faiss.IndexHNSWFlat(dimension, p['hnsw_m'])
+        base.hnsw.efConstruction = p['ef_construction']
+    else:
+        nlist = p['nlist']
+        if n_train is not None:
+            # FAISS wants ~39 training points per centroid
+            nlist = max(1, min(nlist, n_train // 39))
+        quantizer = faiss.IndexFlatL2(dimension)
+        
+        if index_type == 'ivf_flat':
+            base = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        else:
+            if dimension % p['pq_m'] != 0:
+                raise ValueError(f"pq_m={p['pq_m']} must divide the embedding dimension {dimension}")
+            bits = p['pq_bits']
+            if n_train is not None:
+                # Each sub-quantizer has 2**bits centroids, which also want ~39 training points each
+                bits = max(1, min(bits, int(math.log2(max(2, n_train // 39)))))
+            base = faiss.IndexIVFPQ(quantizer, dimension, nlist, p['pq_m'], bits)
+    
+    index = base if needs_training(index_type) else faiss.IndexIDMap2(base)
+    configure_search(index, params)
+    return index
+
+def unwrap_ivf(index):
+    """An IVF index saved inside an IndexIDMap2, rewritten to hold the chunk IDs itself
+
+    Indexes built before IVF types were left unwrapped store positions in
+    their inverted lists; each is replaced by the ID it maps to. Any other
+    index is returned unchanged.
+    """
+    import faiss
+    if not hasattr(index, 'id_map'):
+        return index
+    base = faiss.downcast_index(index.index)
+    if not isinstance(base, faiss.IndexIVF):
+        return index
+    
+    id_map = faiss.vector_to_array(index.id_map)
+    lists = base.invlists
+    for list_no in range(base.nlist):
+        size = lists.list_size(list_no)
+        if not size:
+            continue
+        positions = faiss.rev_swig_ptr(lists.get_ids(list_no), size).copy()
+        codes = faiss.rev_swig_ptr(lists.get_codes(list_no), size * lists.code_size).copy()
+        ids = np.ascontiguousarray(id_map[positions])
+        lists.update_entries(list_no, 0, size, faiss.swig_ptr(ids), faiss.swig_ptr(codes))
+    
+    # A standalone copy, so it outlives the wrapper that owns `base`
+    return faiss.deserialize_index(faiss.serialize_index(base))
+
+def remove_vectors(index, ids, params: Optional[Dict] = None):
+    """Remove vectors by ID; returns the index to use from then on
+
+    HNSW graphs can't delete nodes, so they are rebuilt from the surviving vectors.
+    """
+    import faiss
+    ids = np.asarray(list(ids), dtype='int64')
+    try:
+        index.remove_ids(ids)
+        return index
+    except RuntimeError:
+        pass
+    
+    base = faiss.downcast_index(index.index)
+    vectors = base.reconstruct_n(0, base.ntotal)
+    all_ids = faiss.vector_to_array(index.id_map)
+    keep = ~np.isin(all_ids, ids)
+    
+    rebuilt = build_index(index_kind(index), index.d, params)
+    rebuilt.add_with_ids(vectors[keep], all_ids[keep])
+    return rebuilt
+
+def configure_search(index, params: Optional[Dict] = None):
+    """Apply query-time knobs (nprobe / efSearch); these are not persisted by FAISS"""
+    import faiss
+    p = resolve_params(params)
+    base = faiss.downcast_index(index.index) if hasattr(index, 'id_map') else index
+    
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = p['ef_search']
+    else:
+        try:
+            faiss.extract_index_ivf(base).nprobe = p['nprobe']
+        except RuntimeError:
+            pass  # Not an IVF index
+
+def search_parameters(index, params: Optional[Dict], selector, selectivity: float = 1.0):
+    """Per-search FAISS parameters limiting results to the IDs `selector` accepts
+
+    Search parameters replace the index's own nprobe / efSearch, so both are
+    set here, widened by 1/selectivity: when only 1% of the vectors may be
+    returned, the nearest of them lie in lists and graph regions that an
+    unfiltered search would never visit.
+    """
+    import faiss
+    p = resolve_params(params)
+    base = faiss.downcast_index(index.index) if hasattr(index, 'id_map') else index
+    widen = 1.0 / max(selectivity, 1e-9)
+    
+    if isinstance(base, faiss.IndexHNSW):
+        ef_search = min(math.ceil(p['ef_search'] * widen), max(p['ef_search'], base.ntotal))
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+    try:
+        ivf = faiss.extract_index_ivf(base)
+    except RuntimeError:
+        return faiss.SearchParameters(sel=selector)
+    return faiss.SearchParametersIVF(sel=selector, nprobe=min(math.ceil(p['nprobe'] * widen), ivf.nlist))
+
+def index_kind(index) -> str:
+    """Best-effort inverse of build_index for a loaded index"""
+    import faiss
+    base = faiss.downcast_index(index.index) if hasattr(index, 'id_map') else index
+    if isinstance(base, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(base, faiss.IndexIVFPQ):
+        return 'ivf_pq'
+    if isinstance(base, faiss.IndexIVF):
+        return 'ivf_flat'
+    return 'flat'
+
+def train_index(index, vectors: np.ndarray, sample_size: int):
+    """Train on a random sample of at most sample_size vectors"""
+    if len(vectors) > sample_size:
+        rng = np.random.default_rng(0)
+        vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    index.train(np.ascontiguousarray(vectors, dtype='float32'))
+
+def recall_latency_report(vectors: np.ndarray, queries: np.ndarray, k: int = 10,
+                          index_types: Optional[List[str]] = None,
+                          params: Optional[Dict] = None) -> List[Dict]:
+    """Build each index type over `vectors` and measure it against exact flat search
+
+    Returns one row per index type with recall@k, mean / p50 / p95 / p99 per-query latency
+    and approximate index size. recall_after_remove is the share of vectors still found
+    by a search for themselves (in the top k) once the first quarter of the IDs is removed.
+    """
+    import faiss
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    queries = np.ascontiguousarray(queries, dtype='float32')
+    ids = np.arange(len(vectors), dtype='int64')
+    k = min(k, len(vectors))
+    p = resolve_params(params)
+    
+    report = []
+    truth = None
+    for index_type in ['flat'] + [t for t in (index_types or INDEX_TYPES) if t != 'flat']:
+        start = time.perf_counter()
+        index = build_index(index_type, vectors.shape[1], p, n_train=len(vectors))
+        if needs_training(index_type):
+            train_index(index, vectors, p['train_sample'])
+        index.add_with_ids(vectors, ids)
+        build_time = time.perf_counter() - start
+        
+        latencies = []
+        found = np.empty((len(queries), k), dtype='int64')
+        for row, query in enumerate(queries):
+            start = time.perf_counter()
+            _, hits = index.search(query[None, :], k)
+            latencies.append(time.perf_counter() - start)
+            found[row] = hits[0]
+        
+        if truth is None:
+            truth = found
+        recall = np.mean([
+            len(set(found[row]) & set(truth[row])) / k for row in range(len(queries))
+        ])
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+        
+        # Deleted chunks must not take the survivors with them
+        removed = len(vectors) // 4
+        index = remove_vectors(index, ids[:removed], p)
+        survivors = np.arange(removed, min(len(vectors), removed + len(queries)))
+        _, hits = index.search(vectors[survivors], k)
+        recall_after_remove = np.mean([survivor in row for survivor, row in zip(survivors, hits)])
+        
+        report.append({
+            'index_type': index_type,
+            'recall_at_k': round(float(recall), 4),
+            'mean_latency_ms': round(float(np.mean(latencies)) * 1000, 3),
+            'p50_latency_ms': round(float(np.percentile(latencies, 50)) * 1000, 3),
+            'p95_latency_ms': round(float(np.percentile(latencies, 95)) * 1000, 3),
+            'p99_latency_ms': round(float(np.percentile(latencies, 99)) * 1000, 3),
+            'build_time_s': round(build_time, 3),
+            'size_mb': round(size_mb, 2),
+            'recall_after_remove': round(float(recall_after_remove), 4),
+        })
+    
+    return report
+
+def print_report(report: List[Dict], k: int = 10):
+    print(f"\n{'Index':10s} {'Recall@' + str(k):>10s} {'Mean ms':>9s} {'p95 ms':>9s} {'Build s':>9s} {'Size MB':>9s} "
+          f"{'After rm':>9s}")
+    for row in report:
+        print(f"{row['index_type']:10s} {row['recall_at_k']:10.3f} {row['mean_latency_ms']:9.3f} "
+              f"{row['p95_latency_ms']:9.3f} {row['build_time_s']:9.2f} {row['size_mb']:9.2f} "
+              f"{row['recall_after_remove']:9.3f}")
\ No newline at end of file
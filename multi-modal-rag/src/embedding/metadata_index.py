@@ -0,0 +1,125 @@
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+import json
+import numpy as np
+
+from ..caching.lru_cache import TTLCache
+
+FILTER_FIELDS = ('type', 'document', 'page', 'year')
+RANGE_FIELDS = ('page', 'year')
+
+class MetadataFilter:
+    """Conditions on chunk metadata, all of which must hold
+
+    type / document: one value or a list of accepted values; documents match
+        by name or file name, with or without extension ('2024/report.pdf',
+        '2024/report', 'report.pdf' or 'report')
+    page / year: one number, or an inclusive (low, high) range where either
+        end may be None
+    """
+    
+    def __init__(self, conditions: Dict):
+        unknown = set(conditions) - set(FILTER_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown filter field(s) {', '.join(sorted(unknown))}. "
+                             f"Choose from: {', '.join(FILTER_FIELDS)}")
+        
+        self.conditions = {}
+        for field, value in conditions.items():
+            if value is None:
+                continue
+            if field in RANGE_FIELDS:
+                low, high = value if isinstance(value, (tuple, list)) else (value, value)
+                self.conditions[field] = (None if low is None else int(low), None if high is None else int(high))
+            else:
+                values = [value] if isinstance(value, str) else list(value)
+                self.conditions[field] = tuple(sorted(str(v) for v in values))
+        self.key = json.dumps(self.conditions, sort_keys=True)
+    
+    @classmethod
+    def parse(cls, filters) -> Optional['MetadataFilter']:
+        """A MetadataFilter from a dict, a 'type=table_row page=10-20 document=report' string or
+        an existing filter; None when nothing is filtered
+        """
+        if filters is None or isinstance(filters, cls):
+            return filters if filters is None or filters.conditions else None
+        if isinstance(filters, str):
+            conditions = {}
+            for part in filters.split():
+                field, sep, value = part.partition('=')
+                if not sep or not value:
+                    raise ValueError(f"Bad filter term '{part}', expected field=value")
+                if field in RANGE_FIELDS and '-' in value:
+                    low, high = value.split('-', 1)
+                    conditions[field] = (low or None, high or None)
+                elif field in RANGE_FIELDS:
+                    conditions[field] = value
+                else:
+                    conditions[field] = value.split(',')
+            filters = conditions
+        parsed = cls(filters)
+        return parsed if parsed.conditions else None
+    
+    def __repr__(self) -> str:
+        return f"MetadataFilter({self.key})"
+
+class MetadataIndex:
+    """Chunk metadata as numpy columns, so a filter becomes a bitmap over
+    every chunk in a few vectorized comparisons
+
+    Built from the document store and kept until the index changes; the
+    selected IDs of recent filters are cached.
+    """
+    
+    def __init__(self, rows: Iterable[Tuple[int, str, Optional[int], Optional[str], Optional[int]]],
+                 cache_size: int = 64):
+        """rows: (id, type, page, document, year), as DocumentStore.metadata_columns returns them"""
+        rows = list(rows)
+        self.ids = np.array([row[0] for row in rows], dtype='int64')
+        self.pages = np.array([-1 if row[2] is None else row[2] for row in rows], dtype='int32')
+        self.years = np.array([-1 if row[4] is None else int(row[4]) for row in rows], dtype='int32')
+        
+        # Categorical columns hold small integer codes into a vocabulary
+        self.vocab = {}
+        self.codes = {}
+        for field, column in (('type', 1), ('document', 3)):
+            vocab = {}
+            self.codes[field] = np.array([vocab.setdefault(row[column] or '', len(vocab)) for row in rows],
+                                         dtype='int32')
+            self.vocab[field] = vocab
+        self._selections = TTLCache(cache_size)
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def _value_codes(self, field: str, values: Tuple[str, ...]) -> np.ndarray:
+        vocab = self.vocab[field]
+        if field == 'document':
+            wanted = set(values)
+            aliases = lambda name: {name, Path(name).with_suffix('').as_posix(), Path(name).name, Path(name).stem}
+            return np.array([code for name, code in vocab.items() if wanted & aliases(name)], dtype='int32')
+        return np.array([vocab[value] for value in values if value in vocab], dtype='int32')
+    
+    def mask(self, filters: MetadataFilter) -> np.ndarray:
+        """Boolean bitmap over self.ids of the chunks matching every condition"""
+        mask = np.ones(len(self.ids), dtype=bool)
+        for field, condition in filters.conditions.items():
+            if field in RANGE_FIELDS:
+                column = self.pages if field == 'page' else self.years
+                low, high = condition
+                mask &= column >= 0
+                if low is not None:
+                    mask &= column >= low
+                if high is not None:
+                    mask &= column <= high
+            else:
+                mask &= np.isin(self.codes[field], self._value_codes(field, condition))
+        return mask
+    
+    def select(self, filters: MetadataFilter) -> np.ndarray:
+        """IDs of the matching chunks, in ascending order"""
+        selected = self._selections.get(filters.key)
+        if selected is None:
+            selected = self.ids[self.mask(filters)]
+            self._selections.put(filters.key, selected)
+        return selected
\ No newline at end of file
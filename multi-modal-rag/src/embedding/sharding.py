@@ -0,0 +1,290 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from operator import itemgetter
+from pathlib import Path
+from typing import List, Dict, Iterable, Iterator, Optional, Set, Tuple
+import hashlib
+import heapq
+import json
+import os
+import random
+import re
+import shutil
+import threading
+import time
+import numpy as np
+
+from .embedder import MultiModalEmbedder, chunk_hash, hash_to_id
+from .metadata_index import MetadataFilter
+
+SHARD_KEYS = ('document', 'hash')
+
+class ShardedStore:
+    """Read-only DocumentStore facade over every shard's store"""
+    
+    def __init__(self, owner: 'ShardedEmbedder'):
+        self._owner = owner
+    
+    def _stores(self):
+        return [shard.store for shard in self._owner.shard_list()]
+    
+    def count(self) -> int:
+        return sum(store.count() for store in self._stores())
+    
+    def existing_ids(self, ids: Iterable[int]) -> Set[int]:
+        ids = list(ids)
+        return set().union(*(store.existing_ids(ids) for store in self._stores()))
+    
+    def all_ids(self) -> Set[int]:
+        return set().union(*(store.all_ids() for store in self._stores()))
+    
+    def get_many(self, ids: List[int]) -> Dict[int, Tuple[str, Dict]]:
+        found = {}
+        remaining = list(ids)
+        for store in self._stores():
+            if not remaining:
+                break
+            found.update(store.get_many(remaining))
+            remaining = [i for i in remaining if i not in found]
+        return found
+    
+    def sample(self, n: int, seed: int = 0) -> List[Dict]:
+        ids = sorted(self.all_ids())
+        if len(ids) > n:
+            ids = random.Random(seed).sample(ids, n)
+        return [
+            {'id': vector_id, 'content': content, 'type': metadata['type']}
+            for vector_id, (content, metadata) in self.get_many(ids).items()
+        ]
+    
+    def iter_chunks(self, batch_size: int = 1000) -> Iterator[Tuple[int, str, Dict]]:
+        return chain.from_iterable(store.iter_chunks(batch_size) for store in self._stores())
+    
+    def commit(self):
+        for store in self._stores():
+            store.commit()
+
+class ShardedTables:
+    """TableStore.lookup across shards; scores use each shard's own term statistics"""
+    
+    def __init__(self, owner: 'ShardedEmbedder'):
+        self._owner = owner
+    
+    def count(self) -> int:
+        return sum(shard.tables.count() for shard in self._owner.shard_list())
+    
+    def lookup(self, query: str, limit: int = 3, **options) -> List[Dict]:
+        rows = [row for shard in self._owner.shard_list() for row in shard.tables.lookup(query, limit, **options)]
+        return sorted(rows, key=lambda row: (-row['score'], row['id']))[:limit]
+
+class ShardedEmbedder(MultiModalEmbedder):
+    """Several MultiModalEmbedder shards behind the MultiModalEmbedder interface
+
+    Chunks are routed to a shard by source document or by chunk hash. Every
+    shard is a directory under index_path with its own index.faiss, document
+    store and table store, loaded on first use. Searches fan out to all
+    shards on a thread pool (FAISS releases the GIL while searching) and the
+    per-shard top-k lists are merged with a heap. Shards can be added and
+    removed while the embedder is serving queries.
+    """
+    
+    def __init__(self, shard_by: str = 'document', num_shards: int = 4, search_threads: Optional[int] = None,
+                 index_path: str = "./faiss_index/shards", **options):
+        """
+        shard_by: 'document' (one shard per source PDF) or 'hash' (num_shards
+            shards, chunks spread by content hash)
+        search_threads: fan-out pool size (defaults to one per CPU core, max 32)
+        options: MultiModalEmbedder arguments, shared by every shard
+        """
+        if shard_by not in SHARD_KEYS:
+            raise ValueError(f"Unknown shard key '{shard_by}'. Choose from: {', '.join(SHARD_KEYS)}")
+        self.shard_by = shard_by
+        self.num_shards = max(1, num_shards)
+        self._shard_options = {
+            key: options[key] for key in ('batch_size', 'index_type', 'index_params') if key in options
+        }
+        self._pool = ThreadPoolExecutor(
+            max_workers=search_threads or min(32, os.cpu_count() or 1), thread_name_prefix="rag-shard"
+        )
+        super().__init__(index_path=index_path, **options)
+    
+    def _open_storage(self):
+        """Open every shard listed in shards.json or found under index_path"""
+        self.shards = {}
+        self._shards_lock = threading.RLock()
+        self.store = ShardedStore(self)
+        self.tables = ShardedTables(self)
+        self.indexed_space = None
+        self._reembed = False
+        
+        paths = {}
+        registry = f"{self.index_path}/shards.json"
+        if os.path.exists(registry):
+            with open(registry, encoding='utf-8') as f:
+                paths.update(json.load(f).get('shards', {}))
+        if os.path.isdir(self.index_path):
+            for entry in sorted(os.scandir(self.index_path), key=lambda e: e.name):
+                if entry.is_dir() and os.path.exists(f"{entry.path}/documents.db"):
+                    paths.setdefault(entry.name, entry.path)
+        
+        for name, path in paths.items():
+            if os.path.isdir(path):
+                self.shards[name] = self._open_shard(path)
+            else:
+                print(f"  Warning: Shard '{name}' not found at {path}; skipping")
+        self._refresh_version()
+    
+    def _open_shard(self, path: str) -> MultiModalEmbedder:
+        # Shards share the model; only the merged results are cached, here
+        return MultiModalEmbedder(index_path=path, backend=self.backend, cache_size=1, **self._shard_options)
+    
+    def shard_list(self) -> List[MultiModalEmbedder]:
+        with self._shards_lock:
+            return list(self.shards.values())
+    
+    def _refresh_version(self):
+        """Index version derived from the shards' versions, so it survives restarts like a single index's"""
+        with self._shards_lock:
+            parts = "|".join(f"{name}:{shard.index_version}" for name, shard in sorted(self.shards.items()))
+        self.index_version = hashlib.sha1(parts.encode('utf-8')).hexdigest()[:12]
+        self.search_cache.clear()
+    
+    def _mark_changed(self):
+        self._refresh_version()
+    
+    def shard_name(self, chunk: Dict) -> str:
+        """Shard a chunk belongs to"""
+        if self.shard_by == 'hash':
+            return f"hash-{hash_to_id(chunk_hash(chunk)) % self.num_shards:03d}"
+        document = chunk.get('metadata', {}).get('document') or 'default'
+        return re.sub(r"[^A-Za-z0-9._-]+", "_", Path(document).with_suffix('').as_posix()) or 'default'
+    
+    def add_shard(self, name: str, path: Optional[str] = None) -> MultiModalEmbedder:
+        """Start serving a shard: an existing shard directory (e.g. built on another
+        machine), or a new empty one under index_path"""
+        path = path or f"{self.index_path}/{name}"
+        with self._shards_lock:
+            if name in self.shards:
+                raise ValueError(f"Shard '{name}' already exists")
+            shard = self._open_shard(path)
+            self.shards[name] = shard
+        self._mark_changed()
+        self._save_registry()
+        return shard
+    
+    def remove_shard(self, name: str, delete_files: bool = False):
+        """Stop serving a shard; its files are kept unless delete_files is set"""
+        with self._shards_lock:
+            shard = self.shards.pop(name)
+        self._mark_changed()
+        self._save_registry()
+        shard.store.close()
+        shard.tables.close()
+        if delete_files:
+            shutil.rmtree(shard.index_path, ignore_errors=True)
+    
+    def _shard_for(self, name: str) -> MultiModalEmbedder:
+        with self._shards_lock:
+            return self.shards.get(name) or self.add_shard(name)
+    
+    def _save_registry(self):
+        os.makedirs(self.index_path, exist_ok=True)
+        with self._shards_lock:
+            shards = {name: shard.index_path for name, shard in self.shards.items()}
+        with open(f"{self.index_path}/shards.json", 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'shard_by': self.shard_by, 'num_shards': self.num_shards, 'shards': shards}, f)
+    
+    def count(self) -> int:
+        return sum(shard.count() for shard in self.shard_list())
+    
+    def warmup(self) -> Dict[str, float]:
+        """Load the model, then every shard's FAISS index in parallel"""
+        timings = {}
+        start = time.perf_counter()
+        if self.backend.name == 'openai':
+            self.backend.model
+        else:
+            self.get_embeddings(["warmup"])
+        timings['embedding_model'] = round((time.perf_counter() - start) * 1000, 2)
+        
+        start = time.perf_counter()
+        list(self._pool.map(lambda shard: shard.index, self.shard_list()))
+        timings['faiss_index'] = round((time.perf_counter() - start) * 1000, 2)
+        return timings
+    
+    def add_chunks(self, chunks: List[Dict]) -> List[int]:
+        """Route chunks to their shards and add them there; returns IDs of all given chunks"""
+        groups = {}
+        for position, chunk in enumerate(chunks):
+            groups.setdefault(self.shard_name(chunk), []).append(position)
+        
+        ids = [0] * len(chunks)
+        for name, positions in groups.items():
+            shard_ids = self._shard_for(name).add_chunks([chunks[p] for p in positions])
+            for position, vector_id in zip(positions, shard_ids):
+                ids[position] = vector_id
+        self._mark_changed()
+        return ids
+    
+    def remove_ids(self, ids) -> int:
+        ids = list(ids)
+        removed = sum(shard.remove_ids(ids) for shard in self.shard_list())
+        self._mark_changed()
+        return removed
+    
+    def prune(self, keep_ids) -> int:
+        keep_ids = set(keep_ids)
+        removed = sum(shard.prune(keep_ids) for shard in self.shard_list())
+        self._mark_changed()
+        return removed
+    
+    def reset(self):
+        for shard in self.shard_list():
+            shard.reset()
+        self._mark_changed()
+    
+    def save_index(self):
+        for shard in self.shard_list():
+            shard.save_index()
+        self._refresh_version()
+        self._save_registry()
+    
+    def load_index(self):
+        for shard in self.shard_list():
+            shard.load_index()
+    
+    def select_ids(self, filters) -> np.ndarray:
+        """Ascending IDs of the chunks a filter accepts, from every shard's own metadata index"""
+        filters = MetadataFilter.parse(filters)
+        selected = [shard.select_ids(filters) for shard in self.shard_list()]
+        return np.sort(np.concatenate(selected)) if selected else np.empty(0, dtype='int64')
+    
+    def search_index(self, query_matrix: np.ndarray, n_results: int = 5,
+                     filters: MetadataFilter = None) -> List[Tuple[Tuple[int, float], ...]]:
+        """Scatter the queries to every non-empty shard, then merge each row's hits by distance
+
+        A filter is applied inside each shard's FAISS search; shards with no
+        matching chunk (other documents, under document sharding) return
+        without searching.
+        """
+        shards = [shard for shard in self.shard_list() if shard.index.ntotal or shard._pending]
+        if not shards:
+            raise ValueError(
+                "No documents in index!\n"
+                "Please run: python pipeline.py"
+            )
+        if len(shards) == 1:
+            return shards[0].search_index(query_matrix, n_results, filters)
+        
+        per_shard = list(self._pool.map(lambda shard: shard.search_index(query_matrix, n_results, filters), shards))
+        # Each shard's hits are already sorted by distance
+        return [
+            tuple(islice(heapq.merge(*(hits[row] for hits in per_shard), key=itemgetter(1)), n_results))
+            for row in range(len(query_matrix))
+        ]
+    
+    def shard_stats(self) -> List[Dict]:
+        return [
+            {'shard': name, 'path': shard.index_path, 'chunks': shard.count(), 'index_version': shard.index_version}
+            for name, shard in sorted(self.shards.items())
+        ]
\ No newline at end of file
@@ -0,0 +1,248 @@
+from typing import List, Dict, Iterable, Set, Tuple
+import math
+import os
+import re
+import sqlite3
+import threading
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'did', 'do', 'does', 'for', 'from', 'how', 'in',
+    'is', 'it', 'its', 'much', 'of', 'on', 'or', 'the', 'to', 'was', 'were', 'what', 'when', 'which',
+    'who', 'will', 'with', 'according', 'value', 'values', 'level', 'show', 'tell', 'me'
+}
+
+def terms(text: str) -> List[str]:
+    """Lowercased lookup terms; 'non-hydrocarbon' and 'nonhydrocarbon' both become 'nonhydrocarbon'"""
+    text = re.sub(r"(?<=[a-z])-(?=[a-z])", "", text.lower())
+    return [t for t in re.findall(r"[a-z0-9]+", text) if len(t) > 1 and t not in STOPWORDS]
+
+def parse_number(value: str):
+    """'1,234.5' -> 1234.5, '(2.0)' -> -2.0, anything else -> None"""
+    cleaned = value.replace(',', '').replace('−', '-').replace('–', '-').rstrip('%')
+    negative = cleaned.startswith('(') and cleaned.endswith(')')
+    try:
+        number = float(cleaned.strip('()'))
+    except ValueError:
+        return None
+    return -number if negative else number
+
+class TableStore:
+    """Table rows stored cell by cell in SQLite, keyed by the row chunk's vector ID
+
+    Sits next to the DocumentStore. Cells are kept one per (row, column) so a
+    question like "CPI inflation 2024" resolves through two small term
+    indexes: label terms -> rows, header terms -> columns, and returns just
+    the matching values instead of the whole table.
+    """
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS table_rows (
+                    id INTEGER PRIMARY KEY,
+                    document TEXT,
+                    page INTEGER,
+                    table_id INTEGER,
+                    row INTEGER,
+                    label TEXT NOT NULL,
+                    section TEXT,
+                    caption TEXT
+                );
+                CREATE TABLE IF NOT EXISTS table_cells (
+                    id INTEGER NOT NULL,
+                    col INTEGER NOT NULL,
+                    header TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    number REAL,
+                    PRIMARY KEY (id, col)
+                );
+                CREATE TABLE IF NOT EXISTS row_terms (
+                    term TEXT NOT NULL,
+                    id INTEGER NOT NULL,
+                    weight REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS header_terms (
+                    term TEXT NOT NULL,
+                    id INTEGER NOT NULL,
+                    col INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS row_terms_term ON row_terms (term);
+                CREATE INDEX IF NOT EXISTS row_terms_id ON row_terms (id);
+                CREATE INDEX IF NOT EXISTS header_terms_term ON header_terms (term);
+                CREATE INDEX IF NOT EXISTS header_terms_id ON header_terms (id);
+            """)
+            self._conn.commit()
+    
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM table_rows").fetchone()[0]
+    
+    def put_rows(self, rows: Iterable[Tuple[int, Dict]]):
+        """Insert or replace (id, metadata) pairs of 'table_row' chunks
+
+        metadata needs 'label', 'header' and 'values'; 'section', 'caption',
+        'document', 'page', 'table_id' and 'row' are stored when present.
+        """
+        rows = [(int(vector_id), meta) for vector_id, meta in rows]
+        if not rows:
+            return
+        
+        records, cells, row_terms, header_terms = [], [], [], []
+        for vector_id, meta in rows:
+            records.append((vector_id, meta.get('document'), meta.get('page'), meta.get('table_id'),
+                            meta.get('row'), meta['label'], meta.get('section', ''), meta.get('caption', '')))
+            
+            # Label terms count fully; section and caption terms only narrow things down
+            weights = {}
+            for text, weight in ((meta.get('caption', ''), 0.5), (meta.get('section', ''), 0.5), (meta['label'], 1.0)):
+                for term in terms(text or ''):
+                    weights[term] = max(weights.get(term, 0.0), weight)
+            row_terms.extend((term, vector_id, weight) for term, weight in weights.items())
+            
+            for col, (header, value) in enumerate(zip(meta['header'], meta['values'])):
+                if not value:
+                    continue
+                cells.append((vector_id, col, header, value, parse_number(value)))
+                header_terms.extend((term, vector_id, col) for term in set(terms(header)))
+        
+        ids = [(vector_id,) for vector_id, _ in rows]
+        with self._lock:
+            for table in ('table_cells', 'row_terms', 'header_terms'):
+                self._conn.executemany(f"DELETE FROM {table} WHERE id = ?", ids)
+            self._conn.executemany("INSERT OR REPLACE INTO table_rows VALUES (?, ?, ?, ?, ?, ?, ?, ?)", records)
+            self._conn.executemany("INSERT INTO table_cells VALUES (?, ?, ?, ?, ?)", cells)
+            self._conn.executemany("INSERT INTO row_terms VALUES (?, ?, ?)", row_terms)
+            self._conn.executemany("INSERT INTO header_terms VALUES (?, ?, ?)", header_terms)
+    
+    def delete_many(self, ids: Iterable[int]):
+        ids = [(int(i),) for i in ids]
+        with self._lock:
+            for table in ('table_rows', 'table_cells', 'row_terms', 'header_terms'):
+                self._conn.executemany(f"DELETE FROM {table} WHERE id = ?", ids)
+    
+    def clear(self):
+        with self._lock:
+            for table in ('table_rows', 'table_cells', 'row_terms', 'header_terms'):
+                self._conn.execute(f"DELETE FROM {table}")
+    
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+    
+    def lookup(self, query: str, limit: int = 3, max_df: float = 0.5, allowed: Set[int] = None) -> List[Dict]:
+        """Rows whose label best covers the query, with the values of the columns it names
+
+        Query terms that match a column header ("2024", "Q3") select columns;
+        the rest are matched against row labels (and, at half weight, section
+        and caption), weighted by IDF. Terms no stored row contains, and
+        terms in more than max_df of all rows (the country name in every
+        caption), are ignored. score is the covered share of the remaining
+        IDF mass, from 0 to 1.
+        Rows are only returned if at least one label term matched and they
+        have a value in a named column, and, when `allowed` is given, if
+        their ID is in it.
+        """
+        query_terms = list(dict.fromkeys(terms(query)))
+        if not query_terms:
+            return []
+        placeholders = ','.join('?' * len(query_terms))
+        
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM table_rows").fetchone()[0]
+            if not total:
+                return []
+            header_hits = self._conn.execute(
+                f"SELECT DISTINCT term FROM header_terms WHERE term IN ({placeholders})", query_terms
+            ).fetchall()
+            header_query = [row[0] for row in header_hits]
+            label_query = [t for t in query_terms if t not in header_query]
+            if not label_query:
+                return []
+            
+            placeholders = ','.join('?' * len(label_query))
+            postings = self._conn.execute(
+                f"SELECT term, id, weight FROM row_terms WHERE term IN ({placeholders})", label_query
+            ).fetchall()
+            
+            # A row can only answer "... in 2024" if it has a 2024 value
+            with_columns = None
+            if header_query:
+                placeholders = ','.join('?' * len(header_query))
+                with_columns = {row[0] for row in self._conn.execute(
+                    f"SELECT DISTINCT id FROM header_terms WHERE term IN ({placeholders})", header_query
+                )}
+        
+        document_frequency = {}
+        for term, _, _ in postings:
+            document_frequency[term] = document_frequency.get(term, 0) + 1
+        idf = {term: math.log(1 + total / df) for term, df in document_frequency.items() if df <= max_df * total}
+        postings = [posting for posting in postings if posting[0] in idf]
+        mass = sum(idf.values())
+        if not mass:
+            return []
+        
+        scores, has_label = {}, set()
+        for term, vector_id, weight in postings:
+            scores[vector_id] = scores.get(vector_id, 0.0) + weight * idf[term]
+            if weight == 1.0 and (with_columns is None or vector_id in with_columns):
+                has_label.add(vector_id)
+        if allowed is not None:
+            has_label &= allowed
+        ranked = sorted((i for i in scores if i in has_label), key=lambda i: (-scores[i], i))[:limit]
+        if not ranked:
+            return []
+        
+        return self._rows(ranked, {i: scores[i] / mass for i in ranked}, header_query)
+    
+    def _rows(self, ids: List[int], scores: Dict[int, float], header_query: List[str]) -> List[Dict]:
+        placeholders = ','.join('?' * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, document, page, table_id, row, label, section, caption "
+                f"FROM table_rows WHERE id IN ({placeholders})", ids
+            ).fetchall()
+            cells = self._conn.execute(
+                f"SELECT id, col, header, value, number FROM table_cells WHERE id IN ({placeholders}) "
+                f"ORDER BY id, col", ids
+            ).fetchall()
+            wanted = set()
+            if header_query:
+                term_placeholders = ','.join('?' * len(header_query))
+                wanted = set(self._conn.execute(
+                    f"SELECT id, col FROM header_terms WHERE id IN ({placeholders}) AND term IN ({term_placeholders})",
+                    ids + header_query
+                ).fetchall())
+        
+        values = {}
+        for vector_id, col, header, value, number in cells:
+            # With no column named in the question, the whole row is the answer
+            if not header_query or (vector_id, col) in wanted:
+                values.setdefault(vector_id, []).append({'header': header, 'value': value, 'number': number})
+        
+        found = {
+            row[0]: {
+                'id': row[0],
+                'document': row[1],
+                'page': row[2],
+                'table_id': row[3],
+                'row': row[4],
+                'label': row[5],
+                'section': row[6],
+                'caption': row[7],
+                'values': values.get(row[0], []),
+                'score': round(scores[row[0]], 4),
+            }
+            for row in rows
+        }
+        return [found[i] for i in ids if i in found]
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
\ No newline at end of file
@@ -5,6 +5,7 @@ LLM-based response generation with citations
 """
 
 from .qa_generator import QAGenerator
+from .context_packer import ContextPacker, count_tokens
 
-__all__ = ['QAGenerator']
+__all__ = ['QAGenerator', 'ContextPacker', 'count_tokens']
 
@@ -0,0 +1,171 @@
+from typing import Dict, List, Set
+from functools import lru_cache
+import re
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to a character-based estimate
+    tiktoken = None
+
+CHARS_PER_TOKEN = 4  # Rough average for English prose with the OpenAI tokenizers
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """Prompt tokens for text (exact with tiktoken installed, estimated otherwise)"""
+    if tiktoken is not None:
+        return len(_encoding(model).encode(text))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "gpt-3.5-turbo") -> str:
+    if max_tokens <= 0:
+        return ""
+    if tiktoken is not None:
+        encoding = _encoding(model)
+        tokens = encoding.encode(text)
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    return text[:max_tokens * CHARS_PER_TOKEN]
+
+def shingles(text: str, size: int = 5) -> Set[int]:
+    """Hashed word n-grams; short texts fall back to their individual words"""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {hash(w) for w in words}
+    return {hash(tuple(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+def splice_overlap(first: str, second: str, min_overlap: int = 20) -> str:
+    """Join two consecutive splits, dropping the text the splitter repeated in both"""
+    for size in range(min(len(first), len(second)), min_overlap - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return first + "\n" + second
+
+class ContextPacker:
+    """Fits retrieved chunks into a prompt token budget
+
+    Chunks are taken in the order the retriever (or reranker) ranked them:
+    near-duplicates of a more relevant chunk are dropped, consecutive splits
+    of the same paragraph are merged back together, and whatever does not
+    fit the budget is trimmed from the least relevant end.
+    """
+    
+    def __init__(self, model: str = "gpt-3.5-turbo", token_budget: int = 3000,
+                 duplicate_threshold: float = 0.8):
+        """
+        token_budget: max tokens for the whole prompt (system + instructions + context)
+        duplicate_threshold: share of a chunk's shingles already present in a kept
+            chunk above which it is dropped as a near-duplicate
+        """
+        self.model = model
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+    
+    def _dedupe(self, units: List[Dict]) -> List[Dict]:
+        kept = []
+        for unit in units:
+            grams = shingles(unit['content'])
+            duplicate = False
+            for other in kept:
+                # Containment rather than Jaccard: a table row repeated inside a paragraph counts
+                overlap = len(grams & other['shingles']) / max(1, min(len(grams), len(other['shingles'])))
+                if overlap >= self.duplicate_threshold:
+                    duplicate = True
+                    break
+            if not duplicate:
+                kept.append({**unit, 'shingles': grams})
+        return kept
+    
+    def _merge_adjacent(self, units: List[Dict]) -> List[Dict]:
+        """Merge consecutive splits (chunk_id n, n+1) of the same paragraph into one source
+
+        Only SmartChunker splits carry a para_id; chunks without one (semantic
+        chunks, or splits indexed before para_id existed) are never merged.
+        """
+        merged = []
+        by_first, by_last = {}, {}  # (document, page, para_id, chunk_id) -> merged unit starting/ending there
+        for unit in units:
+            meta = unit['metadata']
+            chunk_id = meta.get('chunk_id')
+            if meta.get('type') != 'text' or chunk_id is None or meta.get('para_id') is None:
+                merged.append({**unit, 'ids': [unit['id']]})
+                continue
+            
+            position = (meta.get('document'), meta.get('page'), meta.get('para_id'))
+            before = by_last.pop(position + (chunk_id - 1,), None)
+            after = None if before else by_first.pop(position + (chunk_id + 1,), None)
+            
+            if before:
+                before['content'] = splice_overlap(before['content'], unit['content'])
+                before['ids'].append(unit['id'])
+                by_last[position + (chunk_id,)] = before
+            elif after:
+                after['content'] = splice_overlap(unit['content'], after['content'])
+                after['ids'].insert(0, unit['id'])
+                by_first[position + (chunk_id,)] = after
+            else:
+                unit = {**unit, 'ids': [unit['id']]}
+                merged.append(unit)
+                by_first[position + (chunk_id,)] = unit
+                by_last[position + (chunk_id,)] = unit
+        
+        return merged
+    
+    def pack(self, retrieved: Dict, overhead_tokens: int = 0) -> Dict:
+        """Subset of the retrieved chunks that fits the budget, in relevance order
+
+        The incoming order is the relevance order. Distances are not re-sorted:
+        dense L2, 1 - fused score, 1 - table lookup score and 1 - rerank score
+        are different scales, and table rows are deliberately put first.
+
+        Returns the retrieved dict shape plus 'packing' stats. overhead_tokens
+        is the prompt without any context (system message, instructions, question).
+        """
+        units = [
+            {'id': i, 'content': doc, 'metadata': meta, 'distance': dist}
+            for i, doc, meta, dist in zip(
+                retrieved.get('ids', range(len(retrieved['documents']))),
+                retrieved['documents'], retrieved['metadatas'], retrieved['distances']
+            )
+        ]
+        tokens_in = sum(count_tokens(u['content'], self.model) for u in units)
+        
+        deduped = self._dedupe(units)
+        merged = self._merge_adjacent(deduped)
+        
+        # Best-first until the budget runs out; the best chunk is truncated rather than dropped
+        remaining = self.token_budget - overhead_tokens
+        packed = []
+        for unit in merged:
+            meta = unit['metadata']
+            header = count_tokens(f"[Source {len(packed)+1}, Page {meta.get('page')}, Type: {meta.get('type')}]\n", self.model)
+            tokens = count_tokens(unit['content'], self.model) + header
+            if tokens > remaining:
+                if packed:
+                    break  # Everything from here on ranks lower
+                unit['content'] = truncate_tokens(unit['content'], remaining - header, self.model)
+                tokens = remaining
+            packed.append(unit)
+            remaining -= tokens
+        
+        return {
+            'ids': [u['ids'][0] for u in packed],
+            'documents': [u['content'] for u in packed],
+            'metadatas': [
+                {**u['metadata'], 'merged_ids': u['ids']} if len(u['ids']) > 1 else u['metadata']
+                for u in packed
+            ],
+            'distances': [u['distance'] for u in packed],
+            'packing': {
+                'budget': self.token_budget,
+                'tokens_in': tokens_in,
+                'tokens_out': sum(count_tokens(u['content'], self.model) for u in packed),
+                'duplicates_dropped': len(units) - len(deduped),
+                'chunks_merged': len(deduped) - len(merged),
+                'chunks_trimmed': len(merged) - len(packed),
+            }
+        }
\ No newline at end of file
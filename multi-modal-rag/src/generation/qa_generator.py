@@ -1,25 +1,46 @@
-from typing import List, Dict
-from openai import OpenAI
+from typing import List, Dict, Iterator
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
 
+from .context_packer import ContextPacker, count_tokens
+from ..tracing import tracer
+
 load_dotenv()
 
+SYSTEM_PROMPT = "You are a helpful financial analyst."
+
 class QAGenerator:
-    def __init__(self):
+    def __init__(self, base_url: str = None, prompt_budgets: Dict[str, int] = None):
         api_key = os.getenv('OPENAI_API_KEY')
         if not api_key:
             raise ValueError("OpenAI API key not found!")
         
-        self.client = OpenAI(api_key=api_key)
+        # base_url points the client at any OpenAI-compatible server (e.g. a local fake for tests)
+        self.api_key = api_key
+        self.base_url = base_url or os.getenv('OPENAI_BASE_URL')
+        self._client = None  # Created on first use; importing openai is a noticeable part of startup
+        self._async_client = None  # (event loop, AsyncOpenAI); HTTP pools are bound to a loop
         
         # Use GPT-3.5-turbo (cheaper and more widely available)
         # You can change this to gpt-4o or gpt-4o-mini if you have access
         self.model = "gpt-3.5-turbo"
-    
-    def generate_answer(self, query: str, retrieved_chunks: Dict) -> Dict:
-        """Generate answer with citations"""
         
+        # Prompt token budget for this model ({model: tokens}, 'default' for the rest)
+        budgets = prompt_budgets or {}
+        self.packer = ContextPacker(self.model, token_budget=budgets.get(self.model, budgets.get('default', 3000)))
+    
+    @property
+    def client(self):
+        if self._client is None:
+            with tracer.span("load_llm_client"):
+                from openai import OpenAI
+                self._client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        return self._client
+    
+    def build_prompt(self, query: str, retrieved_chunks: Dict) -> str:
+        """Prompt with the retrieved context and citation instructions"""
         # Prepare context from retrieved chunks
         context_parts = []
         for idx, (doc, meta) in enumerate(zip(
@@ -48,40 +69,178 @@ Instructions:
 5. Structure your answer clearly
 
 Answer:"""
+        return prompt
+    
+    def pack_context(self, query: str, retrieved_chunks: Dict) -> Dict:
+        """Deduplicated, merged chunks that fit the model's prompt budget"""
+        with tracer.span("pack_context") as span:
+            overhead = count_tokens(
+                SYSTEM_PROMPT + self.build_prompt(query, {'documents': [], 'metadatas': []}), self.model
+            )
+            packed = self.packer.pack(retrieved_chunks, overhead_tokens=overhead)
+            span.set_attributes(**packed['packing'])
+        return packed
+    
+    def build_sources(self, retrieved_chunks: Dict) -> List[Dict]:
+        """Source list shown alongside the answer"""
+        sources = []
+        for idx, meta in enumerate(retrieved_chunks['metadatas']):
+            sources.append({
+                'source_id': idx + 1,
+                'page': meta['page'],
+                'type': meta['type'],
+                'relevance': 1.0 - retrieved_chunks['distances'][idx]
+            })
+        return sources
+    
+    def _messages(self, query: str, retrieved_chunks: Dict) -> List[Dict]:
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": self.build_prompt(query, retrieved_chunks)}
+        ]
+    
+    def _fallback_answer(self, error: Exception, retrieved_chunks: Dict) -> str:
+        return f"Error: {str(error)}\n\nRetrieved context:\n" + "\n".join([
+            f"Source {i+1} (Page {meta['page']}): {doc[:200]}..."
+            for i, (doc, meta) in enumerate(zip(retrieved_chunks['documents'], retrieved_chunks['metadatas']))
+        ])
+    
+    @staticmethod
+    def _record_usage(span, response):
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            span.set_attributes(
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens
+            )
+    
+    def generate_answer(self, query: str, retrieved_chunks: Dict) -> Dict:
+        """Generate answer with citations"""
+        retrieved_chunks = self.pack_context(query, retrieved_chunks)
         
         # Generate answer
+        error = None
+        with tracer.span("generate", model=self.model) as span:
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=self._messages(query, retrieved_chunks),
+                    temperature=0.1,
+                    max_tokens=500
+                )
+                
+                answer_text = response.choices[0].message.content
+                self._record_usage(span, response)
+            
+            except Exception as e:
+                print(f"Error generating answer: {e}")
+                error = str(e)
+                span.set_attribute('error', error)
+                answer_text = self._fallback_answer(e, retrieved_chunks)
+        
+        return {
+            'answer': answer_text,
+            'sources': self.build_sources(retrieved_chunks),
+            'context_used': len(retrieved_chunks['documents']),
+            'packing': retrieved_chunks['packing'],
+            'error': error
+        }
+    
+    def _get_async_client(self):
+        from openai import AsyncOpenAI
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client[0] is not loop:
+            self._async_client = (loop, AsyncOpenAI(api_key=self.api_key, base_url=self.base_url))
+        return self._async_client[1]
+    
+    async def agenerate_answer(self, query: str, retrieved_chunks: Dict) -> Dict:
+        """Async version of generate_answer (does not block the event loop)"""
+        retrieved_chunks = self.pack_context(query, retrieved_chunks)
+        error = None
+        with tracer.span("generate", model=self.model) as span:
+            try:
+                response = await self._get_async_client().chat.completions.create(
+                    model=self.model,
+                    messages=self._messages(query, retrieved_chunks),
+                    temperature=0.1,
+                    max_tokens=500
+                )
+                
+                answer_text = response.choices[0].message.content
+                self._record_usage(span, response)
+            
+            except Exception as e:
+                print(f"Error generating answer: {e}")
+                error = str(e)
+                span.set_attribute('error', error)
+                answer_text = self._fallback_answer(e, retrieved_chunks)
+        
+        return {
+            'answer': answer_text,
+            'sources': self.build_sources(retrieved_chunks),
+            'context_used': len(retrieved_chunks['documents']),
+            'packing': retrieved_chunks['packing'],
+            'error': error
+        }
+    
+    def stream_answer(self, query: str, retrieved_chunks: Dict) -> Iterator[Dict]:
+        """Stream an answer as events: sources first, then tokens, then the final result
+
+        Events are dicts with a 'type' of:
+          'sources' - {'sources', 'context_used'}, sent before the LLM is called
+          'token'   - {'content'}, one per streamed delta
+          'done'    - the same dict generate_answer returns
+        """
+        retrieved_chunks = self.pack_context(query, retrieved_chunks)
+        sources = self.build_sources(retrieved_chunks)
+        yield {'type': 'sources', 'sources': sources, 'context_used': len(retrieved_chunks['documents'])}
+        
+        parts = []
+        error = None
+        start = time.perf_counter()
+        first_token_ms = None
         try:
-            response = self.client.chat.completions.create(
+            stream = self.client.chat.completions.create(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful financial analyst."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._messages(query, retrieved_chunks),
                 temperature=0.1,
-                max_tokens=500
+                max_tokens=500,
+                stream=True
             )
             
-            answer_text = response.choices[0].message.content
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first_token_ms is None:
+                        first_token_ms = (time.perf_counter() - start) * 1000
+                    parts.append(delta)
+                    yield {'type': 'token', 'content': delta}
             
+            answer_text = "".join(parts)
+        
         except Exception as e:
             print(f"Error generating answer: {e}")
-            answer_text = f"Error: {str(e)}\n\nRetrieved context:\n" + "\n".join([
-                f"Source {i+1} (Page {meta['page']}): {doc[:200]}..."
-                for i, (doc, meta) in enumerate(zip(retrieved_chunks['documents'], retrieved_chunks['metadatas']))
-            ])
+            error = str(e)
+            fallback = self._fallback_answer(e, retrieved_chunks)
+            if parts:
+                fallback = "\n\n" + fallback
+            yield {'type': 'token', 'content': fallback}
+            answer_text = "".join(parts) + fallback
         
-        # Extract sources
-        sources = []
-        for idx, meta in enumerate(retrieved_chunks['metadatas']):
-            sources.append({
-                'source_id': idx + 1,
-                'page': meta['page'],
-                'type': meta['type'],
-                'relevance': 1.0 - retrieved_chunks['distances'][idx]
-            })
+        # Recorded after the fact: a span held open across yields would be reset in the consumer's context
+        tracer.record(
+            "generate", (time.perf_counter() - start) * 1000,
+            model=self.model, streamed=True, first_token_ms=first_token_ms,
+            completion_chunks=len(parts), **({'error': error} if error else {})
+        )
         
-        return {
+        yield {
+            'type': 'done',
             'answer': answer_text,
             'sources': sources,
-            'context_used': len(retrieved_chunks['documents'])
+            'context_used': len(retrieved_chunks['documents']),
+            'packing': retrieved_chunks['packing'],
+            'error': error
         }
\ No newline at end of file
@@ -5,5 +5,7 @@ Handles PDF parsing, table extraction, and image processing
 """
 
 from .pdf_processor import MultiModalPDFProcessor
+from .corpus import CorpusIngestor
+from .image_extractor import ImageExtractor
 
-__all__ = ['MultiModalPDFProcessor']
+__all__ = ['MultiModalPDFProcessor', 'CorpusIngestor', 'ImageExtractor']
@@ -0,0 +1,83 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Dict, Iterator, Optional, Tuple
+import os
+import pymupdf
+
+from .image_extractor import ImageExtractor
+from .pdf_processor import MultiModalPDFProcessor
+
+def _extract_range(task: Tuple[str, str, int, int], table_strategy: str = 'auto',
+                   image_options: Optional[Dict] = None) -> List[Dict]:
+    """Worker: extract text, table and image chunks for one page range of one PDF"""
+    pdf_path, document, start_page, end_page = task
+    # Already inside a worker process, so OCR runs inline
+    images = ImageExtractor(**{**image_options, 'workers': 0}) if image_options is not None else None
+    processor = MultiModalPDFProcessor(pdf_path, verbose=False, table_strategy=table_strategy,
+                                       image_extractor=images, document=document)
+    try:
+        chunks = list(processor.process_all(start_page, end_page))
+    finally:
+        processor.close()
+    return chunks
+
+class CorpusIngestor:
+    def __init__(self, corpus_dir: str, workers: Optional[int] = None, pages_per_task: int = 25,
+                 table_strategy: str = 'auto', image_options: Optional[Dict] = None):
+        """
+        workers: process pool size (defaults to one per CPU core)
+        pages_per_task: long documents are split into page ranges of this size
+        table_strategy: passed to MultiModalPDFProcessor
+        image_options: ImageExtractor arguments; None skips images
+        """
+        self.corpus_dir = corpus_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.pages_per_task = max(1, pages_per_task)
+        self.table_strategy = table_strategy
+        self.image_options = image_options
+    
+    def discover(self) -> List[str]:
+        """All PDFs under the corpus directory, in a stable order"""
+        return sorted(str(p) for p in Path(self.corpus_dir).rglob('*.pdf'))
+    
+    def document_name(self, pdf_path: str) -> str:
+        """A PDF's path relative to the corpus root, so same-named files in different folders stay distinct"""
+        return Path(pdf_path).relative_to(self.corpus_dir).as_posix()
+    
+    def plan_tasks(self, pdf_paths: List[str]) -> List[Tuple[str, str, int, int]]:
+        """Split documents into (path, document, start_page, end_page) work items"""
+        tasks = []
+        for pdf_path in pdf_paths:
+            try:
+                with pymupdf.open(pdf_path) as doc:
+                    page_count = len(doc)
+            except Exception as e:
+                print(f"  Warning: Skipping {pdf_path}: {e}")
+                continue
+            
+            document = self.document_name(pdf_path)
+            for start in range(0, page_count, self.pages_per_task):
+                tasks.append((pdf_path, document, start, min(start + self.pages_per_task, page_count)))
+        
+        return tasks
+    
+    def iter_chunks(self) -> Iterator[List[Dict]]:
+        """Yield each page range's chunks as soon as its worker finishes"""
+        pdf_paths = self.discover()
+        tasks = self.plan_tasks(pdf_paths)
+        
+        print(f"✓ Found {len(pdf_paths)} PDFs ({len(tasks)} page ranges, {self.workers} workers)")
+        
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(_extract_range, task, self.table_strategy, self.image_options): task for task in tasks}
+            
+            for done, future in enumerate(as_completed(futures), start=1):
+                _, document, start, end = futures[future]
+                try:
+                    chunks = future.result()
+                except Exception as e:
+                    print(f"  Warning: Failed {document} pages {start + 1}-{end}: {e}")
+                    continue
+                
+                print(f"  [{done}/{len(tasks)}] {document} pages {start + 1}-{end}: {len(chunks)} chunks")
+                yield chunks
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+Embedded image extraction with OCR and captions.
+
+Raster images are found with PyMuPDF. Each image is described by:
+- its caption: the title, subtitle and source lines laid out around it on the page
+- the text inside it, read with Tesseract through PyMuPDF's OCR support
+  (CPU only; needs Tesseract language data, see pymupdf.get_tessdata())
+
+OCR runs in a process pool and its results are cached on disk under the
+hash of the image's raw stream, so the same figure is only read once.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+import hashlib
+import json
+import os
+import re
+
+import pymupdf
+
+CAPTION_LABEL = re.compile(r"^(Figure|Chart|Box|Graph|Panel|Table|Text Table|Annex|Source|Sources|Note|Notes)\b",
+                           re.IGNORECASE)
+
+def ocr_available() -> bool:
+    """Whether PyMuPDF can find Tesseract language data"""
+    try:
+        pymupdf.get_tessdata()
+        return True
+    except Exception:
+        return False
+
+def _ocr_image(task) -> str:
+    """Worker: OCR text of one image xref"""
+    pdf_path, xref, language, min_width = task
+    with pymupdf.open(pdf_path) as doc:
+        pix = pymupdf.Pixmap(doc, xref)
+    if pix.colorspace is None or pix.colorspace.n not in (1, 3):
+        pix = pymupdf.Pixmap(pymupdf.csRGB, pix)
+    if pix.alpha:
+        pix = pymupdf.Pixmap(pix, 0)
+    if pix.width < min_width:
+        # Tesseract reads small chart labels far better after upscaling
+        scale = -(-min_width // pix.width)
+        pix = pymupdf.Pixmap(pix, pix.width * scale, pix.height * scale, None)
+    
+    with pymupdf.open("pdf", pix.pdfocr_tobytes(language=language)) as ocr_doc:
+        text = ocr_doc[0].get_text()
+    return re.sub(r"[ \t]+", " ", re.sub(r"\n\s*\n+", "\n", text)).strip()
+
+def _caption(page, bbox: pymupdf.Rect, margin: float = 60.0, max_chars: int = 200) -> str:
+    """Short text blocks just above and below an image (title, subtitle, source line)"""
+    above, below = [], []
+    for x0, y0, x1, y1, text, *_ in page.get_text("blocks"):
+        text = " ".join(text.split())
+        if not text or len(text) > max_chars or x1 <= bbox.x0 or x0 >= bbox.x1:
+            continue
+        if 0 <= bbox.y0 - y1 <= margin:
+            above.append((y0, text))
+        elif 0 <= y0 - bbox.y1 <= margin / 2 and CAPTION_LABEL.match(text):
+            below.append((y0, text))
+    
+    # Keep from the nearest labelled title ("Figure 3. ...") down to the image
+    above.sort()
+    titled = [i for i, (_, text) in enumerate(above) if CAPTION_LABEL.match(text)]
+    if titled:
+        above = above[titled[-1]:]
+    elif above:
+        above = above[-1:]
+    return " ".join(text for _, text in sorted(above) + sorted(below))
+
+class ImageExtractor:
+    def __init__(self, cache_dir: str = "faiss_index/image_cache", workers: Optional[int] = None,
+                 ocr: bool = True, language: str = "eng", min_pixels: int = 100, max_aspect: float = 4.0,
+                 ocr_min_width: int = 1000):
+        """
+        workers: OCR process pool size (defaults to one per CPU core); 0 runs OCR
+            inline, e.g. inside CorpusIngestor's worker processes
+        min_pixels / max_aspect: smaller images (icons, bullets) and wider or
+            taller ones (banners, rules) are skipped
+        """
+        self.cache_dir = cache_dir
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.language = language
+        self.min_pixels = min_pixels
+        self.max_aspect = max_aspect
+        self.ocr_min_width = ocr_min_width
+        self.ocr = ocr and ocr_available()
+        self.ocr_missing = ocr and not self.ocr
+        self.stats = {'images': 0, 'cache_hits': 0, 'ocr_runs': 0, 'ocr_failures': 0}
+    
+    def _cache_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}-{self.language}.json")
+    
+    def _cached(self, digest: str) -> Optional[str]:
+        try:
+            with open(self._cache_path(digest), encoding='utf-8') as f:
+                return json.load(f)['ocr_text']
+        except (OSError, ValueError, KeyError):
+            return None
+    
+    def _store(self, digest: str, text: str):
+        path = self._cache_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'ocr_text': text, 'language': self.language}, f)
+        os.replace(tmp, path)
+    
+    def page_images(self, page) -> List[Dict]:
+        """Images on a page worth indexing, with bbox, hash and caption (no OCR yet)"""
+        images, seen = [], set()
+        for img in page.get_images(full=True):
+            xref, width, height = img[0], img[2], img[3]
+            if xref in seen or min(width, height) < self.min_pixels or max(width, height) > self.max_aspect * min(width, height):
+                continue
+            seen.add(xref)
+            
+            bbox = page.get_image_bbox(img)
+            if bbox.is_infinite or bbox.is_empty:
+                continue  # Referenced by the page but never drawn
+            images.append({
+                'xref': xref,
+                'bbox': [round(v, 1) for v in bbox],
+                'width': width,
+                'height': height,
+                'image_hash': hashlib.sha1(page.parent.xref_stream_raw(xref)).hexdigest(),
+                'caption': _caption(page, bbox),
+                'ocr_text': "",
+            })
+        return images
+    
+    def iter_pages(self, doc, pdf_path: str, page_numbers) -> Iterator[List[Dict]]:
+        """Yield each page's images with OCR text filled in, in page order
+
+        Every page is scanned up front so uncached images start OCR in the
+        pool right away; pages are then yielded as their images finish.
+        """
+        page_numbers = list(page_numbers)
+        pages = [self.page_images(doc[page_num]) for page_num in page_numbers]
+        images = [image for page in pages for image in page]
+        self.stats['images'] += len(images)
+        
+        pending = {}
+        if self.ocr:
+            for image in images:
+                cached = self._cached(image['image_hash'])
+                if cached is not None:
+                    image['ocr_text'] = cached
+                    self.stats['cache_hits'] += 1
+                elif image['image_hash'] not in pending:
+                    pending[image['image_hash']] = (pdf_path, image['xref'], self.language, self.ocr_min_width)
+        
+        pool = ProcessPoolExecutor(max_workers=min(self.workers, len(pending))) if self.workers and len(pending) > 1 else None
+        try:
+            futures = {digest: pool.submit(_ocr_image, task) for digest, task in pending.items()} if pool else {}
+            results = {}
+            for page_num, page in zip(page_numbers, pages):
+                for image in page:
+                    digest = image['image_hash']
+                    if digest not in pending:
+                        continue
+                    if digest not in results:
+                        try:
+                            results[digest] = futures[digest].result() if pool else _ocr_image(pending[digest])
+                            self._store(digest, results[digest])
+                            self.stats['ocr_runs'] += 1
+                        except Exception as e:
+                            print(f"  Warning: OCR failed for image {image['xref']} on page {page_num + 1}: {e}")
+                            results[digest] = ""
+                            self.stats['ocr_failures'] += 1
+                    image['ocr_text'] = results[digest]
+                yield page
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
\ No newline at end of file
@@ -1,103 +1,239 @@
 import pymupdf
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional
 import re
 
+from .image_extractor import ImageExtractor
+from .table_extractor import TABLE_STRATEGIES, extract_tables, render_row, render_table
+
+YEAR = re.compile(r"(?<!\d)(?:19|20)\d{2}(?!\d)")
+
+def document_year(pdf_path: str, doc) -> Optional[int]:
+    """Year a document is filed under: the first year in its file name, else the year it was created"""
+    match = YEAR.search(Path(pdf_path).stem)
+    if match:
+        return int(match.group())
+    # PDF dates look like "D:20250220113404-05'00'"
+    created = re.match(r"(?:D:)?((?:19|20)\d{2})", (doc.metadata or {}).get('creationDate') or '')
+    return int(created.group(1)) if created else None
+
 class MultiModalPDFProcessor:
-    def __init__(self, pdf_path: str):
+    def __init__(self, pdf_path: str, verbose: bool = True, table_strategy: str = 'auto',
+                 image_extractor: Optional[ImageExtractor] = None, document: Optional[str] = None):
+        """
+        table_strategy: 'auto', 'layout' or 'find_tables' for structured tables
+            (see table_extractor.extract_tables), or 'simple' for the old
+            whitespace heuristic
+        image_extractor: adds 'image' chunks (captions + OCR text); None skips images
+        document: name recorded on every chunk; defaults to the file name
+            (CorpusIngestor passes the path relative to the corpus root)
+        """
+        if table_strategy != 'simple' and table_strategy not in TABLE_STRATEGIES:
+            raise ValueError(f"Unknown table strategy '{table_strategy}'. "
+                             f"Choose from: simple, {', '.join(TABLE_STRATEGIES)}")
         self.pdf_path = pdf_path
+        self.document = document or Path(pdf_path).name
         self.doc = pymupdf.open(pdf_path)
+        self.year = document_year(pdf_path, self.doc)
+        self.verbose = verbose
+        self.table_strategy = table_strategy
+        self.image_extractor = image_extractor
+    
+    def _page_range(self, start_page: int, end_page: Optional[int]) -> range:
+        """0-based page numbers in [start_page, end_page), clamped to the document"""
+        end = len(self.doc) if end_page is None else min(end_page, len(self.doc))
+        return range(max(0, start_page), end)
+    
+    def close(self):
+        self.doc.close()
+    
+    def _text_chunks(self, text: str, page_num: int) -> List[Dict]:
+        """Paragraph chunks from one page's text"""
+        # Split into paragraphs
+        paragraphs = [p.strip() for p in text.split('\n\n') if p.strip() and len(p.strip()) > 50]
         
-    def extract_text_chunks(self) -> List[Dict]:
-        """Extract text with page metadata"""
+        return [{
+            'content': para,
+            'type': 'text',
+            'page': page_num + 1,
+            'metadata': {'source': 'text_extraction', 'document': self.document, 'year': self.year}
+        } for para in paragraphs]
+    
+    def _table_chunks(self, text: str, page_num: int, first_table_id: int = 0) -> List[Dict]:
+        """Table chunks from one page's text using simple text analysis"""
+        tables = []
+        
+        def add_table(table_lines):
+            tables.append({
+                'content': '\n'.join(table_lines),
+                'type': 'table',
+                'page': page_num + 1,
+                'metadata': {
+                    'table_id': first_table_id + len(tables),
+                    'extraction_method': 'simple',
+                    'document': self.document,
+                    'year': self.year
+                }
+            })
+        
+        # Look for table-like structures (multiple lines with tabs or spaces)
+        lines = text.split('\n')
+        table_lines = []
+        in_table = False
+        
+        for line in lines:
+            # Simple heuristic: if line has multiple spaces/tabs, might be table
+            if '\t' in line or '  ' in line:
+                table_lines.append(line)
+                in_table = True
+            elif in_table and len(table_lines) > 3:
+                # Found end of table
+                add_table(table_lines)
+                table_lines = []
+                in_table = False
+            else:
+                if in_table and table_lines:
+                    if len(table_lines) > 3:  # Minimum table size
+                        add_table(table_lines)
+                table_lines = []
+                in_table = False
+        
+        return tables
+    
+    def _structured_table_chunks(self, page, text: str, page_num: int, first_table_id: int = 0) -> List[Dict]:
+        """One 'table' chunk per table plus one 'table_row' chunk per row
+
+        Row chunks carry their header and cell values in metadata, which is
+        what the embedder's TableStore indexes for exact row/column lookups.
+        """
         chunks = []
-        for page_num in range(len(self.doc)):
-            page = self.doc[page_num]
-            text = page.get_text()
-            
-            # Split into paragraphs
-            paragraphs = [p.strip() for p in text.split('\n\n') if p.strip() and len(p.strip()) > 50]
-            
-            for para in paragraphs:
+        for offset, table in enumerate(extract_tables(page, self.table_strategy, text)):
+            table_id = first_table_id + offset
+            base = {
+                'table_id': table_id,
+                'extraction_method': table['method'],
+                'caption': table['caption'],
+                'document': self.document,
+                'year': self.year
+            }
+            chunks.append({
+                'content': render_table(table),
+                'type': 'table',
+                'page': page_num + 1,
+                'metadata': {**base, 'rows': len(table['rows'])}
+            })
+            for row_num, (row, section) in enumerate(zip(table['rows'], table['sections'])):
                 chunks.append({
-                    'content': para,
-                    'type': 'text',
+                    'content': render_row(table, row, section),
+                    'type': 'table_row',
                     'page': page_num + 1,
-                    'metadata': {'source': 'text_extraction'}
+                    'metadata': {
+                        **base,
+                        'row': row_num,
+                        'label': row[0],
+                        'section': section,
+                        'header': table['header'][1:],
+                        'values': row[1:]
+                    }
                 })
+        return chunks
+    
+    def _image_chunks(self, images: List[Dict], page_num: int) -> List[Dict]:
+        """Image chunks from one page's extracted images; images with no caption or OCR text are skipped"""
+        chunks = []
+        for image in images:
+            if not image['caption'] and not image['ocr_text']:
+                continue
+            content = f"Figure: {image['caption']}" if image['caption'] else "Figure"
+            if image['ocr_text']:
+                content += f"\n{image['ocr_text']}"
+            chunks.append({
+                'content': content,
+                'type': 'image',
+                'page': page_num + 1,
+                'metadata': {
+                    'source': 'image_extraction',
+                    'document': self.document,
+                    'year': self.year,
+                    'bbox': image['bbox'],
+                    'image_hash': image['image_hash'],
+                    'width': image['width'],
+                    'height': image['height'],
+                    'caption': image['caption'],
+                    'ocr': bool(image['ocr_text'])
+                }
+            })
+        return chunks
+    
+    def iter_pages(self, start_page: int = 0, end_page: Optional[int] = None) -> Iterator[List[Dict]]:
+        """Yield each page's text, table and image chunks, parsing every page exactly once"""
+        table_count = 0
+        page_range = self._page_range(start_page, end_page)
+        images = None
+        if self.image_extractor:
+            images = self.image_extractor.iter_pages(self.doc, self.pdf_path, page_range)
+            if self.image_extractor.ocr_missing and self.verbose:
+                print("  Warning: Tesseract language data not found; indexing image captions without OCR")
+        
+        try:
+            for page_num in page_range:
+                page = self.doc[page_num]
+                text = page.get_text()
+                
+                if self.table_strategy == 'simple':
+                    tables = self._table_chunks(text, page_num, table_count)
+                else:
+                    tables = self._structured_table_chunks(page, text, page_num, table_count)
+                table_count += sum(1 for chunk in tables if chunk['type'] == 'table')
+                
+                chunks = self._text_chunks(text, page_num) + tables
+                if images is not None:
+                    chunks += self._image_chunks(next(images), page_num)
+                yield chunks
+        finally:
+            if images is not None:
+                images.close()
+    
+    def extract_text_chunks(self, start_page: int = 0, end_page: Optional[int] = None) -> List[Dict]:
+        """Extract text with page metadata"""
+        chunks = []
+        for page_num in self._page_range(start_page, end_page):
+            chunks.extend(self._text_chunks(self.doc[page_num].get_text(), page_num))
         
-        print(f"✓ Extracted {len(chunks)} text chunks")
+        if self.verbose:
+            print(f"✓ Extracted {len(chunks)} text chunks")
         return chunks
     
-    def extract_tables_simple(self) -> List[Dict]:
+    def extract_tables_simple(self, start_page: int = 0, end_page: Optional[int] = None) -> List[Dict]:
         """Extract tables using simple text analysis"""
         tables = []
         
-        for page_num in range(len(self.doc)):
-            page = self.doc[page_num]
-            text = page.get_text()
-            
-            # Look for table-like structures (multiple lines with tabs or spaces)
-            lines = text.split('\n')
-            table_lines = []
-            in_table = False
-            
-            for line in lines:
-                # Simple heuristic: if line has multiple spaces/tabs, might be table
-                if '\t' in line or '  ' in line:
-                    table_lines.append(line)
-                    in_table = True
-                elif in_table and len(table_lines) > 3:
-                    # Found end of table
-                    table_text = '\n'.join(table_lines)
-                    tables.append({
-                        'content': table_text,
-                        'type': 'table',
-                        'page': page_num + 1,
-                        'metadata': {
-                            'table_id': len(tables),
-                            'extraction_method': 'simple'
-                        }
-                    })
-                    table_lines = []
-                    in_table = False
-                else:
-                    if in_table and table_lines:
-                        table_text = '\n'.join(table_lines)
-                        if len(table_lines) > 3:  # Minimum table size
-                            tables.append({
-                                'content': table_text,
-                                'type': 'table',
-                                'page': page_num + 1,
-                                'metadata': {
-                                    'table_id': len(tables),
-                                    'extraction_method': 'simple'
-                                }
-                            })
-                    table_lines = []
-                    in_table = False
+        for page_num in self._page_range(start_page, end_page):
+            tables.extend(self._table_chunks(self.doc[page_num].get_text(), page_num, len(tables)))
         
-        print(f"✓ Extracted {len(tables)} tables")
+        if self.verbose:
+            print(f"✓ Extracted {len(tables)} tables")
         return tables
     
-    def process_all(self) -> List[Dict]:
-        """Process all modalities"""
-        all_chunks = []
-        
-        print("\n" + "="*50)
-        print("Processing PDF Document")
-        print("="*50)
-        
-        print("\n[1/2] Extracting text...")
-        all_chunks.extend(self.extract_text_chunks())
+    def process_all(self, start_page: int = 0, end_page: Optional[int] = None) -> Iterator[Dict]:
+        """Process all modalities, streaming chunks page by page"""
+        counts = {'text': 0, 'table': 0, 'table_row': 0, 'image': 0}
         
-        print("\n[2/2] Extracting tables...")
-        all_chunks.extend(self.extract_tables_simple())
+        if self.verbose:
+            print("\n" + "="*50)
+            print("Processing PDF Document")
+            print("="*50)
         
-        print(f"\n{'='*50}")
-        print(f"✓ Total chunks extracted: {len(all_chunks)}")
-        print(f"  - Text chunks: {sum(1 for c in all_chunks if c['type'] == 'text')}")
-        print(f"  - Table chunks: {sum(1 for c in all_chunks if c['type'] == 'table')}")
-        print("="*50 + "\n")
+        for page_chunks in self.iter_pages(start_page, end_page):
+            for chunk in page_chunks:
+                counts[chunk['type']] = counts.get(chunk['type'], 0) + 1
+                yield chunk
         
-        return all_chunks
\ No newline at end of file
+        if self.verbose:
+            print(f"\n{'='*50}")
+            print(f"✓ Total chunks extracted: {sum(counts.values())}")
+            print(f"  - Text chunks: {counts['text']}")
+            print(f"  - Table chunks: {counts['table']}")
+            print(f"  - Table rows: {counts['table_row']}")
+            print(f"  - Image chunks: {counts['image']}")
+            print("="*50 + "\n")
\ No newline at end of file
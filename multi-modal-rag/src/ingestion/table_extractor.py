@@ -0,0 +1,202 @@
+"""
+Structured table extraction.
+
+Tables come back as {'caption', 'header', 'rows', 'method'}, where header and
+every row are lists of cell strings of the same length and the first column
+holds the row label.
+
+Two extractors are combined:
+- PyMuPDF's page.find_tables(), which handles ruled (bordered) tables
+- a word-position parser for the borderless statistical tables in IMF reports
+  (a row of year headers, then one labelled line of numbers per indicator),
+  which find_tables either misses or splits mid-word
+"""
+from typing import Dict, List, Optional
+import re
+
+TABLE_STRATEGIES = ('auto', 'find_tables', 'layout')
+
+NUMBER = re.compile(r"^[-–−+]?\(?[\d,]*\d(\.\d+)?\)?%?$")
+MISSING = {'…', '...', '--', '-', '–', 'n.a.', 'na', 'n/a'}
+COLUMN_HEADER = re.compile(r"^((19|20)\d{2}([-–/]\d{2,4})?|[QH][1-4](-\d{2,4})?|FY\d{2,4})[pe*]?$", re.IGNORECASE)
+CAPTION = re.compile(r"^(Text )?Table \d+[a-z]?\.")
+FOOTER = re.compile(r"^(Sources?|Notes?|\d+/)[:\s]", re.IGNORECASE)
+
+def clean_cell(value) -> str:
+    return re.sub(r"\s+", " ", str(value)).strip() if value is not None else ""
+
+def _lines(page, tolerance: float = 2.5) -> List[List]:
+    """Words grouped into visual lines (by vertical centre), each sorted left to right"""
+    words = sorted(page.get_text("words"), key=lambda w: ((w[1] + w[3]) / 2, w[0]))
+    lines, current, current_y = [], [], None
+    for word in words:
+        y = (word[1] + word[3]) / 2
+        if current and y - current_y > tolerance:
+            lines.append(sorted(current, key=lambda w: w[0]))
+            current = []
+        if not current:
+            current_y = y
+        current.append(word)
+    if current:
+        lines.append(sorted(current, key=lambda w: w[0]))
+    return lines
+
+def _is_value(text: str) -> bool:
+    return bool(NUMBER.match(text)) or text.lower() in MISSING
+
+def layout_tables(page, min_columns: int = 3, min_rows: int = 2, min_fill: float = 0.6,
+                  max_label_chars: int = 120) -> List[Dict]:
+    """Borderless tables: a line of column headers (years, quarters) followed by labelled value lines
+
+    Lines filling fewer than min_fill of the columns (chart axes, stray numbers
+    in prose) are not rows; a long prose line ends the table.
+    """
+    tables = []
+    table = None
+    caption = ""
+    section = previous_section = ""
+    pending_label = ""
+    
+    def close():
+        if table and len(table['rows']) >= min_rows:
+            tables.append(table)
+    
+    for line in _lines(page):
+        texts = [w[4] for w in line]
+        text = " ".join(texts)
+        
+        if CAPTION.match(text):
+            close()
+            table, caption, section, pending_label = None, text, "", ""
+            continue
+        
+        if len(texts) >= min_columns and all(COLUMN_HEADER.match(t) for t in texts):
+            close()
+            centres = [(w[0] + w[2]) / 2 for w in line]
+            spacing = min(b - a for a, b in zip(centres, centres[1:])) if len(centres) > 1 else 50.0
+            table = {
+                'caption': caption,
+                'header': ['Indicator'] + texts,
+                'rows': [],
+                'sections': [],
+                'method': 'layout',
+                '_centres': centres,
+                '_spacing': spacing,
+                '_left': min(w[0] for w in line),
+            }
+            section, pending_label = "", ""
+            continue
+        
+        if table is None:
+            continue
+        if FOOTER.match(text):
+            close()
+            table, caption = None, ""
+            continue
+        
+        # Values are the numeric words right of the label column; each goes to the nearest header column
+        label_words, values = [], [""] * len(table['_centres'])
+        for word in line:
+            centre = (word[0] + word[2]) / 2
+            if _is_value(word[4]) and word[2] > table['_left'] - table['_spacing'] / 2:
+                column = min(range(len(values)), key=lambda i: abs(table['_centres'][i] - centre))
+                if abs(table['_centres'][column] - centre) <= table['_spacing'] * 0.75:
+                    values[column] = "" if word[4].lower() in MISSING else word[4]
+                    continue
+            label_words.append(word[4])
+        label = " ".join(label_words)
+        if len(label) > max_label_chars:
+            close()
+            table = None
+            continue
+        
+        if any(values) and sum(1 for v in values if v) < min_fill * len(values):
+            pending_label = ""
+            continue
+        if not any(values):
+            # A line without values is a section heading, or the first half of a wrapped label
+            pending_label = label
+            if label and not label.startswith("("):
+                previous_section, section = section, label
+            continue
+        
+        if pending_label and (label.startswith("(") or label[:1].islower() or not label):
+            label = f"{pending_label} {label}".strip()
+            if section == pending_label:
+                section = previous_section  # It was a wrapped label, not a heading
+        pending_label = ""
+        if label:
+            table['rows'].append([label] + values)
+            table['sections'].append(section)
+    
+    close()
+    for table in tables:
+        for key in ('_centres', '_spacing', '_left'):
+            del table[key]
+    return tables
+
+def ruled_tables(page, max_cell_chars: int = 80, min_fill: float = 0.6) -> List[Dict]:
+    """page.find_tables() results that look like data tables rather than boxed text"""
+    try:
+        found = page.find_tables()
+    except Exception:
+        return []
+    
+    tables = []
+    for tab in found.tables:
+        rows = [[clean_cell(cell) for cell in row] for row in tab.extract()]
+        header = [clean_cell(name) for name in tab.header.names]
+        if not tab.header.external and rows and rows[0] == header:
+            rows = rows[1:]
+        rows = [row for row in rows if any(row)]
+        if len(rows) < 2 or len(header) < 2:
+            continue
+        
+        cells = [cell for row in rows for cell in row]
+        filled = [cell for cell in cells if cell]
+        if len(filled) / len(cells) < min_fill or max(len(cell) for cell in filled) > max_cell_chars:
+            continue  # Text boxes and figure frames
+        
+        tables.append({
+            'caption': "",
+            'header': [name or f"Column {i + 1}" for i, name in enumerate(header)],
+            'rows': rows,
+            'sections': [""] * len(rows),
+            'method': 'find_tables',
+        })
+    return tables
+
+def extract_tables(page, strategy: str = 'auto', text: Optional[str] = None) -> List[Dict]:
+    """Tables on a page
+
+    strategy: 'layout' (word positions only, fast), 'find_tables' (PyMuPDF on
+    every page, plus the layout parser) or 'auto' (layout parser, then
+    find_tables only on pages with a table caption that yielded none)
+    """
+    if strategy not in TABLE_STRATEGIES:
+        raise ValueError(f"Unknown table strategy '{strategy}'. Choose from: {', '.join(TABLE_STRATEGIES)}")
+    
+    text = text if text is not None else page.get_text()
+    lines = [line.strip() for line in text.splitlines()]
+    
+    # Cheap text checks decide which pages are worth the word-level and find_tables passes
+    tables = []
+    if sum(1 for line in lines if COLUMN_HEADER.match(line)) >= 3:
+        tables = layout_tables(page)
+    if strategy == 'find_tables' or (strategy == 'auto' and not tables and any(CAPTION.match(line) for line in lines)):
+        tables.extend(ruled_tables(page))
+    return tables
+
+def render_table(table: Dict) -> str:
+    """Whole table as pipe-separated text"""
+    lines = [table['caption']] if table['caption'] else []
+    lines.append(" | ".join(table['header']))
+    lines.extend(" | ".join(row) for row in table['rows'])
+    return "\n".join(lines)
+
+def render_row(table: Dict, row: List[str], section: str = "") -> str:
+    """One row as 'caption | label (section): header: value; ...' for embedding and BM25"""
+    label = f"{row[0]} ({section})" if section and section.lower() not in row[0].lower() else row[0]
+    cells = "; ".join(f"{name}: {value}" for name, value in zip(table['header'][1:], row[1:]) if value)
+    prefix = f"{table['caption']} | " if table['caption'] else ""
+    return f"{prefix}{label}: {cells}"
\ No newline at end of file
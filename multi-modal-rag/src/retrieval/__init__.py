@@ -5,6 +5,8 @@ Hybrid search combining dense and sparse retrieval
 """
 
 from .hybrid_retriever import HybridRetriever
+from .sparse_index import SparseIndex, tokenize
+from .reranker import CrossEncoderReranker
 
-__all__ = ['HybridRetriever']
+__all__ = ['HybridRetriever', 'SparseIndex', 'tokenize', 'CrossEncoderReranker']
 
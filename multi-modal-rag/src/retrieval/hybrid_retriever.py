@@ -1,52 +1,166 @@
-from typing import List, Dict
-from rank_bm25 import BM25Okapi
+from typing import List, Dict, Tuple
+import threading
 import numpy as np
 
+from .sparse_index import SparseIndex
+from ..caching.lru_cache import TTLCache
+from ..embedding.metadata_index import MetadataFilter
+from ..tracing import tracer
+
+FUSION_METHODS = ("rrf", "weighted")
+
 class HybridRetriever:
-    def __init__(self, embedder, alpha: float = 0.5):
+    def __init__(self, embedder, alpha: float = 0.5, fusion: str = "rrf", rrf_k: int = 60,
+                 candidates: int = 50):
         """
-        alpha: weight for dense retrieval (1-alpha for sparse)
+        alpha: weight for dense retrieval (1-alpha for sparse), used by weighted fusion
+        fusion: "rrf" (reciprocal rank fusion) or "weighted" (normalised score blend)
+        rrf_k: rank offset for RRF; larger values flatten the contribution of top ranks
+        candidates: chunks gathered from each retriever before fusion
         """
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"Unknown fusion method '{fusion}'. Choose from: {', '.join(FUSION_METHODS)}")
+        
         self.embedder = embedder
         self.alpha = alpha
-        self.bm25 = None
-        self.corpus = []
-        self.metadata = []
+        self.fusion = fusion
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        self.sparse = SparseIndex()
+        self.sparse_path = f"{embedder.index_path}/sparse"
+        self._load_lock = threading.Lock()  # One thread loads (or rebuilds) while the others wait
+        self._masks = TTLCache(64)  # (BM25 index version, filter) -> allowed document positions
+    
+    def build_sparse_index(self):
+        """Build the BM25 index over every chunk in the embedder's document store"""
+        self.sparse = SparseIndex()
+        self.sparse.build(
+            ((vector_id, content) for vector_id, content, _ in self.embedder.store.iter_chunks()),
+            index_version=self.embedder.index_version
+        )
+        self.sparse.save(self.sparse_path)
+        stats = self.sparse.stats()
+        print(f"✓ BM25 index built over {stats['documents']} chunks ({stats['terms']} terms)")
+    
+    def load(self) -> bool:
+        """Load the persisted BM25 index; rebuilds it if it is missing or stale"""
+        if SparseIndex.exists(self.sparse_path):
+            with tracer.span("load_sparse_index"):
+                sparse = SparseIndex.load(self.sparse_path)
+            if sparse.index_version == self.embedder.index_version:
+                self.sparse = sparse
+                return True
+        
+        print("BM25 index missing or out of date, rebuilding from the document store...")
+        self.build_sparse_index()
+        return len(self.sparse) > 0
+    
+    def _ensure_current(self):
+        if self.sparse.index_version != self.embedder.index_version:
+            with self._load_lock:
+                if self.sparse.index_version != self.embedder.index_version:
+                    self.load()
+    
+    def warmup(self):
+        """Load the BM25 index now instead of on the first query"""
+        self._ensure_current()
     
-    def build_bm25_index(self, chunks: List[Dict]):
-        """Build BM25 index for sparse retrieval"""
-        self.corpus = [chunk['content'] for chunk in chunks]
-        self.metadata = [chunk['metadata'] for chunk in chunks]
+    def _allowed(self, filters: MetadataFilter) -> np.ndarray:
+        """BM25 document positions a filter accepts"""
+        key = (self.sparse.index_version, filters.key)
+        allowed = self._masks.get(key)
+        if allowed is None:
+            allowed = self.sparse.mask(self.embedder.select_ids(filters))
+            self._masks.put(key, allowed)
+        return allowed
+    
+    def sparse_search(self, query: str, k: int, filters=None) -> List[Tuple[int, float]]:
+        """Top-k (chunk ID, BM25 score) over the whole corpus, or the chunks a filter accepts"""
+        self._ensure_current()
+        filters = MetadataFilter.parse(filters)
         
-        tokenized_corpus = [doc.lower().split() for doc in self.corpus]
-        self.bm25 = BM25Okapi(tokenized_corpus)
+        # Only chunks sharing a term with the query are sparse candidates
+        with tracer.span("sparse_search", k=k, filtered=filters is not None) as span:
+            hits = self.sparse.search(query, k, allowed=self._allowed(filters) if filters else None)
+            span.set_attribute('candidates', len(hits))
+        return hits
+    
+    def dense_search(self, query_vector: np.ndarray, k: int, filters=None) -> List[Tuple[int, float]]:
+        """Top-k (chunk ID, L2 distance) from the vector index"""
+        return self.embedder.search_ids(query_vector, k, filters)
     
-    def search(self, query: str, n_results: int = 5) -> List[Dict]:
-        """Hybrid search combining dense and sparse retrieval"""
+    def _fuse_rrf(self, dense: List[Tuple[int, float]], sparse: List[Tuple[int, float]]) -> Dict[int, float]:
+        scores = {}
+        for ranked in (dense, sparse):
+            for rank, (chunk_id, _) in enumerate(ranked):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
         
-        # Dense retrieval (vector search)
-        dense_results = self.embedder.search(query, n_results=n_results*2)
+        # Scale so a chunk ranked first by both retrievers scores 1.0
+        best = 2.0 / (self.rrf_k + 1)
+        return {chunk_id: score / best for chunk_id, score in scores.items()}
+    
+    def _fuse_weighted(self, dense: List[Tuple[int, float]], sparse: List[Tuple[int, float]]) -> Dict[int, float]:
+        def normalize(values):
+            values = np.asarray(values, dtype='float64')
+            if len(values) == 0:
+                return values
+            spread = values.max() - values.min()
+            return (values - values.min()) / spread if spread > 0 else np.ones_like(values)
         
-        # Sparse retrieval (BM25)
-        tokenized_query = query.lower().split()
-        bm25_scores = self.bm25.get_scores(tokenized_query)
+        # Convert distance to similarity, then min-max each candidate list
+        dense_sim = normalize([1 / (1 + d) for _, d in dense])
+        sparse_sim = normalize([s for _, s in sparse])
         
-        # Normalize scores
-        dense_scores = np.array(dense_results['distances'])
-        dense_scores = 1 / (1 + dense_scores)  # Convert distance to similarity
+        scores = {}
+        for (chunk_id, _), sim in zip(dense, dense_sim):
+            scores[chunk_id] = float(self.alpha * sim)
+        for (chunk_id, _), sim in zip(sparse, sparse_sim):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + float((1 - self.alpha) * sim)
+        return scores
+    
+    def search(self, query: str, n_results: int = 5, query_vector: np.ndarray = None, filters=None) -> Dict:
+        """Hybrid search combining dense and sparse retrieval
+
+        Returns the same dict as MultiModalEmbedder.search; 'distances' are
+        1 - fused score, so the generator's relevance column stays meaningful.
+        filters restrict both retrievers to matching chunks (see MetadataFilter).
+        """
+        if query_vector is None:
+            query_vector = self.embedder.get_query_embedding(query)
+        k = max(self.candidates, n_results)
+        filters = MetadataFilter.parse(filters)
         
-        bm25_scores_norm = (bm25_scores - bm25_scores.min()) / (bm25_scores.max() - bm25_scores.min() + 1e-10)
+        # Candidates are gathered independently over the whole corpus (or the filtered part of it)
+        dense = self.dense_search(query_vector, k, filters)
+        sparse = self.sparse_search(query, k, filters)
         
-        # Combine scores
-        combined_scores = self.alpha * dense_scores + (1 - self.alpha) * bm25_scores_norm[:len(dense_scores)]
+        # Fuse by chunk ID
+        with tracer.span("fusion", method=self.fusion, dense=len(dense), sparse=len(sparse)):
+            top = self._fuse(dense, sparse, n_results)
+        return self.embedder.fetch(top)
+    
+    def search_batch(self, queries: List[str], n_results: int = 5, query_vectors: np.ndarray = None,
+                     filters=None) -> List[Dict]:
+        """search for many queries: one batched FAISS search and one document store read"""
+        if query_vectors is None:
+            query_vectors = self.embedder.get_query_embeddings(queries)
+        k = max(self.candidates, n_results)
+        filters = MetadataFilter.parse(filters)
         
-        # Get top results
-        top_indices = np.argsort(combined_scores)[-n_results:][::-1]
+        dense = self.embedder.search_ids_batch(query_vectors, k, filters)
+        sparse = [self.sparse_search(query, k, filters) for query in queries]
         
-        final_results = {
-            'documents': [dense_results['documents'][i] for i in top_indices],
-            'metadatas': [dense_results['metadatas'][i] for i in top_indices],
-            'distances': [1 - combined_scores[i] for i in top_indices]
-        }
+        with tracer.span("fusion", method=self.fusion, queries=len(queries)):
+            top = [self._fuse(d, s, n_results) for d, s in zip(dense, sparse)]
+        return self.embedder.fetch_many(top)
+    
+    def _fuse(self, dense: List[Tuple[int, float]], sparse: List[Tuple[int, float]],
+              n_results: int) -> List[Tuple[int, float]]:
+        """Best n_results (chunk ID, 1 - fused score) pairs"""
+        if self.fusion == "rrf":
+            scores = self._fuse_rrf(dense, sparse)
+        else:
+            scores = self._fuse_weighted(dense, sparse)
         
-        return final_results
\ No newline at end of file
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+        return [(chunk_id, 1.0 - score) for chunk_id, score in top]
\ No newline at end of file
@@ -0,0 +1,133 @@
+from typing import Dict, List, Optional, Tuple
+import threading
+import numpy as np
+
+from ..caching.lru_cache import TTLCache, normalize_query
+from ..tracing import tracer
+
+class CrossEncoderReranker:
+    """Re-scores retrieved chunks with a local cross-encoder
+
+    Pair scores are cached by (normalized question, chunk ID); chunk IDs are
+    content hashes, so a cached score can never belong to edited text.
+    """
+    
+    def __init__(self, model_name: str = 'cross-encoder/ms-marco-MiniLM-L-6-v2', batch_size: int = 32,
+                 cache_size: int = 4096, cache_ttl: Optional[float] = None,
+                 early_exit_margin: Optional[float] = None, stage_size: int = 10):
+        """
+        batch_size: pairs per forward pass
+        early_exit_margin: stop scoring lower-ranked candidates once a whole stage
+            scores this far below the current top-k cut (None = score everything in one pass)
+        stage_size: candidates scored per stage when early exit is enabled
+        """
+        self.model_name = model_name
+        self._model = None  # Loaded on first use
+        self._model_lock = threading.Lock()
+        self.batch_size = max(1, batch_size)
+        self.early_exit_margin = early_exit_margin
+        self.stage_size = max(1, stage_size)
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.pairs_scored = 0
+    
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    with tracer.span("load_cross_encoder", model=self.model_name):
+                        from sentence_transformers import CrossEncoder
+                        print(f"Loading cross-encoder: {self.model_name}")
+                        self._model = CrossEncoder(self.model_name, device='cpu')
+        return self._model
+    
+    def warmup(self):
+        self.model.predict([("warmup", "warmup")], show_progress_bar=False)
+    
+    def score(self, query: str, documents: List[str], ids: List[int]) -> np.ndarray:
+        """Cross-encoder score per document; uncached pairs go through one batched predict"""
+        return self.score_many([(query, documents, ids)])[0]
+    
+    def score_many(self, requests: List[Tuple[str, List[str], List[int]]]) -> List[np.ndarray]:
+        """score for several (query, documents, ids); uncached pairs of all of them share one predict"""
+        scores = [np.empty(len(documents), dtype='float32') for _, documents, _ in requests]
+        missing = []  # (request, position, cache key)
+        for r, (query, documents, ids) in enumerate(requests):
+            key = normalize_query(query)
+            for i, chunk_id in enumerate(ids):
+                cached = self.cache.get((key, chunk_id))
+                if cached is None:
+                    missing.append((r, i, (key, chunk_id)))
+                else:
+                    scores[r][i] = cached
+        
+        if missing:
+            with tracer.span("cross_encoder", pairs=len(missing)):
+                predicted = self.model.predict(
+                    [(requests[r][0], requests[r][1][i]) for r, i, _ in missing],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False
+                )
+            self.pairs_scored += len(missing)
+            for (r, i, key), value in zip(missing, np.asarray(predicted, dtype='float32')):
+                scores[r][i] = value
+                self.cache.put(key, float(value))
+        
+        return scores
+    
+    def rerank(self, query: str, retrieved: Dict, top_k: int = 3) -> Dict:
+        """Top-k of the retrieved candidates by cross-encoder score
+
+        Returns the same dict shape as MultiModalEmbedder.search. 'distances'
+        become 1 - sigmoid(score) so relevance stays in [0, 1], and the raw
+        scores are kept under 'rerank_scores'.
+        """
+        n = len(retrieved['ids'])
+        if n == 0:
+            return {**retrieved, 'rerank_scores': []}
+        
+        # Without early exit every candidate is scored in a single pass
+        stage = n if self.early_exit_margin is None else self.stage_size
+        scores = np.empty(0, dtype='float32')
+        for start in range(0, n, stage):
+            end = min(start + stage, n)
+            stage_scores = self.score(query, retrieved['documents'][start:end], retrieved['ids'][start:end])
+            scores = np.concatenate([scores, stage_scores])
+            
+            # Candidates arrive in first-stage rank order; once a whole stage falls
+            # decisively below the current cut, the rest are unlikely to do better
+            if end < n and len(scores) > top_k:
+                cut = np.sort(scores)[-top_k]
+                if stage_scores.max() < cut - self.early_exit_margin:
+                    break
+        
+        return self._top_k(retrieved, scores, top_k)
+    
+    def rerank_batch(self, queries: List[str], retrieved: List[Dict], top_k: int = 3) -> List[Dict]:
+        """rerank for many queries, scoring all their candidates in one batched predict"""
+        if self.early_exit_margin is not None:
+            # Early exit decides per query how many stages to score
+            return [self.rerank(query, results, top_k) for query, results in zip(queries, retrieved)]
+        
+        scores = self.score_many([
+            (query, results['documents'], results['ids']) for query, results in zip(queries, retrieved)
+        ])
+        return [
+            self._top_k(results, query_scores, top_k) if results['ids'] else {**results, 'rerank_scores': []}
+            for results, query_scores in zip(retrieved, scores)
+        ]
+    
+    def _top_k(self, retrieved: Dict, scores: np.ndarray, top_k: int) -> Dict:
+        order = np.argsort(-scores, kind='stable')[:top_k]
+        relevance = 1.0 / (1.0 + np.exp(-scores[order]))
+        
+        return {
+            'ids': [retrieved['ids'][i] for i in order],
+            'documents': [retrieved['documents'][i] for i in order],
+            'metadatas': [retrieved['metadatas'][i] for i in order],
+            'distances': [float(1.0 - r) for r in relevance],
+            'rerank_scores': [float(scores[i]) for i in order]
+        }
+    
+    def stats(self) -> Dict:
+        return {**self.cache.stats(), 'pairs_scored': self.pairs_scored}
\ No newline at end of file
@@ -0,0 +1,195 @@
+from typing import Dict, Iterable, List, Tuple
+from array import array
+from collections import Counter
+import json
+import os
+import re
+import numpy as np
+
+# Numbers keep their decimal/thousands separators and a trailing %, so
+# "3.4%", "1,234" and "2023" survive as single tokens
+TOKEN_PATTERN = re.compile(r"\d+(?:[.,]\d+)*%?|[a-z]+(?:['’][a-z]+)*")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word and number tokens; punctuation is dropped"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+class SparseIndex:
+    """BM25 inverted index stored as flat numpy arrays
+
+    Postings for term t are docs[offsets[t]:offsets[t+1]] (sorted document
+    positions) with the matching precomputed BM25 impacts in impacts[...].
+    A query only touches the postings of its own terms, and MaxScore pruning
+    skips documents that can no longer reach the top k. Saved as .npy files
+    that are memory-mapped on load.
+    """
+    
+    ARRAYS = ('offsets', 'docs', 'impacts', 'max_impact', 'idf', 'doc_len', 'ids')
+    
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}  # term -> term ID
+        self.offsets = np.zeros(1, dtype='int64')
+        self.docs = np.empty(0, dtype='int32')
+        self.impacts = np.empty(0, dtype='float32')
+        self.max_impact = np.empty(0, dtype='float32')  # Upper bound of each term's contribution
+        self.idf = np.empty(0, dtype='float32')
+        self.doc_len = np.empty(0, dtype='float32')
+        self.ids = np.empty(0, dtype='int64')  # Document position -> chunk ID
+        self.avgdl = 0.0
+        self.index_version = None
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def build(self, documents: Iterable[Tuple[int, str]], index_version: str = None):
+        """Index (chunk ID, text) pairs, replacing any previous contents"""
+        vocab = {}
+        ids = array('q')
+        doc_len = array('f')
+        post_terms, post_docs, post_tfs = array('i'), array('i'), array('f')
+        
+        for position, (chunk_id, text) in enumerate(documents):
+            counts = Counter(tokenize(text))
+            ids.append(chunk_id)
+            doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                post_terms.append(vocab.setdefault(term, len(vocab)))
+                post_docs.append(position)
+                post_tfs.append(tf)
+        
+        self.vocab = vocab
+        self.ids = np.frombuffer(ids, dtype='int64').copy()
+        self.doc_len = np.frombuffer(doc_len, dtype='float32').copy()
+        self.index_version = index_version
+        n_docs = len(self.ids)
+        self.avgdl = float(self.doc_len.mean()) if n_docs else 0.0
+        
+        terms = np.frombuffer(post_terms, dtype='int32')
+        docs = np.frombuffer(post_docs, dtype='int32')
+        tfs = np.frombuffer(post_tfs, dtype='float32')
+        
+        # Group postings by term; the stable sort keeps documents in order within a term
+        order = np.argsort(terms, kind='stable')
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+        df = np.bincount(terms, minlength=len(vocab))
+        self.offsets = np.zeros(len(vocab) + 1, dtype='int64')
+        np.cumsum(df, out=self.offsets[1:])
+        
+        # Lucene-style IDF is always positive, so common terms never subtract score
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype('float32')
+        
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / max(self.avgdl, 1e-9))
+        self.docs = docs
+        self.impacts = (self.idf[terms] * tfs * (self.k1 + 1) / (tfs + norm)).astype('float32')
+        
+        self.max_impact = np.zeros(len(vocab), dtype='float32')
+        if len(terms):
+            np.maximum.at(self.max_impact, terms, self.impacts)
+    
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.docs[start:end], self.impacts[start:end]
+    
+    def mask(self, chunk_ids: np.ndarray) -> np.ndarray:
+        """Boolean mask over document positions for `allowed` in search"""
+        return np.isin(self.ids, chunk_ids)
+    
+    def search(self, query: str, k: int = 10, allowed: np.ndarray = None) -> List[Tuple[int, float]]:
+        """Top-k (chunk ID, BM25 score), best first
+
+        allowed: boolean mask over document positions (see mask); other
+        documents are dropped from the postings before scoring
+        """
+        query_terms = Counter(t for t in tokenize(query) if t in self.vocab)
+        if not query_terms or k <= 0:
+            return []
+        
+        # Highest-impact terms first; a repeated query term counts once per occurrence
+        terms = sorted(
+            ((self.vocab[t], qtf) for t, qtf in query_terms.items()),
+            key=lambda item: float(self.max_impact[item[0]]) * item[1],
+            reverse=True
+        )
+        bounds = [float(self.max_impact[t]) * qtf for t, qtf in terms]
+        remaining = np.cumsum(bounds[::-1])[::-1].tolist() + [0.0]  # remaining[i] = bound of terms[i:]
+        
+        cand = np.empty(0, dtype='int32')
+        scores = np.empty(0, dtype='float32')
+        threshold = 0.0
+        
+        for i, (term_id, qtf) in enumerate(terms):
+            docs, impacts = self._postings(term_id)
+            if allowed is not None:
+                keep = allowed[docs]
+                docs, impacts = docs[keep], impacts[keep]
+            
+            if len(cand) < k or remaining[i] > threshold:
+                # Essential term: a document not seen yet could still make the top k
+                merged = np.concatenate([cand, docs])
+                cand, inverse = np.unique(merged, return_inverse=True)
+                scores = np.bincount(
+                    inverse, weights=np.concatenate([scores, impacts * qtf]), minlength=len(cand)
+                ).astype('float32')
+            else:
+                # Non-essential: only documents already in the running can gain score
+                pos = np.searchsorted(docs, cand)
+                pos[pos == len(docs)] = 0
+                hit = docs[pos] == cand
+                scores[hit] += impacts[pos[hit]] * qtf
+            
+            # The k-th best partial score is a lower bound on the final cut-off
+            if len(cand) >= k:
+                threshold = float(np.partition(scores, len(scores) - k)[len(scores) - k])
+                alive = scores + remaining[i + 1] >= threshold
+                cand, scores = cand[alive], scores[alive]
+        
+        k = min(k, len(cand))
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.ids[cand[j]]), float(scores[j])) for j in top]
+    
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "vocab.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.vocab, f)
+        with open(os.path.join(path, "meta.json"), 'w') as f:
+            json.dump({
+                'k1': self.k1,
+                'b': self.b,
+                'avgdl': self.avgdl,
+                'documents': len(self.ids),
+                'index_version': self.index_version,
+            }, f, indent=2)
+    
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'SparseIndex':
+        """Load a saved index; postings arrays are memory-mapped unless mmap=False"""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        
+        index = cls(k1=meta['k1'], b=meta['b'])
+        index.avgdl = meta['avgdl']
+        index.index_version = meta.get('index_version')
+        for name in cls.ARRAYS:
+            setattr(index, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r' if mmap else None))
+        with open(os.path.join(path, "vocab.json"), encoding='utf-8') as f:
+            index.vocab = json.load(f)
+        return index
+    
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, "meta.json"))
+    
+    def stats(self) -> Dict:
+        return {
+            'documents': len(self.ids),
+            'terms': len(self.vocab),
+            'postings': int(len(self.docs)),
+            'avgdl': round(self.avgdl, 2),
+        }
\ No newline at end of file
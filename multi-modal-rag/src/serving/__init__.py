@@ -0,0 +1,9 @@
+# src/serving/__init__.py
+"""
+Serving module
+Micro-batching, request coalescing and backpressure for the HTTP API
+"""
+
+from .scheduler import MicroBatcher, QueryScheduler, Overloaded
+
+__all__ = ['MicroBatcher', 'QueryScheduler', 'Overloaded']
@@ -0,0 +1,188 @@
+from collections import deque
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+import asyncio
+import contextvars
+import time
+
+from ..caching.lru_cache import normalize_query
+from ..embedding.metadata_index import MetadataFilter
+from ..tracing import tracer, percentiles
+
+class Overloaded(Exception):
+    """Raised instead of queueing a request once max_in_flight requests are admitted"""
+
+class MicroBatcher:
+    """Collects concurrent submissions and hands them to `handler` as one list
+
+    A batch is flushed window_ms after its first item arrives, or as soon as
+    it holds max_batch items. Batches run concurrently with the next window;
+    the handler must return one result per item, in order.
+    """
+    
+    def __init__(self, handler: Callable[[List], Awaitable[List]], window_ms: float = 5.0,
+                 max_batch: int = 32, history: int = 1000):
+        self.handler = handler
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._pending = []  # (item, future, enqueued_at)
+        self._timer = None
+        self._running = set()
+        self.batches = 0
+        self._sizes = deque(maxlen=history)
+    
+    def queued(self) -> int:
+        return len(self._pending)
+    
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+    
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            # A fresh context, so the batch's spans don't join the trace of whichever request came first
+            task = contextvars.Context().run(asyncio.ensure_future, self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+    
+    async def _run(self, batch: List):
+        started = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            tracer.record("batch_wait", (started - enqueued_at) * 1000)
+        self.batches += 1
+        self._sizes.append(len(batch))
+        
+        try:
+            results = await self.handler([item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():  # The client may have gone away
+                future.set_result(result)
+    
+    def stats(self) -> Dict:
+        sizes = list(self._sizes)
+        return {
+            'batches': self.batches,
+            'queued': self.queued(),
+            'running': len(self._running),
+            'mean_batch_size': round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+            'batch_size': percentiles(sizes),
+        }
+
+class QueryScheduler:
+    """Serves concurrent questions from one RAGPipeline
+
+    - Identical in-flight requests (same normalized question and filters)
+      share one execution.
+    - Retrieval of concurrent questions is micro-batched: their query
+      encodings and FAISS / BM25 searches run as one aretrieve_batch call per
+      filter. Answers are generated per question afterwards (capped by the
+      pipeline's LLM semaphore), so a slow completion holds up nobody else.
+    - At most max_in_flight distinct requests are admitted; beyond that
+      Overloaded is raised so callers can shed load instead of queueing.
+    """
+    
+    def __init__(self, pipeline, window_ms: float = 5.0, max_batch: int = 32, max_in_flight: int = 512):
+        self.pipeline = pipeline
+        self.max_in_flight = max_in_flight
+        self.batcher = MicroBatcher(self._retrieve_batch, window_ms=window_ms, max_batch=max_batch)
+        self._in_flight = {}  # coalescing key -> task
+        self.requests = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.errors = 0
+    
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+    
+    def saturated(self) -> bool:
+        return len(self._in_flight) >= self.max_in_flight
+    
+    async def _retrieve_batch(self, items: List) -> List:
+        """(query vector, retrieved) per (question, filters) item; one batched retrieval per distinct filter"""
+        groups = {}
+        for position, (question, filters) in enumerate(items):
+            groups.setdefault(filters.key if filters else None, (filters, []))[1].append(position)
+        
+        results = [None] * len(items)
+        with tracer.span("serve_batch", questions=len(items), filters=len(groups)):
+            for filters, positions in groups.values():
+                vectors, retrieved = await self.pipeline.aretrieve_batch([items[p][0] for p in positions], filters)
+                for row, position in enumerate(positions):
+                    results[position] = (vectors[row:row + 1], retrieved[row])
+        return results
+    
+    async def _coalesce(self, key: Hashable, run: Callable[[], Awaitable[Dict]]) -> Dict:
+        self.requests += 1
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            if self.saturated():
+                self.rejected += 1
+                raise Overloaded(f"{self.max_in_flight} requests in flight")
+            task = asyncio.ensure_future(run())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        try:
+            # Shielded: a disconnecting client must not cancel the work others wait on
+            result = await asyncio.shield(task)
+        except Exception:
+            self.errors += 1
+            raise
+        return dict(result)
+    
+    def _key(self, kind: str, question: str, filters: Optional[MetadataFilter]):
+        return kind, normalize_query(question), filters.key if filters else None
+    
+    async def retrieve(self, question: str, filters=None) -> Dict:
+        """Chunks retrieved for a question (see RAGPipeline.retrieve)"""
+        filters = MetadataFilter.parse(filters)
+        
+        async def run():
+            return (await self.batcher.submit((question, filters)))[1]
+        return await self._coalesce(self._key('retrieve', question, filters), run)
+    
+    async def query(self, question: str, filters=None) -> Dict:
+        """Answer a question (see RAGPipeline.aquery)"""
+        filters = MetadataFilter.parse(filters)
+        
+        async def run():
+            with tracer.span("query", path="served") as span:
+                start = time.perf_counter()
+                query_vector, retrieved = await self.batcher.submit((question, filters))
+                tracer.record("batched_retrieve", (time.perf_counter() - start) * 1000)
+                result = await self.pipeline.aanswer(question, query_vector, retrieved)
+                span.set_attribute('cached', result['cached'])
+            result['timings'] = span.stage_breakdown()
+            return result
+        return await self._coalesce(self._key('query', question, filters), run)
+    
+    async def drain(self, timeout: float = 30.0):
+        """Wait up to timeout seconds for admitted requests to finish"""
+        if self._in_flight:
+            await asyncio.wait(list(self._in_flight.values()), timeout=timeout)
+    
+    def stats(self) -> Dict:
+        return {
+            'in_flight': self.in_flight(),
+            'max_in_flight': self.max_in_flight,
+            'requests': self.requests,
+            'coalesced': self.coalesced,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            **self.batcher.stats(),
+        }
\ No newline at end of file
@@ -0,0 +1,10 @@
+# src/tracing/__init__.py
+"""
+Tracing module
+Per-stage spans, latency percentiles, JSONL/OpenTelemetry export and import timing
+"""
+
+from .tracer import Tracer, Span, tracer, percentiles
+from .startup import import_times
+
+__all__ = ['Tracer', 'Span', 'tracer', 'percentiles', 'import_times']
\ No newline at end of file
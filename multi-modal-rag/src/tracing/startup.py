@@ -0,0 +1,32 @@
+from typing import Dict, Iterable
+import re
+import subprocess
+import sys
+
+HEAVY_MODULES = (
+    'numpy', 'faiss', 'torch', 'sentence_transformers', 'openai',
+    'pymupdf', 'langchain_text_splitters',
+)
+
+def import_times(modules: Iterable[str] = HEAVY_MODULES) -> Dict[str, float]:
+    """Cumulative import time (ms) of each module, measured in a fresh interpreter
+
+    Each module gets its own `python -X importtime` run so shared dependencies
+    are counted for every module that pulls them in. Modules that fail to import
+    are reported as None.
+    """
+    times = {}
+    for module in modules:
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            capture_output=True, text=True
+        )
+        times[module] = None
+        if proc.returncode != 0:
+            continue
+        # "import time: self [us] | cumulative | imported package"; top-level entries are unindented
+        for line in proc.stderr.splitlines():
+            match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\S.*)$", line)
+            if match and match.group(2) == module:
+                times[module] = round(int(match.group(1)) / 1000, 2)
+    return times
\ No newline at end of file
@@ -0,0 +1,201 @@
+from typing import Any, Dict, List, Optional
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+import numpy as np
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+def percentiles(values: List[float], points=(50, 95, 99)) -> Dict[str, float]:
+    """{'p50': ..., 'p95': ..., 'p99': ...} for a list of durations"""
+    if not len(values):
+        return {f"p{p}": 0.0 for p in points}
+    result = np.percentile(np.asarray(values, dtype='float64'), points)
+    return {f"p{p}": round(float(v), 2) for p, v in zip(points, result)}
+
+class Span:
+    """One timed stage; durations are in milliseconds"""
+    
+    def __init__(self, name: str, parent: 'Span' = None, attributes: Dict = None):
+        self.name = name
+        self.parent = parent
+        self.root = parent.root if parent else self
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+        self.stages = defaultdict(float)  # Root only: stage name -> total ms inside this trace
+        self._exporter_state = {}
+    
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+    
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+    
+    def stage_breakdown(self) -> Dict[str, float]:
+        """Total ms per stage among the finished spans of this trace"""
+        return {name: round(ms, 2) for name, ms in self.root.stages.items()}
+    
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent.span_id if self.parent else None,
+            'name': self.name,
+            'start_time': self.start_time,
+            'duration_ms': round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            'attributes': self.attributes,
+        }
+
+class _NoopSpan(Span):
+    def __init__(self):
+        self.attributes = {}
+        self.stages = {}
+        self.root = self
+    
+    def set_attribute(self, key: str, value: Any):
+        pass
+    
+    def set_attributes(self, **attributes):
+        pass
+
+class JsonlExporter:
+    """Appends one JSON object per finished span"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+    
+    def on_start(self, span: Span):
+        pass
+    
+    def on_end(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+class OpenTelemetryExporter:
+    """Mirrors spans into OpenTelemetry (requires opentelemetry-api/sdk to be configured)"""
+    
+    def __init__(self, service_name: str = "multi-modal-rag"):
+        from opentelemetry import trace
+        self._trace = trace
+        self._tracer = trace.get_tracer(service_name)
+    
+    def on_start(self, span: Span):
+        context = None
+        if span.parent is not None and 'otel' in span.parent._exporter_state:
+            context = self._trace.set_span_in_context(span.parent._exporter_state['otel'])
+        span._exporter_state['otel'] = self._tracer.start_span(
+            span.name, context=context, start_time=int(span.start_time * 1e9)
+        )
+    
+    def on_end(self, span: Span):
+        otel_span = span._exporter_state.pop('otel', None)
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            if isinstance(value, (str, bool, int, float)):
+                otel_span.set_attribute(key, value)
+        otel_span.end(end_time=int((span.start_time + span.duration_ms / 1000) * 1e9))
+
+class Tracer:
+    """Lightweight span tracer with in-process latency percentiles per stage"""
+    
+    def __init__(self, enabled: bool = True, max_samples: int = 10000):
+        self.enabled = enabled
+        self.exporters = []
+        self._durations = defaultdict(lambda: deque(maxlen=max_samples))
+        self._lock = threading.Lock()
+    
+    def configure(self, enabled: bool = True, exporter: Optional[str] = None, path: str = "logs/traces.jsonl"):
+        """exporter: None (in-memory stats only), "jsonl" or "otel" """
+        self.enabled = enabled
+        self.exporters = []
+        if exporter == "jsonl":
+            self.exporters.append(JsonlExporter(path))
+        elif exporter == "otel":
+            try:
+                self.exporters.append(OpenTelemetryExporter())
+            except ImportError:
+                print("Warning: opentelemetry is not installed; spans will not be exported")
+        elif exporter:
+            raise ValueError(f"Unknown trace exporter '{exporter}'. Choose 'jsonl' or 'otel'")
+    
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+    
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time a block as a child of the current span (or a new trace)"""
+        if not self.enabled:
+            yield _NoopSpan()
+            return
+        
+        span = Span(name, parent=_current_span.get(), attributes=attributes)
+        for exporter in self.exporters:
+            exporter.on_start(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.set_attribute('error', str(e))
+            raise
+        finally:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # A generator finished in a different context than it started in
+                _current_span.set(span.parent)
+            self._finish(span, (time.perf_counter() - span._start) * 1000)
+    
+    def record(self, name: str, duration_ms: float, **attributes):
+        """Add an already-measured stage (e.g. time accumulated across a stream) to the current trace"""
+        if not self.enabled:
+            return
+        span = Span(name, parent=_current_span.get(), attributes=attributes)
+        span.start_time -= duration_ms / 1000
+        for exporter in self.exporters:
+            exporter.on_start(span)
+        self._finish(span, duration_ms)
+    
+    def _finish(self, span: Span, duration_ms: float):
+        span.duration_ms = duration_ms
+        if span.parent is not None:
+            span.root.stages[span.name] += duration_ms
+        with self._lock:
+            self._durations[span.name].append(duration_ms)
+        for exporter in self.exporters:
+            try:
+                exporter.on_end(span)
+            except Exception as e:
+                print(f"Warning: trace export failed: {e}")
+    
+    def stage_stats(self) -> Dict[str, Dict]:
+        """{stage: {count, mean, p50, p95, p99}} in milliseconds"""
+        with self._lock:
+            samples = {name: list(values) for name, values in self._durations.items()}
+        return {
+            name: {
+                'count': len(values),
+                'mean': round(float(np.mean(values)), 2),
+                **percentiles(values),
+            }
+            for name, values in samples.items() if values
+        }
+    
+    def reset_stats(self):
+        with self._lock:
+            self._durations.clear()
+
+tracer = Tracer()
\ No newline at end of file